@@ -2,21 +2,37 @@
 Memra SDK - Declarative AI Workflows
 
 A framework for building AI-powered business workflows using a declarative approach.
-Think of it as "Kubernetes for business logic" where agents are the pods and 
+Think of it as "Kubernetes for business logic" where agents are the pods and
 departments are the deployments.
 """
 
 __version__ = "0.2.15"
 
-# Core imports
-from .models import Agent, Department, Tool, LLM
-from .execution import ExecutionEngine
-from .discovery_client import check_api_health, get_api_status
+import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .models import Agent, Department, Tool, LLM
+    from .execution import ExecutionEngine
+    from .discovery_client import check_api_health, get_api_status
+
+# Public names and the submodule each lives in. Submodules (and pydantic/httpx
+# behind them) are imported on first attribute access (PEP 562), so `import memra`
+# and `memra --version` stay cheap.
+_LAZY_ATTRIBUTES = {
+    "Agent": ".models",
+    "Department": ".models",
+    "Tool": ".models",
+    "LLM": ".models",
+    "ExecutionEngine": ".execution",
+    "check_api_health": ".discovery_client",
+    "get_api_status": ".discovery_client",
+}
 
 # Make key classes available at package level
 __all__ = [
     "Agent",
-    "Department", 
+    "Department",
     "Tool",
     "LLM",
     "ExecutionEngine",
@@ -25,8 +41,20 @@ __all__ = [
     "__version__"
 ]
 
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    # Cache so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
 # Optional: Add version check for compatibility
-import sys
 if sys.version_info < (3, 8):
     raise RuntimeError("Memra requires Python 3.8 or higher")
 
@@ -37,9 +65,8 @@ def demo():
     run_demo()
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1 and sys.argv[1] == "demo":
         demo()
     else:
         print("Usage: python -m memra demo")
-        print("Or: memra demo") 
\ No newline at end of file
+        print("Or: memra demo")
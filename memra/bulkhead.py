@@ -0,0 +1,192 @@
+"""
+Bulkheads: separate concurrency pools for classes of tools
+Each pool admits a fixed number of calls and queues a bounded number more, so a
+saturated slow backend cannot take every worker away from the cheap steps
+"""
+
+import os
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Deque, Tuple
+from .metrics import METRICS
+from .deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+# Longest a queued call waits when neither queue_timeout nor a run deadline bounds it
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv("MEMRA_BULKHEAD_QUEUE_TIMEOUT", "300"))
+
+class Bulkhead:
+    """A pool of max_concurrent slots with a bounded FIFO queue in front of it"""
+
+    def __init__(self, name: str, max_concurrent: int = 4, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        """
+        Args:
+            name: Pool name, shared by every tool assigned to it
+            max_concurrent: Calls allowed to run at once
+            max_queue: Calls allowed to wait for a slot; further calls are rejected
+                at once. None for an unbounded queue
+            queue_timeout: Longest a call waits for a slot, None to wait as long as
+                the run deadline allows (DEFAULT_QUEUE_TIMEOUT outside a deadline)
+        """
+        if max_concurrent < 1:
+            raise ValueError(f"Bulkhead {name} needs max_concurrent >= 1, got {max_concurrent}")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: Deque[threading.Event] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self) -> Optional[str]:
+        """Take a slot; returns None once admitted, otherwise why the call was refused"""
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not self._waiters:
+                self._admit()
+                return None
+            if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+                return "full"
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            METRICS.bulkhead_queued.set(len(self._waiters), bulkhead=self.name)
+
+        timeout = self.queue_timeout
+        deadline = current_deadline()
+        by_deadline = deadline is not None and (timeout is None or deadline.remaining() <= timeout)
+        if by_deadline:
+            timeout = deadline.remaining()
+        elif timeout is None:
+            # A worker must not be held forever by a pool that never frees up
+            timeout = DEFAULT_QUEUE_TIMEOUT
+        waiter.wait(timeout)
+
+        with self._lock:
+            # set() happens under the lock, so this cannot race with release()
+            if not waiter.is_set():
+                self._waiters.remove(waiter)
+                METRICS.bulkhead_queued.set(len(self._waiters), bulkhead=self.name)
+                return "deadline" if by_deadline else "timeout"
+        return None
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self._waiters and self._in_flight < self.max_concurrent:
+                self._admit()
+                self._waiters.popleft().set()
+                METRICS.bulkhead_queued.set(len(self._waiters), bulkhead=self.name)
+            METRICS.bulkhead_in_flight.set(self._in_flight, bulkhead=self.name)
+
+    def _admit(self):
+        self._in_flight += 1
+        METRICS.bulkhead_in_flight.set(self._in_flight, bulkhead=self.name)
+
+    def rejection(self, tool_name: str, reason: str) -> Dict[str, Any]:
+        """Error result for a call the bulkhead did not admit"""
+        METRICS.bulkhead_rejections.inc(bulkhead=self.name, reason=reason)
+        if reason == "deadline":
+            deadline = current_deadline()
+            return {
+                "success": False,
+                "error": f"Run deadline of {deadline.seconds:.0f}s exceeded waiting for bulkhead {self.name}",
+                "deadline_exceeded": True
+            }
+        if reason == "full":
+            detail = f"{self.max_queue} calls already queued"
+        else:
+            waited = self.queue_timeout if self.queue_timeout is not None else DEFAULT_QUEUE_TIMEOUT
+            detail = f"no slot free within {waited:g}s"
+        return {
+            "success": False,
+            "error": f"Bulkhead {self.name} rejected {tool_name}: {self.max_concurrent} calls running, {detail}",
+            "bulkhead_full": True
+        }
+
+class BulkheadRegistry:
+    """
+    Pools declared for an engine, plus the tool-to-pool assignments. Pools are
+    configured as {"pdf": {"max_concurrent": 2, "tools": ["PDFProcessor"]}, ...};
+    a pool may instead claim every tool of a backend with "hosted_by": "mcp".
+    Tool.config["bulkhead"] overrides the assignment: a pool name, a settings dict
+    (its own pool unless it names one), or False to run the tool unbounded.
+    """
+
+    _SETTINGS = ("max_concurrent", "max_queue", "queue_timeout")
+
+    def __init__(self, pools: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._pools: Dict[str, Dict[str, Any]] = {}
+        self._by_tool: Dict[str, str] = {}
+        self._by_backend: Dict[str, str] = {}
+        self._bulkheads: Dict[str, Bulkhead] = {}
+        self._lock = threading.Lock()
+        for name, settings in (pools or {}).items():
+            settings = dict(settings)
+            for tool_name in settings.pop("tools", ()):
+                self._by_tool[tool_name] = name
+            hosted_by = settings.pop("hosted_by", None)
+            if hosted_by is not None:
+                self._by_backend[hosted_by] = name
+            self._pools[name] = self._known(settings)
+
+    def _known(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(settings) - set(self._SETTINGS)
+        if unknown:
+            logger.warning(f"Ignoring unknown bulkhead settings: {', '.join(sorted(unknown))}")
+        return {key: value for key, value in settings.items() if key in self._SETTINGS}
+
+    def _resolve(self, tool_name: str, hosted_by: str,
+                 config: Optional[Dict[str, Any]]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        setting = (config or {}).get("bulkhead")
+        if setting is False:
+            return None
+        if isinstance(setting, str):
+            if setting not in self._pools:
+                logger.warning(f"Tool {tool_name} names undeclared bulkhead {setting}; running it unbounded")
+                return None
+            return setting, self._pools[setting]
+        if isinstance(setting, dict):
+            settings = dict(setting)
+            name = settings.pop("name", tool_name)
+            return name, {**self._pools.get(name, {}), **self._known(settings)}
+        name = self._by_tool.get(tool_name) or self._by_backend.get(hosted_by)
+        if name is None:
+            return None
+        return name, self._pools[name]
+
+    def get(self, tool_name: str, hosted_by: str = "memra",
+            config: Optional[Dict[str, Any]] = None) -> Optional[Bulkhead]:
+        """Bulkhead a tool runs in, or None if it is not assigned to one"""
+        resolved = self._resolve(tool_name, hosted_by, config)
+        if resolved is None:
+            return None
+        name, settings = resolved
+        with self._lock:
+            # The first declaration of a pool sizes it; later ones share it as is
+            bulkhead = self._bulkheads.get(name)
+            if bulkhead is None:
+                bulkhead = self._bulkheads[name] = Bulkhead(name, **settings)
+            return bulkhead
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """{"pool": {"in_flight": n, "queued": n, "max_concurrent": n}} for every pool in use"""
+        with self._lock:
+            bulkheads = list(self._bulkheads.values())
+        return {
+            bulkhead.name: {
+                "in_flight": bulkhead.in_flight,
+                "queued": bulkhead.queued,
+                "max_concurrent": bulkhead.max_concurrent
+            }
+            for bulkhead in bulkheads
+        }
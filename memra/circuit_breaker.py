@@ -0,0 +1,248 @@
+"""
+Circuit breakers for tool endpoints
+One breaker per (host, tool) opens when recent calls fail or run slow too often,
+fails calls fast while open and lets a few probes through before closing again
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, Deque, Iterator
+from urllib.parse import urlsplit
+from .metrics import METRICS
+from .deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_BREAKERS_ENABLED = os.getenv("MEMRA_CIRCUIT_BREAKER", "1").lower() not in ("0", "false", "no")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for memra_circuit_state
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+def endpoint_host(url: str) -> str:
+    """host[:port] of a URL, the first half of a breaker key"""
+    return urlsplit(url).netloc or url
+
+class CircuitBreaker:
+    """Failure-rate and slow-call-rate breaker over a sliding window of calls"""
+
+    def __init__(self, host: str, tool_name: str, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 30.0, slow_call_rate: float = 0.5,
+                 window: int = 20, min_calls: int = 10, open_seconds: float = 30.0,
+                 half_open_probes: int = 3):
+        """
+        Args:
+            failure_rate: Fraction of failed calls in the window that opens the breaker
+            slow_call_seconds: Calls taking longer than this count as slow
+            slow_call_rate: Fraction of slow calls in the window that opens the breaker
+            window: Number of recent calls considered
+            min_calls: Calls needed in the window before the rates are evaluated
+            open_seconds: How long to fail fast before probing
+            half_open_probes: Consecutive successful probes needed to close again
+        """
+        self.host = host
+        self.tool_name = tool_name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        METRICS.circuit_state.set(_STATE_VALUES[CLOSED], host=host, tool=tool_name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._expire_open()
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open only one probe at a time"""
+        with self._lock:
+            self._expire_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        METRICS.circuit_rejections.inc(host=self.host, tool=self.tool_name)
+        return False
+
+    def record(self, failed: bool, seconds: float):
+        """Outcome of a call that allow() let through"""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed or slow:
+                    self._transition(OPEN)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+                return
+            if self._state == OPEN:
+                # A call that started before the breaker opened
+                return
+            self._calls.append((failed, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for call_failed, _ in self._calls if call_failed) / len(self._calls)
+            slow_calls = sum(1 for _, call_slow in self._calls if call_slow) / len(self._calls)
+            if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+                logger.warning(f"Opening circuit for {self.tool_name} on {self.host}: "
+                               f"{failures:.0%} failed, {slow_calls:.0%} slow over {len(self._calls)} calls")
+                self._transition(OPEN)
+
+    def release(self):
+        """Give back a half-open probe whose call ended without telling anything about the endpoint"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def rejection(self) -> Dict[str, Any]:
+        """Error result for a call refused while the breaker is open"""
+        retry_after = self.retry_after()
+        return {
+            "success": False,
+            "error": f"Circuit open for {self.tool_name} on {self.host}, retry in {retry_after:.0f}s",
+            "circuit_open": True,
+            "retry_after": retry_after
+        }
+
+    def _expire_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probe_in_flight = False
+        self._probe_successes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._calls.clear()
+        logger.info(f"Circuit for {self.tool_name} on {self.host} is now {state}")
+        METRICS.circuit_state.set(_STATE_VALUES[state], host=self.host, tool=self.tool_name)
+
+class CallOutcome:
+    """What guard() records: set status_code once the endpoint has answered"""
+
+    def __init__(self):
+        self.status_code: Optional[int] = None
+        # Rate-limit waits inside the call, which say nothing about the endpoint's speed
+        self.waited = 0.0
+
+_current_outcome: contextvars.ContextVar[Optional[CallOutcome]] = contextvars.ContextVar(
+    "memra_call_outcome", default=None)
+
+def record_wait(seconds: float):
+    """Leave seconds spent waiting for rate-limit tokens out of the guarded call's duration"""
+    outcome = _current_outcome.get()
+    if outcome is not None:
+        outcome.waited += seconds
+
+def _out_of_time() -> bool:
+    deadline = current_deadline()
+    return deadline is not None and deadline.expired()
+
+@contextmanager
+def guard(breaker: Optional[CircuitBreaker]) -> Iterator[CallOutcome]:
+    """
+    Record the block's call on a breaker that allow() just let through. No answer, or a 5xx,
+    is a failure; a call cut short by the run deadline or by cancellation releases the
+    half-open probe instead, since it says nothing about the endpoint.
+    """
+    outcome = CallOutcome()
+    if breaker is None:
+        yield outcome
+        return
+    started = time.monotonic()
+    token = _current_outcome.set(outcome)
+    try:
+        yield outcome
+    except DeadlineExceeded:
+        breaker.release()
+        raise
+    except Exception:
+        if _out_of_time():
+            breaker.release()
+        else:
+            breaker.record(True, max(0.0, time.monotonic() - started - outcome.waited))
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    finally:
+        _current_outcome.reset(token)
+    if outcome.status_code is None and _out_of_time():
+        breaker.release()
+        return
+    breaker.record(outcome.status_code is None or outcome.status_code >= 500,
+                   max(0.0, time.monotonic() - started - outcome.waited))
+
+class CircuitBreakerRegistry:
+    """Breakers keyed by (host, tool), created on first use from Tool.config["circuit_breaker"]"""
+
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, tool_name: str, config: Optional[Dict[str, Any]] = None) -> Optional[CircuitBreaker]:
+        """Breaker for a tool at a URL's host, or None when breakers are disabled for it"""
+        settings = (config or {}).get("circuit_breaker")
+        if not CIRCUIT_BREAKERS_ENABLED or settings is False:
+            return None
+        key = (endpoint_host(url), tool_name)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._create(key, settings if isinstance(settings, dict) else {})
+                self._breakers[key] = breaker
+            return breaker
+
+    def _create(self, key: Tuple[str, str], settings: Dict[str, Any]) -> CircuitBreaker:
+        known = ("failure_rate", "slow_call_seconds", "slow_call_rate", "window",
+                 "min_calls", "open_seconds", "half_open_probes")
+        unknown = set(settings) - set(known)
+        if unknown:
+            logger.warning(f"Ignoring unknown circuit breaker settings: {', '.join(sorted(unknown))}")
+        return CircuitBreaker(*key, **{name: value for name, value in settings.items() if name in known})
+
+    def states(self, tool_name: Optional[str] = None) -> Dict[str, str]:
+        """Breaker states as {"host/tool": state}, optionally for one tool"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {
+            f"{breaker.host}/{breaker.tool_name}": breaker.state
+            for breaker in breakers
+            if tool_name is None or breaker.tool_name == tool_name
+        }
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+# Shared by every client in the process so all workers see the same endpoint health
+BREAKERS = CircuitBreakerRegistry()
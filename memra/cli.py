@@ -9,7 +9,6 @@ import time
 import tempfile
 import shutil
 from pathlib import Path
-import importlib.resources as pkg_resources
 
 def run_demo():
     """Run the ETL invoice processing demo with automatic setup"""
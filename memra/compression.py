@@ -0,0 +1,171 @@
+"""
+Payload compression for tool requests and responses
+Negotiates gzip or zstd through Content-Encoding/Accept-Encoding and only
+compresses bodies above a size threshold, where the bandwidth saving pays for the CPU
+"""
+
+import os
+import gzip
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
+from .serialization import JSON, accept_header
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESSION_THRESHOLD = int(os.getenv("MEMRA_COMPRESSION_THRESHOLD", "1024"))
+COMPRESSION_ENABLED = os.getenv("MEMRA_COMPRESSION", "1").lower() not in ("0", "false", "no")
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def zstd_available() -> bool:
+    """zstd needs the optional zstandard package (pip install memra[zstd])"""
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def supported_encodings() -> List[str]:
+    """Encodings this process can read and write, most preferred first"""
+    return ["zstd", "gzip"] if zstd_available() else ["gzip"]
+
+def accept_encoding_header() -> str:
+    return ", ".join(supported_encodings())
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """Undo a Content-Encoding; identity and missing encodings pass through"""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        import zstandard
+        # Frames written in streaming mode carry no content size, so read incrementally
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best encoding we support from an Accept-Encoding header, honouring q=0"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name] = weight
+    for encoding in supported_encodings():
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress_body(data: bytes, encoding: Optional[str],
+                  threshold: int = DEFAULT_COMPRESSION_THRESHOLD) -> Tuple[bytes, Optional[str]]:
+    """Compress data if an encoding is given and data is at least threshold bytes"""
+    if not encoding or not COMPRESSION_ENABLED or len(data) < threshold:
+        return data, None
+    compressed = compress(data, encoding)
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, encoding
+
+# Request encodings each server has advertised, keyed by origin. A server lists
+# what it can decode in the Accept-Encoding header of its responses (RFC 7694),
+# so the first request to a host goes out uncompressed.
+_server_encodings: Dict[str, Optional[str]] = {}
+_server_lock = threading.Lock()
+
+def _origin(url: httpx.URL) -> str:
+    return f"{url.scheme}://{url.host}:{url.port or ''}"
+
+def remember_server_encodings(url: httpx.URL, headers: httpx.Headers):
+    """Record the request encodings a server advertised in a response"""
+    advertised = headers.get("Accept-Encoding")
+    if advertised is None:
+        return
+    with _server_lock:
+        _server_encodings[_origin(url)] = choose_encoding(advertised)
+
+def forget_server_encodings(url: httpx.URL):
+    with _server_lock:
+        _server_encodings[_origin(url)] = None
+
+def request_encoding(url: httpx.URL) -> Optional[str]:
+    with _server_lock:
+        return _server_encodings.get(_origin(url))
+
+def encode_json_body(payload: Any, encoding: Optional[str] = None,
+                     threshold: int = DEFAULT_COMPRESSION_THRESHOLD) -> Tuple[bytes, Dict[str, str]]:
+    """Serialize payload and compress it; returns the body and its content headers"""
+    data = JSON.dumps(payload)
+    body, used = compress_body(data, encoding, threshold)
+    headers = {"Content-Type": "application/json"}
+    if used:
+        headers["Content-Encoding"] = used
+    return body, headers
+
+def _build_json_request(client, url: str, payload: Any, headers: Optional[Dict[str, str]],
+                        timeout: float, compress_request: bool) -> httpx.Request:
+    target = httpx.URL(url)
+    encoding = request_encoding(target) if compress_request else None
+    body, body_headers = encode_json_body(payload, encoding)
+    return client.build_request(
+        "POST", target,
+        headers={"Accept": accept_header(), **(headers or {}), **body_headers},
+        content=body,
+        timeout=timeout
+    )
+
+def send_json(client: httpx.Client, url: str, payload: Any, headers: Optional[Dict[str, str]] = None,
+              timeout: float = 60.0, stream: bool = False) -> httpx.Response:
+    """
+    POST payload as JSON, compressed when the server has advertised support.
+
+    A 415 to a compressed body means the server changed its mind; the request is
+    resent uncompressed and the host is no longer sent compressed bodies.
+    Responses are decompressed by httpx, which sends its own Accept-Encoding;
+    Accept asks for msgpack when it is installed, so decode with decode_response().
+    """
+    request = _build_json_request(client, url, payload, headers, timeout, True)
+    response = client.send(request, stream=stream)
+    if response.status_code == 415 and "Content-Encoding" in request.headers:
+        logger.info(f"{request.url.host} rejected {request.headers['Content-Encoding']} body, resending uncompressed")
+        response.close()
+        forget_server_encodings(request.url)
+        request = _build_json_request(client, url, payload, headers, timeout, False)
+        response = client.send(request, stream=stream)
+    remember_server_encodings(request.url, response.headers)
+    return response
+
+async def asend_json(client: httpx.AsyncClient, url: str, payload: Any,
+                     headers: Optional[Dict[str, str]] = None, timeout: float = 60.0) -> httpx.Response:
+    """Async counterpart of send_json"""
+    request = _build_json_request(client, url, payload, headers, timeout, True)
+    response = await client.send(request)
+    if response.status_code == 415 and "Content-Encoding" in request.headers:
+        logger.info(f"{request.url.host} rejected {request.headers['Content-Encoding']} body, resending uncompressed")
+        await response.aclose()
+        forget_server_encodings(request.url)
+        request = _build_json_request(client, url, payload, headers, timeout, False)
+        response = await client.send(request)
+    remember_server_encodings(request.url, response.headers)
+    return response
@@ -0,0 +1,245 @@
+"""
+Adaptive concurrency limits for tool backends
+AIMD in the style of TCP congestion control: the in-flight limit per backend grows
+by one per window of successful calls and halves on 429/5xx or a latency spike
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Deque
+from urllib.parse import urlsplit
+from .metrics import METRICS
+from .deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_CONCURRENCY_ENABLED = os.getenv("MEMRA_ADAPTIVE_CONCURRENCY", "1").lower() not in ("0", "false", "no")
+DEFAULT_INITIAL_LIMIT = int(os.getenv("MEMRA_CONCURRENCY_INITIAL", "20"))
+DEFAULT_MAX_LIMIT = int(os.getenv("MEMRA_CONCURRENCY_MAX", os.getenv("MEMRA_HTTP_MAX_CONNECTIONS", "100")))
+
+# Statuses that mean the backend is overloaded rather than the request being wrong
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class _Waiter:
+    """A thread (event) or coroutine (future on its loop) queued for a slot"""
+
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+    def wake(self):
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class Slot:
+    """One admitted call; report its outcome with record() before the slot is released"""
+
+    __slots__ = ("tool_name", "started", "status_code", "dropped")
+
+    def __init__(self, tool_name: str):
+        self.tool_name = tool_name
+        self.started = time.monotonic()
+        self.status_code: Optional[int] = None
+        self.dropped = False
+
+    def record(self, status_code: int):
+        self.status_code = status_code
+        self.dropped = status_code in OVERLOAD_STATUSES
+
+class AdaptiveLimiter:
+    """Additive-increase/multiplicative-decrease limit on calls in flight to one backend"""
+
+    def __init__(self, name: str, initial_limit: int = DEFAULT_INITIAL_LIMIT, min_limit: int = 1,
+                 max_limit: int = DEFAULT_MAX_LIMIT, backoff: float = 0.5,
+                 latency_tolerance: float = 2.0, min_latency_samples: int = 10):
+        """
+        Args:
+            name: Backend the limit applies to, e.g. "api.memra.co"
+            initial_limit: Calls allowed in flight before anything is learned
+            min_limit: Floor the limit never drops below
+            max_limit: Ceiling, normally the connection pool size
+            backoff: Factor applied to the limit on overload
+            latency_tolerance: A call slower than this multiple of its tool's
+                baseline latency counts as a latency spike
+            min_latency_samples: Calls per tool before latency spikes are detected
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_samples = min_latency_samples
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        # Smoothed latency and sample count per tool; tools on one backend differ by orders of magnitude
+        self._baselines: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._decreased_at = 0.0
+        self._lock = threading.Lock()
+        METRICS.concurrency_limit.set(int(self._limit), backend=name)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # Admission
+
+    def _try_admit(self) -> bool:
+        if self._in_flight < int(self._limit) and not self._waiters:
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wake_waiters(self):
+        while self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self._waiters.popleft().wake()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a slot; False if none became free within timeout"""
+        with self._lock:
+            if self._try_admit():
+                return True
+            waiter = _Waiter(event=threading.Event())
+            self._waiters.append(waiter)
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    async def aacquire(self):
+        """Async counterpart of acquire(), without blocking the event loop"""
+        import asyncio
+        with self._lock:
+            if self._try_admit():
+                return
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release(None)
+            raise
+
+    def release(self, slot: Optional[Slot]):
+        """Free a slot and adjust the limit from its outcome (None: no outcome, e.g. cancelled)"""
+        with self._lock:
+            self._in_flight -= 1
+            if slot is not None:
+                self._adjust(slot, time.monotonic() - slot.started)
+            self._wake_waiters()
+
+    # Limit adjustment
+
+    def _adjust(self, slot: Slot, latency: float):
+        spike = False
+        if not slot.dropped:
+            baseline = self._baselines.get(slot.tool_name)
+            samples = self._samples.get(slot.tool_name, 0) + 1
+            self._samples[slot.tool_name] = samples
+            if baseline is not None and samples > self.min_latency_samples:
+                spike = latency > baseline * self.latency_tolerance
+            # Spikes are left out so a slow period does not become the new normal
+            if not spike:
+                self._baselines[slot.tool_name] = latency if baseline is None else baseline + 0.1 * (latency - baseline)
+
+        if slot.dropped or spike:
+            # Calls already in flight when the limit was cut report the same overload; count it once
+            if slot.started < self._decreased_at:
+                return
+            previous = int(self._limit)
+            self._limit = max(float(self.min_limit), self._limit * self.backoff)
+            self._decreased_at = time.monotonic()
+            reason = f"HTTP {slot.status_code}" if slot.status_code is not None else \
+                ("latency spike" if spike else "transport error")
+            logger.info(f"Concurrency limit for {self.name}: {previous} -> {int(self._limit)} ({reason})")
+        elif self._in_flight + 1 >= self._limit / 2:
+            # Only grow while the limit is actually being used
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+        METRICS.concurrency_limit.set(int(self._limit), backend=self.name)
+
+    @contextmanager
+    def slot(self, tool_name: str):
+        """Hold a slot for one call; exceptions count as overload"""
+        deadline = current_deadline()
+        if not self.acquire(deadline.remaining() if deadline is not None else None):
+            raise DeadlineExceeded(f"No slot for {self.name} before the run deadline")
+        slot = Slot(tool_name)
+        try:
+            yield slot
+        except Exception:
+            slot.dropped = True
+            raise
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def aslot(self, tool_name: str):
+        """Async counterpart of slot()"""
+        import asyncio
+        deadline = current_deadline()
+        try:
+            await asyncio.wait_for(self.aacquire(), deadline.remaining() if deadline is not None else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"No slot for {self.name} before the run deadline")
+        slot = Slot(tool_name)
+        try:
+            yield slot
+        except Exception:
+            slot.dropped = True
+            raise
+        except BaseException:
+            # Cancelled: no outcome to learn from
+            slot = None
+            raise
+        finally:
+            self.release(slot)
+
+class LimiterRegistry:
+    """One AdaptiveLimiter per backend host, shared by every client in the process"""
+
+    def __init__(self, **limiter_settings: Any):
+        self.limiter_settings = limiter_settings
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> AdaptiveLimiter:
+        backend = urlsplit(url).netloc or url
+        with self._lock:
+            limiter = self._limiters.get(backend)
+            if limiter is None:
+                limiter = self._limiters[backend] = AdaptiveLimiter(backend, **self.limiter_settings)
+            return limiter
+
+    def limits(self) -> Dict[str, int]:
+        with self._lock:
+            return {backend: limiter.limit for backend, limiter in self._limiters.items()}
+
+LIMITERS = LimiterRegistry()
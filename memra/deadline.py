@@ -0,0 +1,70 @@
+"""
+Per-run deadlines carried through a context variable
+The engine opens one from ExecutionPolicy.timeout_seconds; clients, retries and
+agent hooks read it so every HTTP timeout is capped by the budget that is left
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+class DeadlineExceeded(Exception):
+    """The run's time budget ran out before the operation could start"""
+
+class Deadline:
+    """A point in time (monotonic) by which a run must finish"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, default: float) -> float:
+        """default capped by the remaining budget; raises DeadlineExceeded once it is spent"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Run deadline of {self.seconds:.0f}s exceeded")
+        return min(default, remaining)
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "memra_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the run executing in this context (threads started with a copied context included)"""
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Run the block under a deadline seconds from now; None keeps the enclosing one.
+    A nested scope never extends an enclosing deadline.
+    """
+    enclosing = _current_deadline.get()
+    if seconds is None:
+        yield enclosing
+        return
+    deadline = Deadline(seconds)
+    if enclosing is not None and enclosing.expires_at < deadline.expires_at:
+        deadline = enclosing
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current run's budget is already spent"""
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"Run deadline of {deadline.seconds:.0f}s exceeded")
+
+def request_timeout(default: float) -> float:
+    """Timeout for one HTTP request: default, or less if the current deadline is closer"""
+    deadline = _current_deadline.get()
+    return default if deadline is None else deadline.timeout(default)
@@ -7,14 +7,18 @@ Complete ETL workflow with database monitoring before and after
 import os
 import sys
 import time
-import random
 from pathlib import Path
 from memra import Agent, Department, LLM, check_api_health, get_api_status
 from memra.execution import ExecutionEngine, ExecutionTrace
+from memra.planner import CapacityPlanner, LatencyHistory
+from memra.tool_registry_client import ToolRegistryClient
+from memra.retry import RetryPolicy
+from memra.rate_limit import Rate
+from memra.deadline import current_deadline
+from memra.outbox import OUTBOX, OUTBOX_ENABLED
 from memra.demos.etl_invoice_processing.database_monitor_agent import create_simple_monitor_agent, get_monitoring_queries
 import glob
 import requests
-import base64
 import json
 
 # Set API key for authentication - use environment variable if set, otherwise use development key
@@ -60,14 +64,26 @@ TARGET_FILES = [
 
 # Configuration for robust processing
 PROCESSING_CONFIG = {
-    "delay_between_files": 2.5,  # seconds
+    "rate_limit": "60/min",  # API requests, shared by every worker on this host
     "max_retries": 3,
     "retry_delay_base": 2,  # seconds
     "retry_delay_max": 30,  # seconds
-    "timeout_seconds": 120,
-    "rate_limit_delay": 5  # additional delay if rate limited
+    "timeout_seconds": 120
 }
 
+# Read by every ToolRegistryClient, including the engine's
+os.environ.setdefault("MEMRA_RATE_LIMIT", PROCESSING_CONFIG["rate_limit"])
+
+# Backoff for API calls: full jitter capped by the settings above, honouring Retry-After
+DEMO_RETRY_POLICY = RetryPolicy(
+    max_attempts=PROCESSING_CONFIG["max_retries"] + 1,
+    base_delay=PROCESSING_CONFIG["retry_delay_base"],
+    max_delay=PROCESSING_CONFIG["retry_delay_max"]
+)
+
+# Tool latencies recorded by previous runs, used to estimate batch duration
+LATENCY_HISTORY_PATH = os.getenv("MEMRA_LATENCY_HISTORY", ".memra_latency_history.json")
+
 # Check API health before starting
 print("🔍 Checking Memra API status...")
 api_status = get_api_status()
@@ -76,8 +92,11 @@ print(f"API URL: {api_status['api_url']}")
 print(f"Tools Available: {api_status['tools_available']}")
 
 if not api_status['api_healthy']:
-    print("❌ Cannot proceed - Memra API is not available")
-    sys.exit(1)
+    if OUTBOX_ENABLED:
+        # Tool calls are queued in the local outbox and replayed once the API is back
+        print("⚠️  Memra API is not available - tool calls will be queued and replayed when it returns")
+    else:
+        print("⚠️  Memra API is not available - set MEMRA_OUTBOX=1 to queue tool calls until it returns")
 
 # Define LLMs
 default_llm = LLM(
@@ -463,211 +482,139 @@ def direct_vision_processing(agent, result_data, **kwargs):
         print("❌ No file path provided")
         return result_data
     
-    # Retry logic for vision processing
+    # HTTP-level retries (429/5xx/timeouts, honouring Retry-After) happen inside the client;
+    # with MEMRA_OUTBOX=1, calls made while the API is down wait in the outbox for the
+    # drainer started in main()
+    client = ToolRegistryClient(api_base=REMOTE_API_URL, retry_policy=DEMO_RETRY_POLICY)
+    
+    # A remote path was uploaded earlier; a local file is sent along with the tool call
+    if file_path.startswith('/uploads/'):
+        print(f"✅ File already uploaded to remote API: {file_path}")
+    else:
+        print(f"📤 Sending {os.path.basename(file_path)} with the PDFProcessor request...")
+    
+    # Convert schema to format expected by PDFProcessor
+    schema_for_pdf = None
+    if schema_results:
+        # Send the raw schema array - server now handles both formats
+        schema_for_pdf = [
+            col for col in schema_results
+            if col["column_name"] not in ["id", "created_at", "updated_at", "status", "raw_json"]
+        ]
+        print(f"📋 Passing schema with {len(schema_for_pdf)} fields to PDFProcessor")
+        print(f"📋 Schema fields: {[c['column_name'] for c in schema_for_pdf]}")
+    
+    # Retry when the model returns no vision response (might be temporary API issue)
     for attempt in range(PROCESSING_CONFIG["max_retries"] + 1):
-        try:
-            import requests
-            import json
-            import os
-            import base64
-            
-            # Use the remote API for PDF processing
-            api_url = "https://api.memra.co"
-            api_key = os.getenv("MEMRA_API_KEY", "test-secret-for-development")
-            
-            # Check if file is already a remote path
-            if file_path.startswith('/uploads/'):
-                print(f"✅ File already uploaded to remote API: {file_path}")
-                remote_path = file_path
-            else:
-                # Local file - need to upload
-                print(f"📤 Uploading file to remote API (attempt {attempt + 1})...")
-                
-                # Read the file and encode as base64
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-            
-                file_b64 = base64.b64encode(file_content).decode('utf-8')
-                
-                # Prepare upload data
-                upload_data = {
-                    "filename": os.path.basename(file_path),
-                    "content": file_b64,
-                    "content_type": "application/pdf"
+        print(f"🔍 Calling PDFProcessor (attempt {attempt + 1})...")
+        if file_path.startswith('/uploads/'):
+            pdf_result = client.execute_tool(
+                "PDFProcessor",
+                "memra",
+                {
+                    "file": file_path,
+                    "schema": schema_for_pdf
                 }
-                
-                # Upload to remote API with timeout
-                response = requests.post(
-                    f"{api_url}/upload",
-                    json=upload_data,
-                    headers={
-                        "X-API-Key": api_key,
-                        "Content-Type": "application/json"
-                    },
-                    timeout=PROCESSING_CONFIG["timeout_seconds"]
-                )
-                
-                if response.status_code != 200:
-                    print(f"❌ Upload failed: {response.status_code}")
-                    print(f"   Response: {response.text}")
-                    
-                    # Check for rate limiting
-                    if response.status_code == 429:
-                        delay = PROCESSING_CONFIG["rate_limit_delay"] * (2 ** attempt)
-                        print(f"⏳ Rate limited, waiting {delay}s before retry...")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        return result_data
-                
-                upload_result = response.json()
-                if not upload_result.get("success"):
-                    print(f"❌ Upload failed: {upload_result.get('error')}")
-                    return result_data
-                
-                remote_path = upload_result["data"]["remote_path"]
-                print(f"✅ File uploaded successfully")
-                print(f"   Remote path: {remote_path}")
-            
-            # Now call the PDFProcessor with the remote path
-            print(f"🔍 Calling PDFProcessor with remote path (attempt {attempt + 1})...")
-            
-            # Convert schema to format expected by PDFProcessor
-            schema_for_pdf = None
-            if schema_results:
-                # Send the raw schema array - server now handles both formats
-                schema_for_pdf = [
-                    col for col in schema_results
-                    if col["column_name"] not in ["id", "created_at", "updated_at", "status", "raw_json"]
-                ]
-                print(f"📋 Passing schema with {len(schema_for_pdf)} fields to PDFProcessor")
-                print(f"📋 Schema fields: {[c['column_name'] for c in schema_for_pdf]}")
-            
-            response = requests.post(
-                f"{api_url}/tools/execute",
-                json={
-                    "tool_name": "PDFProcessor",
-                    "hosted_by": "memra",
-                    "input_data": {
-                        "file": remote_path,
-                        "schema": schema_for_pdf
-                    }
-                },
-                headers={
-                    "X-API-Key": api_key,
-                    "Content-Type": "application/json"
-                },
+            )
+        else:
+            # One multipart request instead of an upload followed by the tool call
+            pdf_result = client.execute_tool_with_file(
+                "PDFProcessor",
+                "memra",
+                file_path,
+                {"schema": schema_for_pdf},
+                content_type="application/pdf",
                 timeout=PROCESSING_CONFIG["timeout_seconds"]
             )
+        
+        if pdf_result.get("queued"):
+            # Still unavailable at the run deadline; the outbox keeps the result when it arrives
+            print(f"📮 PDFProcessor call queued as outbox entry {pdf_result['outbox_id']}")
+            return result_data
+        
+        if not pdf_result.get("success") and "status_code" in pdf_result:
+            print(f"❌ PDFProcessor call failed: {pdf_result.get('error')}")
+            return result_data
+        
+        print(f"\n🎯 AGENT 3 - FULL PDFPROCESSOR RESPONSE:")
+        print("=" * 60)
+        print(json.dumps(pdf_result, indent=2, default=str))
+        print("=" * 60)
+        
+        # Extract the vision response from the nested structure
+        vision_response = None
+        if pdf_result.get("success") and "data" in pdf_result:
+            data = pdf_result["data"]
             
-            if response.status_code != 200:
-                print(f"❌ PDFProcessor call failed: {response.status_code}")
-                print(f"   Response: {response.text}")
-                
-                # Check for rate limiting
-                if response.status_code == 429:
-                    delay = PROCESSING_CONFIG["rate_limit_delay"] * (2 ** attempt)
-                    print(f"⏳ Rate limited, waiting {delay}s before retry...")
-                    time.sleep(delay)
-                    continue
-                else:
-                    return result_data
-            
-            pdf_result = response.json()
-            print(f"\n🎯 AGENT 3 - FULL PDFPROCESSOR RESPONSE:")
+            # Check for nested data structure
+            if isinstance(data, dict) and "data" in data:
+                actual_data = data["data"]
+                if "vision_response" in actual_data:
+                    vision_response = actual_data["vision_response"]
+            elif "vision_response" in data:
+                vision_response = data["vision_response"]
+        
+        if vision_response:
+            print(f"\n🎯 AGENT 3 - RAW VISION MODEL JSON:")
             print("=" * 60)
-            print(json.dumps(pdf_result, indent=2, default=str))
+            print(vision_response)
             print("=" * 60)
             
-            # Extract the vision response from the nested structure
-            vision_response = None
-            if pdf_result.get("success") and "data" in pdf_result:
-                data = pdf_result["data"]
+            # Try to parse the JSON response
+            try:
+                # Clean up the response - remove markdown code blocks if present
+                cleaned_response = vision_response
+                if cleaned_response.startswith("```json"):
+                    cleaned_response = cleaned_response.replace("```json", "").replace("```", "").strip()
+                elif cleaned_response.startswith("```"):
+                    cleaned_response = cleaned_response.replace("```", "").strip()
                 
-                # Check for nested data structure
-                if isinstance(data, dict) and "data" in data:
-                    actual_data = data["data"]
-                    if "vision_response" in actual_data:
-                        vision_response = actual_data["vision_response"]
-                elif "vision_response" in data:
-                    vision_response = data["vision_response"]
-            
-            if vision_response:
-                print(f"\n🎯 AGENT 3 - RAW VISION MODEL JSON:")
-                print("=" * 60)
-                print(vision_response)
-                print("=" * 60)
+                parsed_data = json.loads(cleaned_response)
+                print(f"\n✅ [AGENT 3] Successfully parsed JSON:")
+                print(json.dumps(parsed_data, indent=2))
                 
-                # Try to parse the JSON response
-                try:
-                    # Clean up the response - remove markdown code blocks if present
-                    cleaned_response = vision_response
-                    if cleaned_response.startswith("```json"):
-                        cleaned_response = cleaned_response.replace("```json", "").replace("```", "").strip()
-                    elif cleaned_response.startswith("```"):
-                        cleaned_response = cleaned_response.replace("```", "").strip()
-                    
-                    parsed_data = json.loads(cleaned_response)
-                    print(f"\n✅ [AGENT 3] Successfully parsed JSON:")
-                    print(json.dumps(parsed_data, indent=2))
-                    
-                    # Convert to the expected format
-                    extracted_data = convert_vision_response_to_extracted_data(cleaned_response)
-                    
-                    # Debug vendor extraction
-                    print(f"\n🔍 [AGENT 3] Extracted vendor: '{extracted_data['headerSection']['vendorName']}'")
-                    print(f"   Invoice #: {extracted_data['billingDetails']['invoiceNumber']}")
-                    print(f"   Amount: ${extracted_data['chargesSummary']['document_total']}")
-                    
-                    # Update the result_data
-                    result_data = {
-                        "success": True,
-                        "data": {
-                            "vision_response": vision_response,
-                            "extracted_data": extracted_data
-                        },
-                        "_memra_metadata": {
-                            "agent_role": agent.role,
-                            "tools_real_work": ["PDFProcessor"],
-                            "tools_mock_work": [],
-                            "work_quality": "real"
-                        }
+                # Convert to the expected format
+                extracted_data = convert_vision_response_to_extracted_data(cleaned_response)
+                
+                # Debug vendor extraction
+                print(f"\n🔍 [AGENT 3] Extracted vendor: '{extracted_data['headerSection']['vendorName']}'")
+                print(f"   Invoice #: {extracted_data['billingDetails']['invoiceNumber']}")
+                print(f"   Amount: ${extracted_data['chargesSummary']['document_total']}")
+                
+                # Update the result_data
+                result_data = {
+                    "success": True,
+                    "data": {
+                        "vision_response": vision_response,
+                        "extracted_data": extracted_data
+                    },
+                    "_memra_metadata": {
+                        "agent_role": agent.role,
+                        "tools_real_work": ["PDFProcessor"],
+                        "tools_mock_work": [],
+                        "work_quality": "real"
                     }
-                    
-                    return result_data
-                    
-                except json.JSONDecodeError as e:
-                    print(f"❌ JSON parsing error: {e}")
-                    print(f"Raw response: {vision_response}")
-                    
-                    # Don't retry on JSON parsing errors
-                    return result_data
-            else:
-                print(f"❌ No vision_response found in PDFProcessor result")
+                }
                 
-                # Retry if no vision response (might be temporary API issue)
-                if attempt < PROCESSING_CONFIG["max_retries"]:
-                    delay = PROCESSING_CONFIG["retry_delay_base"] * (2 ** attempt)
-                    print(f"⏳ No vision response, waiting {delay}s before retry...")
-                    time.sleep(delay)
-                    continue
-                else:
-                    return result_data
-                    
-        except requests.exceptions.Timeout:
-            print(f"⏰ Vision processing timeout (attempt {attempt + 1})")
-            if attempt < PROCESSING_CONFIG["max_retries"]:
-                delay = PROCESSING_CONFIG["retry_delay_base"] * (2 ** attempt)
-                print(f"⏳ Waiting {delay}s before retry...")
-                time.sleep(delay)
-            continue
-        except Exception as e:
-            print(f"❌ Error in PDF processing (attempt {attempt + 1}): {e}")
-            if attempt < PROCESSING_CONFIG["max_retries"]:
-                delay = PROCESSING_CONFIG["retry_delay_base"] * (2 ** attempt)
-                print(f"⏳ Waiting {delay}s before retry...")
-                time.sleep(delay)
-            continue
+                return result_data
+                
+            except json.JSONDecodeError as e:
+                print(f"❌ JSON parsing error: {e}")
+                print(f"Raw response: {vision_response}")
+                
+                # Don't retry on JSON parsing errors
+                return result_data
+        
+        print(f"❌ No vision_response found in PDFProcessor result")
+        if attempt < PROCESSING_CONFIG["max_retries"]:
+            delay = DEMO_RETRY_POLICY.backoff(attempt)
+            # The hook runs inside the department's deadline (execution_policy.timeout_seconds)
+            deadline = current_deadline()
+            if deadline is not None and delay >= deadline.remaining():
+                print(f"⏰ Run deadline reached, not retrying PDFProcessor")
+                break
+            print(f"⏳ No vision response, waiting {delay:.1f}s before retry...")
+            time.sleep(delay)
     
     print(f"❌ Failed to process vision after {PROCESSING_CONFIG['max_retries'] + 1} attempts")
     return result_data
@@ -704,7 +651,9 @@ parser_agent = Agent(
     ],
     systems=["InvoiceStore"],
     tools=[
-        {"name": "PDFProcessor", "hosted_by": "memra", "input_keys": ["file_path"]}
+        # Vision calls run in their own pool so they cannot starve the database steps
+        {"name": "PDFProcessor", "hosted_by": "memra", "input_keys": ["file_path"],
+         "config": {"bulkhead": {"name": "vision", "max_concurrent": 2}}}
     ],
     input_keys=["file", "invoice_schema"],
     output_key="invoice_data",
@@ -871,87 +820,6 @@ etl_department = Department(
     }
 )
 
-def upload_file_to_api(file_path: str, api_url: str = "https://api.memra.co", max_retries: int = 3) -> str:
-    """Upload a file to the remote API for vision-based PDF processing with retry logic"""
-    
-    for attempt in range(max_retries + 1):
-        try:
-            print(f"📤 Uploading {os.path.basename(file_path)} to remote API (attempt {attempt + 1}/{max_retries + 1})")
-            print(f"   File path: {file_path}")
-            
-            # Read the file and encode as base64
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-            
-            file_b64 = base64.b64encode(file_content).decode('utf-8')
-            
-            # Prepare upload data
-            upload_data = {
-                "filename": os.path.basename(file_path),
-                "content": file_b64,
-                "content_type": "application/pdf"
-            }
-            
-            # Upload to remote API
-            api_key = os.getenv("MEMRA_API_KEY")
-            response = requests.post(
-                f"{api_url}/upload",
-                json=upload_data,
-                headers={
-                    "X-API-Key": api_key,
-                    "Content-Type": "application/json"
-                },
-                timeout=PROCESSING_CONFIG["timeout_seconds"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("success"):
-                    remote_path = result["data"]["remote_path"]
-                    print(f"✅ File uploaded successfully")
-                    print(f"   Remote path: {remote_path}")
-                    return remote_path
-                else:
-                    error_msg = result.get('error', 'Unknown error')
-                    print(f"❌ Upload failed: {error_msg}")
-                    
-                    # Check if it's a rate limit error
-                    if "rate limit" in error_msg.lower() or "too many requests" in error_msg.lower():
-                        delay = PROCESSING_CONFIG["rate_limit_delay"] * (2 ** attempt)
-                        print(f"⏳ Rate limited, waiting {delay}s before retry...")
-                        time.sleep(delay)
-                        continue
-            elif response.status_code == 429:  # Rate limited
-                delay = PROCESSING_CONFIG["rate_limit_delay"] * (2 ** attempt)
-                print(f"⏳ Rate limited (HTTP 429), waiting {delay}s before retry...")
-                time.sleep(delay)
-                continue
-            else:
-                print(f"❌ Upload request failed: {response.status_code}")
-                print(f"   Response: {response.text}")
-                
-                # Don't retry on client errors (4xx) except 429
-                if 400 <= response.status_code < 500 and response.status_code != 429:
-                    break
-                    
-        except requests.exceptions.Timeout:
-            print(f"⏰ Upload timeout (attempt {attempt + 1})")
-            if attempt < max_retries:
-                delay = PROCESSING_CONFIG["retry_delay_base"] * (2 ** attempt)
-                print(f"⏳ Waiting {delay}s before retry...")
-                time.sleep(delay)
-            continue
-        except Exception as e:
-            print(f"⚠️  Upload error (attempt {attempt + 1}): {e}")
-            if attempt < max_retries:
-                delay = PROCESSING_CONFIG["retry_delay_base"] * (2 ** attempt)
-                print(f"⏳ Waiting {delay}s before retry...")
-                time.sleep(delay)
-            continue
-    
-    print(f"❌ Failed to upload {os.path.basename(file_path)} after {max_retries + 1} attempts")
-    return file_path
-
 def print_vision_model_data(agent, tool_results):
     """Print out the JSON data returned by vision model tools"""
     print(f"\n🔍 {agent.role}: VISION MODEL DATA ANALYSIS")
@@ -1113,7 +981,16 @@ def main():
         print("⚠️  Please fix agent configuration before running ETL process")
         sys.exit(1)
     
-    engine = ExecutionEngine()
+    latency_history = LatencyHistory.load(LATENCY_HISTORY_PATH)
+    engine = ExecutionEngine(latency_history=latency_history)
+    if OUTBOX_ENABLED:
+        # Survive API outages mid-batch: queue calls the API cannot take and replay them
+        # at the rate limit as soon as its health check passes again. Entries outlive
+        # this process: any that are still pending at exit are replayed by the next
+        # run using the same outbox file (MEMRA_OUTBOX_DB), even if this run gave up
+        # on them. That includes PostgresInsert, so a replayed insert can write a row
+        # this run reported as failed. The outbox is therefore opt-in (MEMRA_OUTBOX=1).
+        OUTBOX.start_drainer(ToolRegistryClient(api_base=REMOTE_API_URL), drain_rate=PROCESSING_CONFIG["rate_limit"])
     
     # Use configurable data directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -1144,7 +1021,14 @@ def main():
         sys.exit(1)
 
     print(f"\n📁 Found {len(invoice_files)} target files to process")
-    print(f"⏱️  Estimated processing time: {len(invoice_files) * PROCESSING_CONFIG['delay_between_files']:.1f} seconds (plus processing time)")
+    planner = CapacityPlanner(latency_history, concurrency=1, rate_limits={
+        "memra-api": Rate.parse(PROCESSING_CONFIG["rate_limit"]).per_second
+    })
+    plan = planner.plan(etl_department, len(invoice_files))
+    print(f"⏱️  Estimated processing time: {plan.estimated_duration_seconds:.1f} seconds "
+          f"(p95 {plan.p95_duration_seconds:.1f}s)")
+    if any(not stage.sampled for stage in plan.stages):
+        print("   (some tools have no recorded latency yet - the estimate improves after a run)")
     
     # Process files with robust error handling
     successful_processing = 0
@@ -1157,24 +1041,10 @@ def main():
         print(f"📄 Processing file {idx + 1}/{len(invoice_files)}: {filename}")
         print(f"{'='*60}")
         
-        # Add delay between files (except for the first one)
-        if idx > 0:
-            delay = PROCESSING_CONFIG["delay_between_files"] + random.uniform(0, 1)  # Add some randomness
-            print(f"⏳ Waiting {delay:.1f}s between files...")
-            time.sleep(delay)
-        
         try:
-            # Upload file with retry logic
-            remote_file_path = upload_file_to_api(invoice_file, max_retries=PROCESSING_CONFIG["max_retries"])
-            
-            if remote_file_path == invoice_file:
-                print(f"❌ Failed to upload {filename}, skipping...")
-                failed_processing += 1
-                continue
-
-            # Run the full ETL workflow with configurable parameters
+            # The local path is passed on; the invoice agent sends the file with its tool call
             input_data = {
-                "file": remote_file_path,
+                "file": invoice_file,
                 "connection": config["database_url"],
                 "table_name": config["table_name"],
                 "sql_query": schema_query
@@ -1219,6 +1089,23 @@ def main():
     print(f"   ⏭️  Skipped: {skipped_processing}")
     print(f"   📄 Total: {len(invoice_files)}")
     
+    if OUTBOX_ENABLED:
+        OUTBOX.stop_drainer()
+        pending = OUTBOX.pending_count()
+        if pending:
+            print(f"   📮 Queued: {pending} tool call(s) still in the outbox, replayed on the next run")
+    
+    # Keep latencies for the next run's estimate
+    try:
+        latency_history.save(LATENCY_HISTORY_PATH)
+    except Exception as e:
+        print(f"⚠️  Could not save latency history: {e}")
+    
+    # Per-step retained memory (enable with MEMRA_MEMORY_TRACKING=1)
+    if engine.memory_tracker:
+        print()
+        engine.memory_tracker.show_summary()
+    
     if successful_processing > 0:
         print(f"\n🎉 Demo completed successfully!")
         print(f"   Processed {successful_processing} invoices with robust error handling")
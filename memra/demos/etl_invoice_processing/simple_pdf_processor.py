@@ -6,8 +6,6 @@ Simple PDF Processor - Direct API call without complex post-processing
 import os
 import sys
 import json
-import requests
-import base64
 
 # Add the parent directory to the path to import memra modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -20,49 +18,18 @@ os.environ["MEMRA_API_KEY"] = "test-secret-for-development"
 
 def upload_file_to_api(file_path: str, api_url: str = "https://api.memra.co") -> str:
     """Upload a file to the remote API"""
-    try:
-        print(f"📤 Uploading {os.path.basename(file_path)} to remote API")
-        
-        # Read the file and encode as base64
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-        
-        file_b64 = base64.b64encode(file_content).decode('utf-8')
-        
-        # Prepare upload data
-        upload_data = {
-            "filename": os.path.basename(file_path),
-            "content": file_b64,
-            "content_type": "application/pdf"
-        }
-        
-        # Upload to remote API
-        api_key = os.getenv("MEMRA_API_KEY")
-        response = requests.post(
-            f"{api_url}/upload",
-            json=upload_data,
-            headers={
-                "X-API-Key": api_key,
-                "Content-Type": "application/json"
-            }
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success"):
-                remote_path = result["data"]["remote_path"]
-                print(f"✅ File uploaded successfully")
-                print(f"   Remote path: {remote_path}")
-                return remote_path
-            else:
-                print(f"❌ Upload failed: {result.get('error')}")
-                return file_path
-        else:
-            print(f"❌ Upload request failed: {response.status_code}")
-            return file_path
-                
-    except Exception as e:
-        print(f"⚠️  Upload error: {e}")
+    print(f"📤 Uploading {os.path.basename(file_path)} to remote API")
+    
+    # Stream the file to the API instead of base64-encoding it in JSON
+    result = ToolRegistryClient(api_base=api_url).upload_file(file_path, content_type="application/pdf")
+    
+    if result.get("success"):
+        remote_path = result["data"]["remote_path"]
+        print(f"✅ File uploaded successfully")
+        print(f"   Remote path: {remote_path}")
+        return remote_path
+    else:
+        print(f"❌ Upload failed: {result.get('error')}")
         return file_path
 
 def process_pdf_simple(file_path: str) -> dict:
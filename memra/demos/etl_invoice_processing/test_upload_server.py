@@ -9,9 +9,13 @@ import os
 import uuid
 import asyncio
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException
+import hashlib
+import json
+import re
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict
 import uvicorn
 
 # Models
@@ -29,66 +33,126 @@ class ToolExecuteRequest(BaseModel):
     tool_name: str
     hosted_by: str
     input_data: dict
+    config: Optional[dict] = None
 
 class ToolExecuteResponse(BaseModel):
     success: bool
     data: Optional[dict] = None
     error: Optional[str] = None
 
+class BatchToolExecuteRequest(BaseModel):
+    invocations: List[ToolExecuteRequest]
+
+class BatchToolExecuteResponse(BaseModel):
+    results: List[ToolExecuteResponse]
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
 # File storage configuration
 UPLOAD_DIR = "/tmp/test_uploads"
 FILE_EXPIRY_HOURS = 24
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # 50MB
+
+# Resumable upload sessions: upload_id -> filename, content_type, size, offset, part_path
+UPLOAD_SESSIONS: Dict[str, dict] = {}
+# Stored files by sha256 of their content, for HEAD /upload/digests/{digest}
+UPLOADS_BY_DIGEST: Dict[str, dict] = {}
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 app = FastAPI(title="Test Upload Server", version="1.0.0")
+# Compress large tool results (e.g. SQL rows) like the hosted API does
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+def new_upload_target(filename: str):
+    """Unique stored name and path for an uploaded file"""
+    file_id = str(uuid.uuid4())
+    remote_filename = f"{file_id}{os.path.splitext(filename)[1]}"
+    return file_id, remote_filename, os.path.join(UPLOAD_DIR, remote_filename)
+
+def uploaded_response(file_id: str, remote_filename: str, filename: str, digest: str) -> FileUploadResponse:
+    expires_at = datetime.utcnow() + timedelta(hours=FILE_EXPIRY_HOURS)
+    print(f"📤 Uploaded file: {filename} -> {remote_filename}")
+    data = {
+        "remote_path": f"/uploads/{remote_filename}",
+        "file_id": file_id,
+        "expires_at": expires_at.isoformat(),
+        "original_filename": filename,
+        "sha256": digest
+    }
+    UPLOADS_BY_DIGEST[digest] = data
+    return FileUploadResponse(success=True, data=data)
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def check_pdf(content_type: str):
+    if not content_type.startswith("application/pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+async def stream_body_to(request: Request, f, limit: int, hasher=None) -> int:
+    """Write the request body to f chunk by chunk; returns bytes written"""
+    written = 0
+    async for chunk in request.stream():
+        written += len(chunk)
+        if written > limit:
+            raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+        f.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+    return written
+
+@app.head("/upload/digests/{digest}")
+async def find_upload_by_digest(digest: str):
+    """200 with the stored file's details in headers if these bytes were uploaded and have not expired"""
+    data = UPLOADS_BY_DIGEST.get(digest.lower())
+    if data is None:
+        return Response(status_code=404)
+    stored_path = os.path.join(UPLOAD_DIR, os.path.basename(data["remote_path"]))
+    if not os.path.exists(stored_path) or datetime.fromisoformat(data["expires_at"]) <= datetime.utcnow():
+        del UPLOADS_BY_DIGEST[digest.lower()]
+        return Response(status_code=404)
+    return Response(status_code=200, headers={
+        "X-Remote-Path": data["remote_path"],
+        "X-File-Id": data["file_id"],
+        "X-Expires-At": data["expires_at"]
+    })
+
 @app.post("/upload", response_model=FileUploadResponse)
 async def upload_file(request: FileUploadRequest):
-    """Upload a file to the server for processing"""
+    """Upload a base64-encoded file (legacy; prefer /upload/raw or /upload/sessions)"""
     try:
         # Validate file type
-        if not request.content_type.startswith("application/pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+        check_pdf(request.content_type)
         
         # Validate file size (50MB limit)
         try:
             file_content = base64.b64decode(request.content)
-            if len(file_content) > 50 * 1024 * 1024:  # 50MB
-                raise HTTPException(status_code=400, detail="File too large (max 50MB)")
         except Exception as e:
             raise HTTPException(status_code=400, detail="Invalid base64 content")
+        if len(file_content) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail="File too large (max 50MB)")
         
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(request.filename)[1]
-        remote_filename = f"{file_id}{file_extension}"
-        remote_path = os.path.join(UPLOAD_DIR, remote_filename)
-        
-        # Save file
+        # Save file under a unique name
+        file_id, remote_filename, remote_path = new_upload_target(request.filename)
         with open(remote_path, 'wb') as f:
             f.write(file_content)
         
-        # Calculate expiry time
-        expires_at = datetime.utcnow() + timedelta(hours=FILE_EXPIRY_HOURS)
-        
-        print(f"📤 Uploaded file: {request.filename} -> {remote_filename}")
-        
-        return FileUploadResponse(
-            success=True,
-            data={
-                "remote_path": f"/uploads/{remote_filename}",
-                "file_id": file_id,
-                "expires_at": expires_at.isoformat(),
-                "original_filename": request.filename
-            }
-        )
+        return uploaded_response(file_id, remote_filename, request.filename,
+                                 hashlib.sha256(file_content).hexdigest())
         
     except HTTPException:
         raise
@@ -98,12 +162,138 @@ async def upload_file(request: FileUploadRequest):
             error=f"Upload failed: {str(e)}"
         )
 
+@app.post("/upload/raw", response_model=FileUploadResponse)
+async def upload_raw(request: Request, filename: str):
+    """Upload a file sent as the raw request body, streamed to disk"""
+    check_pdf(request.headers.get("content-type", ""))
+    file_id, remote_filename, remote_path = new_upload_target(filename)
+    hasher = hashlib.sha256()
+    try:
+        with open(remote_path, 'wb') as f:
+            await stream_body_to(request, f, MAX_UPLOAD_BYTES, hasher)
+    except BaseException:
+        os.remove(remote_path)
+        raise
+    return uploaded_response(file_id, remote_filename, filename, hasher.hexdigest())
+
+@app.post("/upload/multipart", response_model=FileUploadResponse)
+async def upload_multipart(request: Request):
+    """Upload a file sent as the "file" field of a multipart form (needs python-multipart)"""
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None or not hasattr(upload, "file"):
+        raise HTTPException(status_code=400, detail="Missing file field")
+    check_pdf(upload.content_type or "")
+    file_id, remote_filename, remote_path = new_upload_target(upload.filename)
+    hasher = hashlib.sha256()
+    with open(remote_path, 'wb') as f:
+        for chunk in iter(lambda: upload.file.read(64 * 1024), b""):
+            f.write(chunk)
+            hasher.update(chunk)
+    if os.path.getsize(remote_path) > MAX_UPLOAD_BYTES:
+        os.remove(remote_path)
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    return uploaded_response(file_id, remote_filename, upload.filename, hasher.hexdigest())
+
+@app.post("/upload/sessions")
+async def create_upload_session(request: UploadSessionRequest):
+    """Start a resumable upload; chunks are then PUT with Content-Range"""
+    check_pdf(request.content_type)
+    if request.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    upload_id = str(uuid.uuid4())
+    UPLOAD_SESSIONS[upload_id] = {
+        "filename": request.filename,
+        "content_type": request.content_type,
+        "size": request.size,
+        "offset": 0,
+        "part_path": os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+    }
+    open(UPLOAD_SESSIONS[upload_id]["part_path"], 'wb').close()
+    return {"success": True, "data": {"upload_id": upload_id, "offset": 0}}
+
+@app.get("/upload/sessions/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """Bytes received so far, for resuming after a dropped connection"""
+    session = UPLOAD_SESSIONS.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown upload session")
+    return {"success": True, "data": {"upload_id": upload_id, "offset": session["offset"], "size": session["size"]}}
+
+@app.put("/upload/sessions/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request):
+    """Append the chunk described by Content-Range: bytes start-end/total"""
+    session = UPLOAD_SESSIONS.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown upload session")
+    match = re.match(r"bytes (\d+)-(\d+)/(\d+)", request.headers.get("content-range", ""))
+    if not match or int(match.group(3)) != session["size"]:
+        raise HTTPException(status_code=400, detail="Invalid Content-Range")
+    start, end = int(match.group(1)), int(match.group(2))
+    if start != session["offset"]:
+        return Response(
+            status_code=409,
+            content=json.dumps({"success": False, "data": {"offset": session["offset"]}}),
+            media_type="application/json"
+        )
+    
+    with open(session["part_path"], 'r+b') as f:
+        f.seek(start)
+        written = await stream_body_to(request, f, end - start + 1)
+        f.truncate(start + written)
+    session["offset"] = start + written
+    
+    if session["offset"] < session["size"]:
+        return {"success": True, "data": {"upload_id": upload_id, "offset": session["offset"]}}
+    
+    del UPLOAD_SESSIONS[upload_id]
+    file_id, remote_filename, remote_path = new_upload_target(session["filename"])
+    os.replace(session["part_path"], remote_path)
+    # Chunks may have been rewritten on resume, so hash the assembled file
+    return uploaded_response(file_id, remote_filename, session["filename"], file_sha256(remote_path))
+
 @app.post("/tools/execute", response_model=ToolExecuteResponse)
 async def execute_tool(request: ToolExecuteRequest):
     """Execute a tool (simulated PDFProcessor)"""
+    return await run_tool(request)
+
+@app.post("/tools/execute_batch", response_model=BatchToolExecuteResponse)
+async def execute_tool_batch(request: BatchToolExecuteRequest):
+    """Execute many tools in one request, fanning out server-side"""
+    results = await asyncio.gather(*[run_tool(invocation) for invocation in request.invocations])
+    print(f"📦 Executed batch of {len(results)} tool(s)")
+    return BatchToolExecuteResponse(results=list(results))
+
+@app.post("/tools/execute_with_file", response_model=ToolExecuteResponse)
+async def execute_tool_with_file(request: Request):
+    """
+    Execute a tool on a file sent in the same multipart request: a JSON "request"
+    part (a tool request plus file_param) followed by the "file" part. The file is
+    handed to the tool directly instead of being stored under /uploads (needs python-multipart)
+    """
+    form = await request.form()
+    upload = form.get("file")
+    raw_request = form.get("request")
+    if upload is None or not hasattr(upload, "file") or raw_request is None:
+        raise HTTPException(status_code=400, detail="Expected a request part and a file part")
+    fields = json.loads(raw_request if isinstance(raw_request, str) else await raw_request.read())
+    file_param = fields.pop("file_param", "file")
+    invocation = ToolExecuteRequest(**fields)
+    check_pdf(upload.content_type or "")
+    if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    invocation.input_data[file_param] = upload.filename
+    print(f"📎 {invocation.tool_name} received {upload.filename} with its request")
+    try:
+        return await run_tool(invocation, upload)
+    finally:
+        await upload.close()
+
+async def run_tool(request: ToolExecuteRequest, upload=None) -> ToolExecuteResponse:
+    """Dispatch a single tool invocation, optionally on a file received with it"""
     try:
         if request.tool_name == "PDFProcessor":
-            return await simulate_pdf_processor(request.input_data)
+            return await simulate_pdf_processor(request.input_data, upload)
         else:
             return ToolExecuteResponse(
                 success=False,
@@ -115,8 +305,8 @@ async def execute_tool(request: ToolExecuteRequest):
             error=str(e)
         )
 
-async def simulate_pdf_processor(input_data: dict) -> ToolExecuteResponse:
-    """Simulate PDF processing"""
+async def simulate_pdf_processor(input_data: dict, upload=None) -> ToolExecuteResponse:
+    """Simulate PDF processing of an uploaded path, or of a file sent with the request"""
     try:
         file_path = input_data.get('file', '')
         
@@ -132,7 +322,7 @@ async def simulate_pdf_processor(input_data: dict) -> ToolExecuteResponse:
         else:
             full_path = file_path
         
-        if not os.path.exists(full_path):
+        if upload is None and not os.path.exists(full_path):
             return ToolExecuteResponse(
                 success=False,
                 error=f"PDF file not found: {file_path}"
@@ -180,23 +370,30 @@ async def simulate_pdf_processor(input_data: dict) -> ToolExecuteResponse:
             error=str(e)
         )
 
+# Static tool catalog and its ETag
+TOOLS_CATALOG = {
+    "tools": [
+        {
+            "name": "PDFProcessor",
+            "hosted_by": "memra",
+            "description": "Process PDF files and extract content"
+        },
+        {
+            "name": "InvoiceExtractionWorkflow",
+            "hosted_by": "memra", 
+            "description": "Extract structured data from invoices"
+        }
+    ]
+}
+TOOLS_ETAG = '"' + hashlib.sha256(json.dumps(TOOLS_CATALOG, sort_keys=True).encode()).hexdigest()[:16] + '"'
+
 @app.get("/tools/discover")
-async def discover_tools():
-    """Discover available tools"""
-    return {
-        "tools": [
-            {
-                "name": "PDFProcessor",
-                "hosted_by": "memra",
-                "description": "Process PDF files and extract content"
-            },
-            {
-                "name": "InvoiceExtractionWorkflow",
-                "hosted_by": "memra", 
-                "description": "Extract structured data from invoices"
-            }
-        ]
-    }
+async def discover_tools(request: Request, response: Response):
+    """Discover available tools, answering 304 when the client's ETag still matches"""
+    if request.headers.get("if-none-match") == TOOLS_ETAG:
+        return Response(status_code=304, headers={"ETag": TOOLS_ETAG})
+    response.headers["ETag"] = TOOLS_ETAG
+    return TOOLS_CATALOG
 
 async def cleanup_expired_files():
     """Remove files older than FILE_EXPIRY_HOURS"""
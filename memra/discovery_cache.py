@@ -0,0 +1,109 @@
+"""
+Cache for tool discovery results
+Keeps GET /tools/discover responses in memory and on disk with a TTL and the
+server's ETag, so short-lived workers can skip or cheaply revalidate discovery
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISCOVERY_TTL = float(os.getenv("MEMRA_DISCOVERY_TTL", "300"))
+
+def default_cache_dir() -> Path:
+    """MEMRA_CACHE_DIR, else $XDG_CACHE_HOME/memra, else ~/.cache/memra"""
+    if os.getenv("MEMRA_CACHE_DIR"):
+        return Path(os.environ["MEMRA_CACHE_DIR"])
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "memra"
+
+def cache_key(api_base: str, api_key: Optional[str]) -> str:
+    """
+    Digest naming one API key's cache for an API base URL, so tenants sharing a
+    cache directory or process never see each other's entries; the key itself is not stored
+    """
+    key_digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return hashlib.sha256(f"{key_digest}|{api_base}".encode()).hexdigest()[:16]
+
+# Entries shared by every client in the process, keyed by cache_key()
+_memory_cache: Dict[str, Dict[str, Any]] = {}
+_memory_lock = threading.Lock()
+
+class DiscoveryCache:
+    """TTL + ETag cache of the unfiltered tool list for one API base URL and API key"""
+
+    def __init__(self, api_base: str, ttl: float = DEFAULT_DISCOVERY_TTL,
+                 cache_dir: Optional[Path] = None, persist: bool = True, api_key: Optional[str] = None):
+        self.api_base = api_base
+        self.ttl = ttl
+        self.persist = persist
+        # Tools can differ per key, so each key gets its own entry
+        self.key = cache_key(api_base, api_key)
+        self.path = (cache_dir or default_cache_dir()) / f"discovery-{self.key}.json"
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """Cached entry (tools, etag, fetched_at) from memory, falling back to disk"""
+        with _memory_lock:
+            entry = _memory_cache.get(self.key)
+        if entry is None and self.persist:
+            entry = self._load()
+            if entry is not None:
+                with _memory_lock:
+                    _memory_cache[self.key] = entry
+        return entry
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def store(self, tools: List[Dict[str, Any]], etag: Optional[str]) -> Dict[str, Any]:
+        entry = {"tools": tools, "etag": etag, "fetched_at": time.time()}
+        with _memory_lock:
+            _memory_cache[self.key] = entry
+        if self.persist:
+            self._save(entry)
+        return entry
+
+    def revalidated(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """The server confirmed the entry is unchanged (304); restart its TTL"""
+        return self.store(entry["tools"], entry.get("etag"))
+
+    def clear(self):
+        with _memory_lock:
+            _memory_cache.pop(self.key, None)
+        if self.persist and self.path.exists():
+            try:
+                self.path.unlink()
+            except OSError as e:
+                logger.debug(f"Could not remove discovery cache {self.path}: {e}")
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+            if entry.get("api_base") != self.api_base:
+                return None
+            return {"tools": entry["tools"], "etag": entry.get("etag"), "fetched_at": entry["fetched_at"]}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable discovery cache {self.path}: {e}")
+            return None
+
+    def _save(self, entry: Dict[str, Any]):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=".discovery-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(dict(entry, api_base=self.api_base), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            # The on-disk copy is an optimisation only
+            logger.debug(f"Could not persist discovery cache to {self.path}: {e}")
@@ -38,8 +38,16 @@ def get_api_status() -> Dict[str, Any]:
     """
     registry = ToolRegistryClient()
     
-    is_healthy = registry.health_check()
-    tools = registry.discover_tools() if is_healthy else []
+    cached = registry.discovery_cache.get()
+    if registry.discovery_cache.is_fresh(cached):
+        # Tools come from the cache, only liveness needs a round trip
+        is_healthy = registry.health_check()
+        tools = cached["tools"] if is_healthy else []
+    else:
+        # A successful discovery proves the API is up, so skip the separate health check
+        tools = registry.fetch_tools()
+        is_healthy = tools is not None or registry.health_check()
+        tools = tools or []
     
     return {
         "api_healthy": is_healthy,
@@ -1,24 +1,145 @@
+import os
 import time
+import uuid
 import logging
-from typing import Dict, Any, List, Optional
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterable
 from .models import Department, Agent, DepartmentResult, ExecutionTrace, DepartmentAudit
 from .tool_registry import ToolRegistry
 from .tool_registry_client import ToolRegistryClient
+from .memory_tracking import MemoryTracker
+from .metrics import METRICS, SDKMetrics
+from .circuit_breaker import BREAKERS
+from .bulkhead import BulkheadRegistry
+from .deadline import deadline_scope, current_deadline
+from .planner import LatencyHistory
+from .records import TraceRecord, RunRecord, build_audit
+from .sinks import ResultSink, build_run_record
 
 logger = logging.getLogger(__name__)
 
 class ExecutionEngine:
     """Engine that executes department workflows by coordinating agents and tools"""
     
-    def __init__(self):
+    def __init__(self, memory_tracking: Optional[bool] = None, metrics: Optional[SDKMetrics] = None,
+                 latency_history: Optional[LatencyHistory] = None,
+                 sinks: Optional[List[ResultSink]] = None,
+                 bulkheads: Optional[Dict[str, Dict[str, Any]]] = None):
         self.tool_registry = ToolRegistry()
         self.api_client = ToolRegistryClient()
         self.last_execution_audit: Optional[DepartmentAudit] = None
+        
+        # Optional tracemalloc instrumentation around every agent and tool
+        if memory_tracking is None:
+            memory_tracking = os.getenv("MEMRA_MEMORY_TRACKING", "").lower() in ("1", "true", "yes")
+        self.memory_tracker: Optional[MemoryTracker] = MemoryTracker() if memory_tracking else None
+        self.metrics = metrics or METRICS
+        # Per-tool latency samples, used by CapacityPlanner
+        self.latency_history = latency_history if latency_history is not None else LatencyHistory()
+        # Every completed run is written to these sinks
+        self.sinks: List[ResultSink] = list(sinks or [])
+        # Concurrency pools per tool class, e.g. {"vision": {"max_concurrent": 2, "tools": ["PDFProcessor"]}}
+        self.bulkheads = BulkheadRegistry(bulkheads)
     
-    def execute_department(self, department: Department, input_data: Dict[str, Any]) -> DepartmentResult:
+    def execute_department(self, department: Department, input_data: Dict[str, Any],
+                           run_id: Optional[str] = None) -> DepartmentResult:
         """Execute a department workflow"""
+        # Internal records are converted to the public pydantic models only here
+        return self._run(department, input_data, run_id).to_model()
+    
+    def execute_batch(self, department: Department, inputs: Iterable[Dict[str, Any]],
+                      run_ids: Optional[Iterable[str]] = None, concurrency: int = 1) -> Dict[str, Any]:
+        """
+        Run the department once per input, streaming each result to the engine's
+        sinks instead of keeping it. Returns only a summary of the batch.
+        
+        With concurrency > 1 that many runs execute at once on worker threads; the
+        clients' adaptive limits decide how many requests each backend actually gets,
+        and the engine's bulkheads keep slow tools from holding every worker.
+        
+        run_ids pairs up with inputs in order; inputs past its end get generated ids.
+        """
+        if not self.sinks:
+            logger.warning("execute_batch called without result sinks; run results will be discarded")
+        
+        batch_start = time.time()
+        ids = iter(run_ids) if run_ids is not None else None
+        total = 0
+        succeeded = 0
+        try:
+            if concurrency <= 1:
+                for input_data in inputs:
+                    run_id = next(ids, None) if ids is not None else None
+                    record = self._run(department, input_data, run_id)
+                    total += 1
+                    if record.success:
+                        succeeded += 1
+                    del record
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="memra-batch") as pool:
+                    pending = set()
+                    for input_data in inputs:
+                        run_id = next(ids, None) if ids is not None else None
+                        # Bounded look-ahead, so a large input iterator is not read into memory
+                        if len(pending) >= concurrency * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            total += len(done)
+                            succeeded += sum(1 for future in done if future.result().success)
+                        context = contextvars.copy_context()
+                        pending.add(pool.submit(context.run, self._run, department, input_data, run_id))
+                    for future in pending:
+                        total += 1
+                        if future.result().success:
+                            succeeded += 1
+        
+            for sink in self.sinks:
+                try:
+                    sink.flush()
+                except Exception as e:
+                    logger.error(f"Failed to flush result sink {type(sink).__name__}: {e}")
+        
+            summary = {
+                "department": department.name,
+                "total": total,
+                "succeeded": succeeded,
+                "failed": total - succeeded,
+                "duration_seconds": time.time() - batch_start
+            }
+            if self.memory_tracker:
+                summary["memory"] = self.memory_tracker.summary()
+            return summary
+        finally:
+            if self.memory_tracker:
+                # Stop paying tracemalloc's cost on every allocation once the batch is over
+                self.memory_tracker.stop()
+    
+    def _run(self, department: Department, input_data: Dict[str, Any], run_id: Optional[str]) -> RunRecord:
+        """Execute one run with metrics and hand the result to the sinks"""
         start_time = time.time()
-        trace = ExecutionTrace()
+        result = None
+        self.metrics.runs_in_flight.inc()
+        # Budget for the whole run; clients, retries and hooks read it from the context
+        policy = department.execution_policy
+        try:
+            with deadline_scope(policy.timeout_seconds if policy else None):
+                result = self._execute_workflow(department, input_data)
+            if self.sinks:
+                self._write_to_sinks(run_id or uuid.uuid4().hex, department, result, time.time() - start_time)
+            return result
+        finally:
+            self.metrics.runs_in_flight.dec()
+            status = "success" if result is not None and result.success else "failure"
+            self.metrics.runs.inc(department=department.name, status=status)
+            self.metrics.run_duration.observe(time.time() - start_time, department=department.name)
+    
+    def _execute_workflow(self, department: Department, input_data: Dict[str, Any]) -> RunRecord:
+        """Run the agents of a department in workflow order"""
+        start_time = time.time()
+        trace = TraceRecord()
+        if self.memory_tracker:
+            self.memory_tracker.runs += 1
         
         try:
             print(f"\n🏢 Starting {department.name} Department")
@@ -42,12 +163,23 @@ class ExecutionEngine:
             for i, agent_role in enumerate(department.workflow_order, 1):
                 print(f"\n🔄 Step {i}/{len(department.workflow_order)}: {agent_role}")
                 
+                deadline = current_deadline()
+                if deadline is not None and deadline.expired():
+                    error_msg = f"Run deadline of {deadline.seconds:.0f}s exceeded before step '{agent_role}'"
+                    print(f"⏰ {error_msg}")
+                    trace.errors.append(error_msg)
+                    return RunRecord(
+                        success=False,
+                        error=error_msg,
+                        trace=trace
+                    )
+                
                 agent = self._find_agent_by_role(department, agent_role)
                 if not agent:
                     error_msg = f"Agent with role '{agent_role}' not found in department"
                     print(f"❌ Error: {error_msg}")
                     trace.errors.append(error_msg)
-                    return DepartmentResult(
+                    return RunRecord(
                         success=False,
                         error=error_msg,
                         trace=trace
@@ -55,11 +187,13 @@ class ExecutionEngine:
                 
                 # Execute agent
                 agent_start = time.time()
-                result = self._execute_agent(agent, context, trace)
+                with self._track_memory(trace, f"agent:{agent.role}"):
+                    result = self._execute_agent(agent, context, trace)
                 agent_duration = time.time() - agent_start
                 
                 trace.agents_executed.append(agent.role)
                 trace.execution_times[agent.role] = agent_duration
+                self.metrics.agent_duration.observe(agent_duration, agent=agent.role)
                 
                 if not result.get("success", False):
                     # Try fallback if available
@@ -69,14 +203,15 @@ class ExecutionEngine:
                         fallback_agent = self._find_agent_by_role(department, fallback_role)
                         if fallback_agent:
                             logger.info(f"Trying fallback agent: {fallback_role}")
-                            result = self._execute_agent(fallback_agent, context, trace)
+                            with self._track_memory(trace, f"agent:{fallback_agent.role}"):
+                                result = self._execute_agent(fallback_agent, context, trace)
                             trace.agents_executed.append(fallback_agent.role)
                     
                     if not result.get("success", False):
                         error_msg = f"Agent {agent.role} failed: {result.get('error', 'Unknown error')}"
                         print(f"❌ Workflow stopped: {error_msg}")
                         trace.errors.append(error_msg)
-                        return DepartmentResult(
+                        return RunRecord(
                             success=False,
                             error=error_msg,
                             trace=trace
@@ -145,6 +280,7 @@ class ExecutionEngine:
                 
                 trace.agents_executed.append(department.manager_agent.role)
                 trace.execution_times[department.manager_agent.role] = manager_duration
+                self.metrics.agent_duration.observe(manager_duration, agent=department.manager_agent.role)
                 
                 # Store manager validation results
                 context["results"][department.manager_agent.output_key] = manager_result.get("data")
@@ -154,7 +290,7 @@ class ExecutionEngine:
                     error_msg = f"Manager validation failed: {manager_result.get('error', 'Unknown error')}"
                     print(f"❌ {error_msg}")
                     trace.errors.append(error_msg)
-                    return DepartmentResult(
+                    return RunRecord(
                         success=False,
                         error=error_msg,
                         trace=trace
@@ -164,17 +300,13 @@ class ExecutionEngine:
             
             # Create audit record
             total_duration = time.time() - start_time
-            self.last_execution_audit = DepartmentAudit(
-                agents_run=trace.agents_executed,
-                tools_invoked=trace.tools_invoked,
-                duration_seconds=total_duration
-            )
+            self.last_execution_audit = build_audit(trace, total_duration)
             
             print(f"\n🎉 {department.name} Department workflow completed!")
             print(f"⏱️ Total time: {total_duration:.1f}s")
             print("=" * 60)
             
-            return DepartmentResult(
+            return RunRecord(
                 success=True,
                 data=context["results"],
                 trace=trace
@@ -184,12 +316,21 @@ class ExecutionEngine:
             print(f"💥 Unexpected error in {department.name} Department: {str(e)}")
             logger.error(f"Execution failed: {str(e)}")
             trace.errors.append(str(e))
-            return DepartmentResult(
+            return RunRecord(
                 success=False,
                 error=str(e),
                 trace=trace
             )
     
+    def _write_to_sinks(self, run_id: str, department: Department, result: RunRecord, duration: float):
+        """Hand a completed run to every sink; a failing sink never fails the run"""
+        record = build_run_record(run_id, department.name, result, duration)
+        for sink in self.sinks:
+            try:
+                sink.write(record)
+            except Exception as e:
+                logger.error(f"Result sink {type(sink).__name__} failed for run {run_id}: {e}")
+    
     def _find_agent_by_role(self, department: Department, role: str) -> Optional[Agent]:
         """Find an agent by role in the department"""
         for agent in department.agents:
@@ -197,7 +338,7 @@ class ExecutionEngine:
                 return agent
         return None
     
-    def _execute_agent(self, agent: Agent, context: Dict[str, Any], trace: ExecutionTrace) -> Dict[str, Any]:
+    def _execute_agent(self, agent: Agent, context: Dict[str, Any], trace: TraceRecord) -> Dict[str, Any]:
         """Execute a single agent"""
         print(f"\n👤 {agent.role}: Hi! I'm starting my work now...")
         logger.info(f"Executing agent: {agent.role}")
@@ -251,11 +392,14 @@ class ExecutionEngine:
                     # Use API client for server-hosted tools
                     print(f"🌐 {agent.role}: Using API client for {tool_name}")
                     config_to_pass = tool_spec.get("config") if isinstance(tool_spec, dict) else tool_spec.config
-                    tool_result = self.api_client.execute_tool(
+                    tool_result = self._call_tool(
+                        self.api_client,
                         tool_name, 
                         hosted_by, 
                         agent_input,
-                        config_to_pass
+                        config_to_pass,
+                        trace,
+                        agent
                     )
                 else:
                     # Use local registry for MCP and other local tools
@@ -277,11 +421,14 @@ class ExecutionEngine:
                         config_to_pass = mcp_config
                     
                     print(f"🔧 {agent.role}: Config for {tool_name}: {config_to_pass}")
-                    tool_result = self.tool_registry.execute_tool(
+                    tool_result = self._call_tool(
+                        self.tool_registry,
                         tool_name, 
                         hosted_by, 
                         agent_input,
-                        config_to_pass
+                        config_to_pass,
+                        trace,
+                        agent
                     )
                 
                 if not tool_result.get("success", False):
@@ -444,6 +591,34 @@ class ExecutionEngine:
                 "error": str(e)
             }
     
+    def _call_tool(self, executor, tool_name: str, hosted_by: str, agent_input: Dict[str, Any],
+                   config: Optional[Dict[str, Any]], trace: TraceRecord, agent: Agent) -> Dict[str, Any]:
+        """Invoke a tool through the API client or local registry, recording metrics"""
+        bulkhead = self.bulkheads.get(tool_name, hosted_by, config)
+        if bulkhead is not None:
+            refused = bulkhead.acquire()
+            if refused is not None:
+                self.metrics.tool_calls.inc(tool=tool_name, hosted_by=hosted_by, status="failure")
+                return bulkhead.rejection(tool_name, refused)
+        tool_start = time.time()
+        tool_result = None
+        self.metrics.tools_in_flight.inc(tool=tool_name)
+        try:
+            with self._track_memory(trace, f"tool:{agent.role}/{tool_name}"):
+                tool_result = executor.execute_tool(tool_name, hosted_by, agent_input, config)
+            return tool_result
+        finally:
+            self.metrics.tools_in_flight.dec(tool=tool_name)
+            tool_duration = time.time() - tool_start
+            status = "success" if tool_result is not None and tool_result.get("success", False) else "failure"
+            self.metrics.tool_calls.inc(tool=tool_name, hosted_by=hosted_by, status=status)
+            self.metrics.tool_duration.observe(tool_duration, tool=tool_name, hosted_by=hosted_by)
+            if status == "success":
+                self.latency_history.record(tool_name, tool_duration)
+            trace.circuit_breakers.update(BREAKERS.states(tool_name))
+            if bulkhead is not None:
+                bulkhead.release()
+    
     def _is_real_work(self, tool_name: str, tool_data: Dict[str, Any]) -> bool:
         """Determine if a tool performed real work vs mock/simulated work"""
         
@@ -556,7 +731,27 @@ class ExecutionEngine:
         """Get audit information from the last execution"""
         return self.last_execution_audit 
     
-    def _execute_manager_validation(self, manager_agent: Agent, manager_input: Dict[str, Any], trace: ExecutionTrace) -> Dict[str, Any]:
+    @contextmanager
+    def _track_memory(self, trace: TraceRecord, step: str):
+        """Snapshot allocations around a step when memory tracking is enabled"""
+        if not self.memory_tracker:
+            yield
+            return
+        record = None
+        try:
+            with self.memory_tracker.track(step) as record:
+                yield
+        finally:
+            if record is not None:
+                trace.memory_usage.append(record)
+    
+    def get_memory_summary(self) -> Optional[Dict[str, Any]]:
+        """Get per-step retained memory totals across all runs of this engine"""
+        if not self.memory_tracker:
+            return None
+        return self.memory_tracker.summary()
+    
+    def _execute_manager_validation(self, manager_agent: Agent, manager_input: Dict[str, Any], trace: TraceRecord) -> Dict[str, Any]:
         """Execute manager agent to validate workflow results"""
         print(f"\n👔 {manager_agent.role}: Time for me to review everyone's work...")
         logger.info(f"Manager {manager_agent.role} validating workflow results")
@@ -0,0 +1,283 @@
+"""
+Hedged requests for tools with a heavy latency tail
+Once an idempotent call outlives a percentile of the tool's recent latencies a
+duplicate is sent; the first success wins and the other request is cancelled
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Hedges allowed per request sent, i.e. at most ~5% extra load by default
+DEFAULT_HEDGE_BUDGET_RATIO = float(os.getenv("MEMRA_HEDGE_BUDGET", "0.05"))
+# Threads shared by every blocking hedged call, primaries and hedges alike
+HEDGE_WORKERS = int(os.getenv("MEMRA_HEDGE_WORKERS", "16"))
+
+class LatencyWindow:
+    """The most recent latencies of each tool, so hedge thresholds follow the backend's current state"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool_name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(tool_name)
+            if samples is None:
+                samples = self._samples[tool_name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, tool_name: str) -> int:
+        with self._lock:
+            return len(self._samples.get(tool_name, ()))
+
+    def percentile(self, tool_name: str, pct: float) -> Optional[float]:
+        """Latency at the given percentile (0-100), or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(tool_name, ()))
+        if not samples:
+            return None
+        rank = (len(samples) - 1) * pct / 100.0
+        low = int(rank)
+        high = min(low + 1, len(samples) - 1)
+        return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+class HedgeBudget:
+    """
+    Token bucket refilled by ratio tokens per request and spent one per hedge,
+    so hedges stay a small fraction of traffic even when a backend slows down
+    """
+
+    def __init__(self, ratio: float = DEFAULT_HEDGE_BUDGET_RATIO, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+class HedgePolicy:
+    """When to send a duplicate of a slow request"""
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20,
+                 min_delay: float = 0.05, max_delay: Optional[float] = None):
+        """
+        Args:
+            percentile: Recent-latency percentile after which the hedge is sent
+            min_samples: Samples needed before hedging; until then calls are only timed
+            min_delay: Lower bound for the hedge delay, so fast tools are not doubled
+            max_delay: Upper bound for the hedge delay, None for no bound
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], default: Optional["HedgePolicy"] = None) -> "HedgePolicy":
+        """Policy from a Tool.config["hedge"] dict, filling unset fields from default"""
+        base = default or cls()
+        fields = {
+            "percentile": base.percentile,
+            "min_samples": base.min_samples,
+            "min_delay": base.min_delay,
+            "max_delay": base.max_delay
+        }
+        unknown = set(config or {}) - set(fields)
+        if unknown:
+            logger.warning(f"Ignoring unknown hedge settings: {', '.join(sorted(unknown))}")
+        fields.update({key: value for key, value in (config or {}).items() if key in fields})
+        return cls(**fields)
+
+    def delay(self, latencies: LatencyWindow, tool_name: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        if latencies.count(tool_name) < self.min_samples:
+            return None
+        delay = max(self.min_delay, latencies.percentile(tool_name, self.percentile))
+        return min(delay, self.max_delay) if self.max_delay is not None else delay
+
+# Process-wide latency samples and hedge budget shared by every client
+RECENT_LATENCIES = LatencyWindow()
+HEDGE_BUDGET = HedgeBudget()
+
+def hedge_policy_for_tool(tool_name: str, config: Optional[Dict[str, Any]] = None,
+                          overrides: Optional[Dict[str, HedgePolicy]] = None,
+                          default: Optional[HedgePolicy] = None,
+                          idempotent: bool = True) -> Optional[HedgePolicy]:
+    """
+    Hedge policy for a tool, or None when it must not be hedged. Tool.config["hedge"]
+    may be True, False or a settings dict; non-idempotent tools are never hedged.
+    """
+    if not idempotent:
+        return None
+    hedge_config = (config or {}).get("hedge")
+    if hedge_config is False:
+        return None
+    base = (overrides or {}).get(tool_name, default)
+    if isinstance(hedge_config, HedgePolicy):
+        return hedge_config
+    if hedge_config is True:
+        return base or HedgePolicy()
+    if hedge_config:
+        return HedgePolicy.from_config(hedge_config, base)
+    return base
+
+def _succeeded(result: Any) -> bool:
+    # httpx responses; anything without is_success counts as a success
+    return getattr(result, "is_success", True)
+
+def _discard(future: Future):
+    """Close the response of a request that lost the race"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close is not None:
+        close()
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_busy = 0
+
+def _release_worker(future: Future):
+    global _busy
+    with _pool_lock:
+        _busy -= 1
+
+def _start(send: Callable[[], Any]) -> Optional[Future]:
+    """
+    Run send() on the shared hedge pool, in a copy of the caller's context.
+    None when every worker is busy, rather than queueing behind other calls.
+    """
+    global _pool, _busy
+    with _pool_lock:
+        if _busy >= HEDGE_WORKERS:
+            return None
+        _busy += 1
+        if _pool is None:
+            _pool = ThreadPoolExecutor(HEDGE_WORKERS, thread_name_prefix="memra-hedge")
+        pool = _pool
+    future = pool.submit(contextvars.copy_context().run, send)
+    future.add_done_callback(_release_worker)
+    return future
+
+def hedged_call(send: Callable[[], Any], tool_name: str, policy: HedgePolicy,
+                latencies: LatencyWindow = RECENT_LATENCIES, budget: HedgeBudget = HEDGE_BUDGET) -> Any:
+    """
+    Run send(), and a second send() if the first is still running after the
+    policy's delay. Returns the first successful result. A blocking request
+    cannot be interrupted, so the loser runs to completion and is closed.
+    """
+    budget.record_request()
+    delay = policy.delay(latencies, tool_name)
+    primary = _start(send) if delay is not None else None
+    if primary is None:
+        # Too few samples to pick a delay, or the pool is saturated: an unhedged call
+        started = time.monotonic()
+        result = send()
+        if _succeeded(result):
+            latencies.record(tool_name, time.monotonic() - started)
+        return result
+
+    started = {primary: time.monotonic()}
+    done, _ = wait(started, timeout=delay)
+    if not done:
+        hedge = _start(send) if budget.try_acquire() else None
+        if hedge is not None:
+            logger.info(f"{tool_name} still running after {delay:.2f}s, sending hedged request")
+            started[hedge] = time.monotonic()
+        else:
+            METRICS.hedges.inc(tool=tool_name, outcome="skipped")
+
+    pending = set(started)
+    last: Optional[Future] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and _succeeded(future.result()):
+                latencies.record(tool_name, time.monotonic() - started[future])
+                if len(started) > 1:
+                    METRICS.hedges.inc(tool=tool_name, outcome="lost" if future is primary else "won")
+                for loser in pending | (done - {future}):
+                    loser.cancel()
+                    loser.add_done_callback(_discard)
+                return future.result()
+            if last is not None:
+                _discard(last)
+            last = future
+    if len(started) > 1:
+        METRICS.hedges.inc(tool=tool_name, outcome="lost")
+    return last.result()
+
+async def ahedged_call(send: Callable[[], Awaitable[Any]], tool_name: str, policy: HedgePolicy,
+                       latencies: LatencyWindow = RECENT_LATENCIES, budget: HedgeBudget = HEDGE_BUDGET) -> Any:
+    """Async counterpart of hedged_call(); the losing request is cancelled outright"""
+    import asyncio
+    budget.record_request()
+    delay = policy.delay(latencies, tool_name)
+    if delay is None:
+        started = time.monotonic()
+        result = await send()
+        if _succeeded(result):
+            latencies.record(tool_name, time.monotonic() - started)
+        return result
+
+    # Tasks run in a copy of the current context, like the threads above
+    started = {asyncio.ensure_future(send()): time.monotonic()}
+    primary = next(iter(started))
+    pending = set(started)
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            if budget.try_acquire():
+                logger.info(f"{tool_name} still running after {delay:.2f}s, sending hedged request")
+                hedge = asyncio.ensure_future(send())
+                started[hedge] = time.monotonic()
+                pending.add(hedge)
+            else:
+                METRICS.hedges.inc(tool=tool_name, outcome="skipped")
+
+        last = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and _succeeded(task.result()):
+                    latencies.record(tool_name, time.monotonic() - started[task])
+                    if len(started) > 1:
+                        METRICS.hedges.inc(tool=tool_name, outcome="lost" if task is primary else "won")
+                    for loser in done - {task}:
+                        await _adiscard(loser)
+                    return task.result()
+                if last is not None:
+                    await _adiscard(last)
+                last = task
+        if len(started) > 1:
+            METRICS.hedges.inc(tool=tool_name, outcome="lost")
+        return last.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _adiscard(task):
+    if task.cancelled() or task.exception() is not None:
+        return
+    aclose = getattr(task.result(), "aclose", None)
+    if aclose is not None:
+        await aclose()
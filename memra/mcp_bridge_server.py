@@ -10,12 +10,15 @@ import asyncio
 import logging
 import psycopg2
 from datetime import datetime
+from decimal import Decimal
 from typing import Dict, Any, Optional
 from aiohttp import web
 import aiohttp_cors
 from psycopg2.extras import RealDictCursor
 import hashlib
 import hmac
+from memra.compression import choose_encoding, compress_body
+from memra.serialization import codec_for, negotiate
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +27,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@web.middleware
+async def compression_middleware(request: web.Request, handler) -> web.StreamResponse:
+    """Compress large responses for the WAN hop and advertise compressed request support"""
+    response = await handler(request)
+    
+    # aiohttp decodes gzip request bodies itself; zstd support varies by aiohttp version
+    response.headers['Accept-Encoding'] = 'gzip'
+    if isinstance(response, web.Response) and response.body and 'Content-Encoding' not in response.headers:
+        body, encoding = compress_body(bytes(response.body), choose_encoding(request.headers.get('Accept-Encoding')))
+        if encoding:
+            response.body = body
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 class PostgresBridge:
     """Handles PostgreSQL operations for the MCP bridge"""
     
@@ -62,8 +80,8 @@ class PostgresBridge:
                 for key, value in result.items():
                     if hasattr(value, 'isoformat'):  # Handle date/datetime objects
                         record_dict[key] = value.isoformat()
-                    elif hasattr(value, '__float__'):  # Handle Decimal objects
-                        record_dict[key] = float(value)
+                    elif isinstance(value, Decimal):  # NUMERIC columns, as the codecs send them
+                        record_dict[key] = str(value)
                     else:
                         record_dict[key] = value
             else:
@@ -144,11 +162,13 @@ class MCPBridgeServer:
         self.request_count = 0
         self.start_time = datetime.now()
         
-    def verify_request_signature(self, request_body: str, signature: str) -> bool:
+    def verify_request_signature(self, request_body: bytes, signature: str) -> bool:
         """Verify the request came from Memra API using HMAC"""
+        if isinstance(request_body, str):
+            request_body = request_body.encode()
         expected_signature = hmac.new(
             self.bridge_secret.encode(),
-            request_body.encode(),
+            request_body,
             hashlib.sha256
         ).hexdigest()
         return hmac.compare_digest(signature, expected_signature)
@@ -163,7 +183,7 @@ class MCPBridgeServer:
             # Support both HMAC signature and direct bridge secret authentication
             signature = request.headers.get('X-MCP-Signature', '')
             bridge_secret = request.headers.get('X-Bridge-Secret', '')
-            body = await request.text()
+            body = await request.read()
             
             # Try HMAC signature first, then bridge secret
             auth_valid = False
@@ -180,7 +200,8 @@ class MCPBridgeServer:
                 logger.warning("⚠️ Invalid or missing bridge secret")
                 return web.json_response({"error": "Invalid signature"}, status=401)
             
-            data = json.loads(body)
+            # JSON or msgpack, per Content-Type
+            data = codec_for(request.content_type).loads(body)
             
             # Support both payload formats
             tool_name = data.get('tool') or data.get('tool_name')
@@ -248,39 +269,11 @@ class MCPBridgeServer:
                             logger.info(f"✅ Fetched {len(rows)} rows")
                             columns = [desc[0] for desc in cursor.description] if cursor.description else []
                             logger.info(f"✅ Columns: {columns}")
-                            # Convert rows to list of dictionaries
-                            results = []
-                            logger.info(f"✅ Converting {len(rows)} rows to dictionaries...")
-                            for i, row in enumerate(rows):
-                                logger.info(f"✅ Processing row {i}: {row}")
-                                # Handle RealDictRow objects properly
-                                if hasattr(row, 'items'):
-                                    # It's already a dict-like object
-                                    row_dict = {}
-                                    for key, value in row.items():
-                                        # Convert Decimal and date objects to JSON-serializable types
-                                        if hasattr(value, '__float__'):  # Handle Decimal objects
-                                            value = float(value)
-                                        elif hasattr(value, 'isoformat'):  # Handle date/datetime objects
-                                            value = value.isoformat()
-                                        elif value is None:
-                                            value = None
-                                        row_dict[key] = value
-                                else:
-                                    # It's a tuple, convert to dict
-                                    row_dict = {}
-                                    for j, col in enumerate(columns):
-                                        value = row[j] if j < len(row) else None
-                                        # Convert Decimal and date objects to JSON-serializable types
-                                        if hasattr(value, '__float__'):  # Handle Decimal objects
-                                            value = float(value)
-                                        elif hasattr(value, 'isoformat'):  # Handle date/datetime objects
-                                            value = value.isoformat()
-                                        elif value is None:
-                                            value = None
-                                        row_dict[col] = value
-                                results.append(row_dict)
-                                logger.info(f"✅ Row {i} converted to: {row_dict}")
+                            # Rows keep their Decimal/date values; the response codec encodes them
+                            if rows and hasattr(rows[0], 'items'):
+                                results = [dict(row) for row in rows]
+                            else:
+                                results = [dict(zip(columns, row)) for row in rows]
                             result = {
                                 "success": True,
                                 "query": sql_query,
@@ -303,36 +296,6 @@ class MCPBridgeServer:
                     except Exception as e:
                         logger.error(f"❌ SQL execution error: {str(e)}")
                         result = {"error": f"SQL execution failed: {str(e)}"}
-                
-                # Ensure result is JSON serializable for SQLExecutor
-                if tool_name == 'SQLExecutor':
-                    try:
-                        # Convert Decimal and date objects to JSON-serializable types
-                        if isinstance(result, dict) and 'results' in result:
-                            for row in result['results']:
-                                for row_key, row_value in row.items():
-                                    if hasattr(row_value, '__float__'):  # Handle Decimal objects
-                                        row[row_key] = float(row_value)
-                                    elif hasattr(row_value, 'isoformat'):  # Handle date/datetime objects
-                                        row[row_key] = row_value.isoformat()
-                                    elif not isinstance(row_value, (str, int, float, bool, type(None))):
-                                        row[row_key] = str(row_value)
-                        
-                        # Test serialization
-                        json.dumps(result)
-                    except (TypeError, ValueError) as e:
-                        logger.error(f"❌ JSON serialization error: {e}")
-                        # Convert non-serializable objects to strings
-                        if isinstance(result, dict) and 'results' in result:
-                            for row in result['results']:
-                                for row_key, row_value in row.items():
-                                    if not isinstance(row_value, (str, int, float, bool, type(None))):
-                                        row[row_key] = str(row_value)
-                        try:
-                            json.dumps(result)  # Test again
-                        except Exception as e2:
-                            logger.error(f"❌ Final JSON serialization error: {e2}")
-                            result = {"error": f"JSON serialization failed: {str(e2)}"}
             elif tool_name == 'PDFProcessor':
                 # Use real vision model for PDF processing with improved prompt
                 file_path = tool_params.get('file_path', '') or tool_params.get('file', '')
@@ -481,12 +444,17 @@ Return ONLY valid JSON with no additional text or explanation.'''
                 "success": result.get("success", True),
                 "data": result
             }
-            return web.json_response(wrapped_result)
+            return self._encode_response(request, wrapped_result)
             
         except Exception as e:
             logger.error(f"❌ Error processing request: {str(e)}")
             return web.json_response({"error": str(e)}, status=500)
     
+    def _encode_response(self, request: web.Request, payload: Dict[str, Any]) -> web.Response:
+        """Encode a result with the codec the client asked for (msgpack or JSON)"""
+        codec = negotiate(request.headers.get('Accept'))
+        return web.Response(body=codec.dumps(payload), content_type=codec.content_type)
+    
     def _extract_invoice_data(self, tool_params: Dict[str, Any]) -> Dict[str, Any]:
         """Extract invoice data from various input formats"""
         logger.info(f"🔍 Extracting invoice data from: {tool_params}")
@@ -630,7 +598,9 @@ Return ONLY valid JSON with no additional text or explanation.'''
         return web.json_response({
             "tools": ["PostgresInsert", "DataValidator", "SQLExecutor", "PDFProcessor"],
             "service": "mcp-bridge",
-            "description": "Available MCP tools for database operations"
+            "description": "Available MCP tools for database operations",
+            # Clients negotiate the execute path here instead of probing for it
+            "execute_endpoint": "/execute_tool"
         })
     
     async def handle_status(self, request: web.Request) -> web.Response:
@@ -655,7 +625,7 @@ Return ONLY valid JSON with no additional text or explanation.'''
     
     def create_app(self) -> web.Application:
         """Create the web application"""
-        app = web.Application()
+        app = web.Application(middlewares=[compression_middleware])
         
         # Add routes
         app.router.add_post('/execute', self.handle_tool_request)
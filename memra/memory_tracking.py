@@ -0,0 +1,196 @@
+"""
+Memory instrumentation for ExecutionEngine runs
+Takes tracemalloc snapshots around agents and tools to find steps that leak or bloat
+"""
+
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Allocations made by the instrumentation itself are not interesting
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+class MemoryTracker:
+    """
+    Records net retained bytes and top allocation sites per agent/tool step.
+    Steps nest (a tool inside an agent); each record carries its depth and the
+    bytes it retained itself, and totals are also kept per nesting level.
+    Nesting is tracked per thread, so concurrent runs keep their own depths; the
+    traced bytes are process-wide, so steps overlapping in time see each other's.
+    """
+
+    def __init__(self, top_n: int = 5, frames: int = 1):
+        self.top_n = top_n
+        self.frames = frames
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.levels: Dict[int, Dict[str, Any]] = {}
+        self.runs = 0
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Open steps of every thread; the tracemalloc peak they share is folded into each
+        self._frames: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def _open(self) -> List[Dict[str, Any]]:
+        """Steps being tracked on this thread, outermost first"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start(self):
+        """Start tracemalloc if nobody else has"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._started_tracing = True
+                logger.info("Started tracemalloc for memory tracking")
+
+    def stop(self):
+        """Stop tracemalloc if this tracker started it"""
+        with self._lock:
+            if self._started_tracing and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._started_tracing = False
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def _reset_peak(self):
+        """Start a new peak window, folding the one ending into every step still open; needs _lock"""
+        if not hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self._frames.values():
+            frame["peak"] = max(frame["peak"], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def track(self, step: str) -> Iterator[Dict[str, Any]]:
+        """
+        Measure a step. The yielded dict is filled in when the block exits:
+        net_bytes, net_blocks, peak_bytes and top_allocations, plus depth and
+        self_net_bytes (net_bytes less what steps nested in it retained).
+        """
+        self.start()
+        stack = self._open
+        record: Dict[str, Any] = {"step": step, "depth": len(stack)}
+        before = self._snapshot()
+        frame = {"peak": 0, "child_net_bytes": 0}
+        with self._lock:
+            current_before, _ = tracemalloc.get_traced_memory()
+            self._reset_peak()
+            stack.append(frame)
+            self._frames[id(frame)] = frame
+        try:
+            yield record
+        finally:
+            with self._lock:
+                _, peak = tracemalloc.get_traced_memory()
+                # Frames compare equal by value, so they are dropped by position and identity
+                stack.pop()
+                del self._frames[id(frame)]
+            # Peaks reached before another step reset the window were folded into the frame
+            peak = max(peak, frame["peak"])
+            after = self._snapshot()
+            stats = after.compare_to(before, "lineno")
+
+            record["net_bytes"] = sum(stat.size_diff for stat in stats)
+            record["self_net_bytes"] = record["net_bytes"] - frame["child_net_bytes"]
+            record["net_blocks"] = sum(stat.count_diff for stat in stats)
+            record["peak_bytes"] = max(peak - current_before, 0)
+            if stack:
+                stack[-1]["child_net_bytes"] += record["net_bytes"]
+            record["top_allocations"] = [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff
+                }
+                for stat in stats[:self.top_n]
+                if stat.size_diff > 0
+            ]
+            with self._lock:
+                self._accumulate(record)
+
+    def _accumulate(self, record: Dict[str, Any]):
+        totals = self.steps.setdefault(record["step"], {
+            "calls": 0,
+            "net_bytes": 0,
+            "self_net_bytes": 0,
+            "max_peak_bytes": 0,
+            "allocation_sites": {}
+        })
+        totals["calls"] += 1
+        totals["net_bytes"] += record["net_bytes"]
+        totals["self_net_bytes"] += record["self_net_bytes"]
+        totals["max_peak_bytes"] = max(totals["max_peak_bytes"], record["peak_bytes"])
+        # Steps at one depth never contain each other, so their bytes add up without double counting
+        level = self.levels.setdefault(record["depth"], {"calls": 0, "net_bytes": 0, "max_peak_bytes": 0})
+        level["calls"] += 1
+        level["net_bytes"] += record["net_bytes"]
+        level["max_peak_bytes"] = max(level["max_peak_bytes"], record["peak_bytes"])
+        for allocation in record["top_allocations"]:
+            sites = totals["allocation_sites"]
+            sites[allocation["location"]] = sites.get(allocation["location"], 0) + allocation["size_diff"]
+
+    def summary(self) -> Dict[str, Any]:
+        """Roll up all tracked steps, worst offenders first"""
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        steps: List[Dict[str, Any]] = []
+        # Runs on other threads may still be adding to the totals
+        with self._lock:
+            for step, totals in self.steps.items():
+                top_sites = sorted(totals["allocation_sites"].items(), key=lambda item: item[1], reverse=True)
+                steps.append({
+                    "step": step,
+                    "calls": totals["calls"],
+                    "net_bytes": totals["net_bytes"],
+                    "self_net_bytes": totals["self_net_bytes"],
+                    "avg_net_bytes": totals["net_bytes"] / totals["calls"],
+                    "max_peak_bytes": totals["max_peak_bytes"],
+                    "top_allocations": [
+                        {"location": location, "size_diff": size}
+                        for location, size in top_sites[:self.top_n]
+                    ]
+                })
+            levels = [{"depth": depth, **self.levels[depth]} for depth in sorted(self.levels)]
+        steps.sort(key=lambda s: s["net_bytes"], reverse=True)
+        return {
+            "runs": self.runs,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "levels": levels,
+            "steps": steps
+        }
+
+    def reset(self):
+        """Forget accumulated totals"""
+        self.steps = {}
+        self.levels = {}
+        self.runs = 0
+
+    def show_summary(self):
+        """Print the batch summary"""
+        summary = self.summary()
+        print("=== Memory Summary ===")
+        print(f"Runs tracked: {summary['runs']}")
+        print(f"Traced memory: {summary['traced_current_bytes'] / 1024:.1f} KiB "
+              f"(peak {summary['traced_peak_bytes'] / 1024:.1f} KiB)")
+        for level in summary["levels"]:
+            print(f"Depth {level['depth']}: {level['net_bytes'] / 1024:+.1f} KiB retained over "
+                  f"{level['calls']} step(s)")
+        for step in summary["steps"]:
+            print(f"{step['step']}: {step['net_bytes'] / 1024:+.1f} KiB retained over {step['calls']} call(s)")
+            for allocation in step["top_allocations"][:3]:
+                print(f"   {allocation['location']}: {allocation['size_diff'] / 1024:+.1f} KiB")
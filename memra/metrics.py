@@ -0,0 +1,322 @@
+"""
+Prometheus-compatible metrics for the Memra SDK
+Counters, gauges and histograms exposed in the Prometheus text format, either
+over a small embedded HTTP endpoint or written to a node_exporter textfile
+"""
+
+import os
+import math
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape_label_value(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """Base class for labelled metrics"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {list(self.labelnames)}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        for sample_name, labels, value in self.samples():
+            lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. in-flight work"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment while the block runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with sum and count"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        buckets = sorted(float(b) for b in buckets)
+        if not buckets or buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def get_sum(self, **labels) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """Collection of metrics that can be scraped or written out"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if not isinstance(existing, cls) or existing.labelnames != tuple(labelnames):
+                    raise ValueError(f"Metric {name} already registered with a different type or labels")
+                return existing
+            metric = cls(name, documentation, labelnames, **kwargs)
+            self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically write metrics for the node_exporter textfile collector"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".memra-metrics-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def start_http_server(self, port: int, addr: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /metrics from a daemon thread; call .shutdown() on the result to stop"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE_LATEST)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics endpoint: " + format % args)
+
+        server = ThreadingHTTPServer((addr, port), MetricsHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, name="memra-metrics", daemon=True)
+        thread.start()
+        logger.info(f"Serving Memra metrics on http://{addr}:{server.server_port}/metrics")
+        return server
+
+class SDKMetrics:
+    """The SDK's own instruments, registered on a MetricsRegistry"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.runs = registry.counter(
+            "memra_runs_total", "Department runs by outcome", ["department", "status"])
+        self.run_duration = registry.histogram(
+            "memra_run_duration_seconds", "Department run latency", ["department"])
+        self.runs_in_flight = registry.gauge(
+            "memra_runs_in_flight", "Department runs currently executing")
+        self.agent_duration = registry.histogram(
+            "memra_agent_duration_seconds", "Agent latency", ["agent"])
+        self.tool_calls = registry.counter(
+            "memra_tool_calls_total", "Tool invocations by outcome", ["tool", "hosted_by", "status"])
+        self.tool_duration = registry.histogram(
+            "memra_tool_duration_seconds", "Tool latency", ["tool", "hosted_by"])
+        self.tools_in_flight = registry.gauge(
+            "memra_tool_calls_in_flight", "Tool invocations currently executing", ["tool"])
+        self.retries = registry.counter(
+            "memra_retries_total", "Retried tool or HTTP requests", ["tool"])
+        self.hedges = registry.counter(
+            "memra_hedged_requests_total", "Hedged tool requests by outcome (won, lost, skipped)", ["tool", "outcome"])
+        self.circuit_state = registry.gauge(
+            "memra_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["host", "tool"])
+        self.circuit_rejections = registry.counter(
+            "memra_circuit_rejections_total", "Tool calls failed fast by an open circuit breaker", ["host", "tool"])
+        self.rate_limit_wait = registry.counter(
+            "memra_rate_limit_wait_seconds_total", "Time spent waiting for rate limit tokens", ["tool"])
+        self.concurrency_limit = registry.gauge(
+            "memra_concurrency_limit", "Adaptive limit on requests in flight to a backend", ["backend"])
+        self.bulkhead_in_flight = registry.gauge(
+            "memra_bulkhead_in_flight", "Tool calls running in a bulkhead", ["bulkhead"])
+        self.bulkhead_queued = registry.gauge(
+            "memra_bulkhead_queued", "Tool calls waiting for a bulkhead slot", ["bulkhead"])
+        self.bulkhead_rejections = registry.counter(
+            "memra_bulkhead_rejections_total", "Tool calls refused by a bulkhead (full, timeout, deadline)",
+            ["bulkhead", "reason"])
+        self.outbox_pending = registry.gauge(
+            "memra_outbox_pending", "Tool calls waiting in the outbox for replay")
+        self.outbox_deliveries = registry.counter(
+            "memra_outbox_deliveries_total", "Outbox entries replayed by outcome (delivered, failed)", ["outcome"])
+        self.cache_hits = registry.counter(
+            "memra_cache_hits_total", "Cache lookups that were served from cache", ["cache"])
+        self.cache_misses = registry.counter(
+            "memra_cache_misses_total", "Cache lookups that went to the backend", ["cache"])
+        self.payload_bytes = registry.counter(
+            "memra_payload_bytes_total", "HTTP payload bytes exchanged with tool backends", ["tool", "direction"])
+
+# Process-wide default registry and instruments
+REGISTRY = MetricsRegistry()
+METRICS = SDKMetrics(REGISTRY)
+
+def start_http_server(port: int, addr: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Expose the default registry for Prometheus scraping"""
+    return registry.start_http_server(port, addr)
+
+def write_textfile(path: str, registry: MetricsRegistry = REGISTRY):
+    """Write the default registry for the node_exporter textfile collector"""
+    registry.write_textfile(path)
@@ -39,6 +39,8 @@ class ExecutionTrace(BaseModel):
     tools_invoked: List[str] = Field(default_factory=list)
     execution_times: Dict[str, float] = Field(default_factory=dict)
     errors: List[str] = Field(default_factory=list)
+    memory_usage: List[Dict[str, Any]] = Field(default_factory=list)
+    circuit_breakers: Dict[str, str] = Field(default_factory=dict)
     
     def show(self):
         """Display execution trace information"""
@@ -47,6 +49,12 @@ class ExecutionTrace(BaseModel):
         print(f"Tools invoked: {', '.join(self.tools_invoked)}")
         if self.errors:
             print(f"Errors: {', '.join(self.errors)}")
+        tripped = {key: state for key, state in self.circuit_breakers.items() if state != "closed"}
+        if tripped:
+            print(f"Circuit breakers: {', '.join(f'{key} {state}' for key, state in tripped.items())}")
+        for record in self.memory_usage:
+            print(f"Memory {record['step']}: {record['net_bytes'] / 1024:+.1f} KiB retained, "
+                  f"{record['peak_bytes'] / 1024:.1f} KiB peak")
 
 class DepartmentResult(BaseModel):
     success: bool
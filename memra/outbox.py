@@ -0,0 +1,260 @@
+"""
+Store-and-forward outbox for tool calls made while the API is unavailable
+Calls are persisted to SQLite and replayed at a controlled drain rate once the API
+is back; their results are handed to the runs waiting on them or kept in the table
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+from .metrics import METRICS
+from .serialization import JSON
+from .discovery_cache import default_cache_dir
+from .rate_limit import throttle
+from .deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv("MEMRA_OUTBOX", "").lower() in ("1", "true", "yes")
+DEFAULT_DRAIN_RATE = os.getenv("MEMRA_OUTBOX_DRAIN_RATE", "2/s")
+# How long a caller outside any run deadline waits for a queued call's result
+DEFAULT_WAIT_TIMEOUT = float(os.getenv("MEMRA_OUTBOX_WAIT_TIMEOUT", "300"))
+
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+def default_db_path() -> Path:
+    """MEMRA_OUTBOX_DB, else outbox.sqlite in the SDK cache directory"""
+    if os.getenv("MEMRA_OUTBOX_DB"):
+        return Path(os.environ["MEMRA_OUTBOX_DB"])
+    return default_cache_dir() / "outbox.sqlite"
+
+def is_unavailable(result: Dict[str, Any]) -> bool:
+    """Whether a failed tool result means the API did not take the call, so it can be replayed"""
+    return not result.get("success", False) and bool(result.get("unavailable") or result.get("circuit_open"))
+
+class Outbox:
+    """
+    Durable FIFO of tool invocations. Entries survive restarts and are shared by
+    every process using the same file; each is delivered by at most one drainer.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_attempts: Optional[int] = None,
+                 wait_timeout: Optional[float] = None):
+        """
+        Args:
+            path: SQLite file, default_db_path() when None
+            max_attempts: Replays of an entry before it is marked failed, None for no limit
+            wait_timeout: Longest a caller waits for a queued call's result. None waits
+                for the rest of the run deadline, or DEFAULT_WAIT_TIMEOUT outside a run
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.wait_timeout = wait_timeout
+        self._local = threading.local()
+        self._delivered = threading.Condition()
+        self._drainer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            path = self.path or default_db_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, tool_name TEXT NOT NULL, hosted_by TEXT NOT NULL, "
+                "input_data BLOB NOT NULL, config BLOB, file_path TEXT, file_param TEXT, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, claimed_until REAL NOT NULL DEFAULT 0, "
+                "enqueued_at REAL NOT NULL, delivered_at REAL, result BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id)")
+            self._local.conn = conn
+        return conn
+
+    # Queueing
+
+    def enqueue(self, tool_name: str, hosted_by: str, input_data: Dict[str, Any],
+                config: Optional[Dict[str, Any]] = None, file_path: Optional[str] = None,
+                file_param: str = "file") -> int:
+        """Persist a tool call for later delivery; file_path marks an execute_tool_with_file call"""
+        cursor = self._connection().execute(
+            "INSERT INTO outbox (tool_name, hosted_by, input_data, config, file_path, file_param, status, enqueued_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (tool_name, hosted_by, JSON.dumps(input_data), JSON.dumps(config) if config is not None else None,
+             os.path.abspath(file_path) if file_path else None, file_param, PENDING, time.time())
+        )
+        METRICS.outbox_pending.set(self.pending_count())
+        logger.info(f"Queued {tool_name} call as outbox entry {cursor.lastrowid}")
+        return cursor.lastrowid
+
+    def pending_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def entries(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Oldest entries first, optionally with one status; results are decoded"""
+        query = "SELECT id, tool_name, hosted_by, status, attempts, enqueued_at, delivered_at, result FROM outbox"
+        args: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        rows = self._connection().execute(query + " ORDER BY id LIMIT ?", args + (limit,)).fetchall()
+        return [
+            {
+                "id": row[0], "tool_name": row[1], "hosted_by": row[2], "status": row[3], "attempts": row[4],
+                "enqueued_at": row[5], "delivered_at": row[6],
+                "result": JSON.loads(row[7]) if row[7] is not None else None
+            }
+            for row in rows
+        ]
+
+    def result(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Result of a delivered (or permanently failed) entry, None while it is pending"""
+        row = self._connection().execute("SELECT status, result FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+        if row is None or row[0] == PENDING:
+            return None
+        return JSON.loads(row[1])
+
+    def _wait_timeout(self) -> float:
+        """wait_timeout, never past the current run deadline"""
+        deadline = current_deadline()
+        if deadline is None:
+            return DEFAULT_WAIT_TIMEOUT if self.wait_timeout is None else self.wait_timeout
+        if self.wait_timeout is None:
+            return deadline.remaining()
+        return min(self.wait_timeout, deadline.remaining())
+
+    def wait(self, entry_id: int, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until an entry is delivered, by this process or another; None on timeout"""
+        give_up = time.monotonic() + (self._wait_timeout() if timeout is None else timeout)
+        while True:
+            result = self.result(entry_id)
+            remaining = give_up - time.monotonic()
+            if result is not None or remaining <= 0:
+                return result
+            # Woken by local deliveries; the timeout picks up other processes' deliveries
+            with self._delivered:
+                self._delivered.wait(min(remaining, 0.5))
+
+    # Delivery
+
+    def _claim(self, lease: float) -> Optional[tuple]:
+        """Take the oldest pending entry for lease seconds, so concurrent drainers skip it"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT id, tool_name, hosted_by, input_data, config, file_path, file_param, attempts FROM outbox "
+                "WHERE status = ? AND claimed_until < ? ORDER BY id LIMIT 1", (PENDING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE outbox SET claimed_until = ? WHERE id = ?", (now + lease, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, entry_id: int, status: str, attempts: int, result: Optional[Dict[str, Any]]):
+        self._connection().execute(
+            "UPDATE outbox SET status = ?, attempts = ?, claimed_until = 0, delivered_at = ?, result = ? WHERE id = ?",
+            (status, attempts, time.time() if status != PENDING else None,
+             JSON.dumps(result) if status != PENDING else None, entry_id)
+        )
+        if status != PENDING:
+            METRICS.outbox_pending.set(self.pending_count())
+            METRICS.outbox_deliveries.inc(outcome=status)
+            with self._delivered:
+                self._delivered.notify_all()
+
+    def drain(self, client, drain_rate: Any = DEFAULT_DRAIN_RATE, limit: Optional[int] = None,
+              on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> Dict[str, int]:
+        """
+        Replay pending entries oldest first, at most drain_rate calls ("5/s", "300/min")
+        across every process draining this API. Stops at the first call the API still
+        cannot take. Returns counts of delivered, failed and still pending entries.
+
+        client is a ToolRegistryClient; calls are made with defer=False so they are not queued again.
+        """
+        counts = {DELIVERED: 0, FAILED: 0}
+        while limit is None or counts[DELIVERED] + counts[FAILED] < limit:
+            row = self._claim(lease=300.0)
+            if row is None:
+                break
+            entry_id, tool_name, hosted_by, input_data, config, file_path, file_param, attempts = row
+            input_data = JSON.loads(input_data)
+            config = JSON.loads(config) if config is not None else None
+            throttle(client.api_key, client.api_base, "outbox", None, {"rate_limit": drain_rate})
+            if file_path:
+                result = client.execute_tool_with_file(tool_name, hosted_by, file_path, input_data, config,
+                                                       file_param=file_param, defer=False)
+            else:
+                result = client.execute_tool(tool_name, hosted_by, input_data, config, defer=False)
+            attempts += 1
+
+            if is_unavailable(result):
+                if self.max_attempts is not None and attempts >= self.max_attempts:
+                    logger.error(f"Giving up on outbox entry {entry_id} ({tool_name}) after {attempts} attempts")
+                    self._finish(entry_id, FAILED, attempts, result)
+                    counts[FAILED] += 1
+                else:
+                    self._finish(entry_id, PENDING, attempts, None)
+                logger.info(f"API still unavailable ({result.get('error')}), pausing outbox drain")
+                break
+            # A tool that ran and failed is delivered too; only the API being away is retried
+            self._finish(entry_id, DELIVERED, attempts, result)
+            counts[DELIVERED] += 1
+            if on_result is not None:
+                on_result(entry_id, result)
+
+        counts[PENDING] = self.pending_count()
+        if counts[DELIVERED] or counts[FAILED]:
+            logger.info(f"Outbox drain: {counts[DELIVERED]} delivered, {counts[FAILED]} failed, "
+                        f"{counts[PENDING]} pending")
+        return counts
+
+    def start_drainer(self, client, drain_rate: Any = DEFAULT_DRAIN_RATE, interval: float = 5.0,
+                      on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> threading.Thread:
+        """
+        Drain in a background thread whenever entries are pending and the API's
+        health check passes. While it runs, clients wait for queued calls' results.
+        """
+        if self.draining:
+            return self._drainer
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    if self.pending_count() and client.health_check():
+                        self.drain(client, drain_rate, on_result=on_result)
+                except Exception as e:
+                    logger.error(f"Outbox drain failed: {e}")
+                self._stop.wait(interval)
+
+        # A plain thread, so it does not inherit the deadline of the run that started it
+        self._drainer = threading.Thread(target=run, name="memra-outbox", daemon=True)
+        self._drainer.start()
+        return self._drainer
+
+    def stop_drainer(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._drainer is not None:
+            self._drainer.join(timeout)
+            self._drainer = None
+
+    @property
+    def draining(self) -> bool:
+        return self._drainer is not None and self._drainer.is_alive()
+
+# Process-wide outbox; clients use it when MEMRA_OUTBOX is set
+OUTBOX = Outbox()
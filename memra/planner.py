@@ -0,0 +1,265 @@
+"""
+Capacity planning for department batches
+Uses recorded per-tool latencies plus concurrency, rate limits and per-call
+costs to estimate how long a batch will take and how many workers each stage needs
+"""
+
+import os
+import json
+import math
+import random
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel, Field
+from .models import Department, Agent
+
+logger = logging.getLogger(__name__)
+
+BACKEND_FOR_HOST = {
+    "memra": "memra-api",
+    "mcp": "mcp-bridge",
+}
+
+class LatencyHistory:
+    """Bounded per-tool latency samples, persisted as JSON between batches"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.samples: Dict[str, List[float]] = {}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool_name: str, seconds: float):
+        """Add a sample, reservoir-sampling once the tool has max_samples"""
+        with self._lock:
+            samples = self.samples.setdefault(tool_name, [])
+            seen = self._seen.get(tool_name, len(samples)) + 1
+            self._seen[tool_name] = seen
+            if len(samples) < self.max_samples:
+                samples.append(seconds)
+            else:
+                slot = random.randrange(seen)
+                if slot < self.max_samples:
+                    samples[slot] = seconds
+
+    def percentile(self, tool_name: str, pct: float) -> Optional[float]:
+        """Latency at the given percentile (0-100), or None without samples"""
+        samples = sorted(self.samples.get(tool_name, []))
+        if not samples:
+            return None
+        rank = (len(samples) - 1) * pct / 100.0
+        low = math.floor(rank)
+        high = math.ceil(rank)
+        return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+    def mean(self, tool_name: str) -> Optional[float]:
+        samples = self.samples.get(tool_name, [])
+        return sum(samples) / len(samples) if samples else None
+
+    def count(self, tool_name: str) -> int:
+        return len(self.samples.get(tool_name, []))
+
+    def save(self, path: str):
+        with self._lock:
+            data = {"max_samples": self.max_samples, "samples": self.samples, "seen": self._seen}
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LatencyHistory":
+        """Load saved samples; returns an empty history if the file is missing or unreadable"""
+        history = cls()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            history.max_samples = data.get("max_samples", history.max_samples)
+            history.samples = {name: list(values) for name, values in data.get("samples", {}).items()}
+            # Without the seen counts reservoir sampling would restart at max_samples and
+            # let each new batch overwrite a far larger share of the saved samples
+            history._seen = {name: int(seen) for name, seen in data.get("seen", {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not load latency history from {path}: {e}")
+        return history
+
+class StagePlan(BaseModel):
+    agent: str
+    tools: List[str] = Field(default_factory=list)
+    backends: List[str] = Field(default_factory=list)
+    mean_seconds: float
+    p95_seconds: float
+    recommended_workers: int
+    sampled: bool = True
+
+class CapacityPlan(BaseModel):
+    department: str
+    input_count: int
+    concurrency: int
+    estimated_duration_seconds: float
+    p95_duration_seconds: float
+    throughput_per_second: float
+    bottleneck: str
+    peak_concurrency: Dict[str, float] = Field(default_factory=dict)
+    expected_cost: float = 0.0
+    meets_target: Optional[bool] = None
+    stages: List[StagePlan] = Field(default_factory=list)
+
+    def show(self):
+        """Display the plan"""
+        print(f"=== Capacity Plan: {self.department} ===")
+        print(f"Inputs: {self.input_count} with {self.concurrency} concurrent run(s)")
+        print(f"Estimated duration: {self.estimated_duration_seconds:.1f}s (p95 {self.p95_duration_seconds:.1f}s)")
+        print(f"Throughput: {self.throughput_per_second:.3f} runs/s, bottleneck: {self.bottleneck}")
+        for backend, peak in self.peak_concurrency.items():
+            print(f"Peak concurrency on {backend}: {peak:.1f}")
+        if self.expected_cost:
+            print(f"Expected cost: {self.expected_cost:.4f}")
+        if self.meets_target is not None:
+            print(f"Meets target: {'yes' if self.meets_target else 'no'}")
+        for stage in self.stages:
+            note = "" if stage.sampled else " (no latency samples, using default)"
+            print(f"  {stage.agent}: {stage.mean_seconds:.2f}s mean, {stage.p95_seconds:.2f}s p95, "
+                  f"{stage.recommended_workers} worker(s){note}")
+
+class CapacityPlanner:
+    """Predicts batch duration, backend concurrency and cost from latency history"""
+
+    def __init__(self, history: LatencyHistory, concurrency: int = 1,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 cost_per_call: Optional[Dict[str, float]] = None,
+                 default_latency: float = 1.0):
+        """
+        Args:
+            history: Recorded per-tool latencies
+            concurrency: Number of department runs executing at once
+            rate_limits: Requests per second, keyed by tool name or backend ("memra-api", "mcp-bridge")
+            cost_per_call: Cost of one call, keyed by tool name
+            default_latency: Seconds assumed for tools without samples
+        """
+        self.history = history
+        self.concurrency = max(1, concurrency)
+        self.rate_limits = rate_limits or {}
+        self.cost_per_call = cost_per_call or {}
+        self.default_latency = default_latency
+
+    def _tool_latency(self, tool_name: str, pct: Optional[float] = None) -> Optional[float]:
+        if pct is None:
+            return self.history.mean(tool_name)
+        return self.history.percentile(tool_name, pct)
+
+    def _agent_tools(self, agent: Agent) -> List[Dict[str, str]]:
+        tools = []
+        for tool_spec in agent.tools:
+            name = tool_spec["name"] if isinstance(tool_spec, dict) else tool_spec.name
+            hosted_by = tool_spec.get("hosted_by", "memra") if isinstance(tool_spec, dict) else tool_spec.hosted_by
+            tools.append({"name": name, "backend": BACKEND_FOR_HOST.get(hosted_by, hosted_by)})
+        return tools
+
+    def _stages(self, department: Department) -> List[Agent]:
+        agents = {agent.role: agent for agent in department.agents}
+        stages = [agents[role] for role in department.workflow_order if role in agents]
+        if department.manager_agent:
+            stages.append(department.manager_agent)
+        return stages
+
+    def plan(self, department: Department, input_count: int,
+             target_seconds: Optional[float] = None) -> CapacityPlan:
+        """
+        Estimate a batch of input_count runs of the department.
+
+        If target_seconds is given, worker recommendations are sized to finish
+        within it; otherwise they are sized to keep up with the bottleneck.
+        """
+        stage_rows = []
+        calls_per_run: Dict[str, int] = {}
+        backend_calls: Dict[str, int] = {}
+        backend_busy: Dict[str, float] = {}
+        cost_per_run = 0.0
+
+        for agent in self._stages(department):
+            tools = self._agent_tools(agent)
+            mean_total = 0.0
+            p95_total = 0.0
+            sampled = True
+            for tool in tools:
+                mean = self._tool_latency(tool["name"])
+                p95 = self._tool_latency(tool["name"], 95)
+                if mean is None:
+                    sampled = False
+                    mean = p95 = self.default_latency
+                mean_total += mean
+                p95_total += p95
+                calls_per_run[tool["name"]] = calls_per_run.get(tool["name"], 0) + 1
+                backend_calls[tool["backend"]] = backend_calls.get(tool["backend"], 0) + 1
+                backend_busy[tool["backend"]] = backend_busy.get(tool["backend"], 0.0) + mean
+                cost_per_run += self.cost_per_call.get(tool["name"], 0.0)
+            stage_rows.append((agent, tools, mean_total, p95_total, sampled))
+
+        run_latency = sum(row[2] for row in stage_rows)
+        run_p95 = sum(row[3] for row in stage_rows)
+
+        # Throughput is capped by the worker pool and by every rate limit we know about
+        limits = {"concurrency": self.concurrency / run_latency if run_latency > 0 else math.inf}
+        for key, rate in self.rate_limits.items():
+            calls = calls_per_run.get(key) or backend_calls.get(key)
+            if calls and rate > 0:
+                limits[f"rate_limit:{key}"] = rate / calls
+        bottleneck = min(limits, key=limits.get)
+        throughput = limits[bottleneck]
+
+        if input_count <= 0:
+            duration = p95_duration = 0.0
+        elif math.isinf(throughput):
+            duration = p95_duration = 0.0
+            bottleneck = "none"
+        else:
+            waves = math.ceil(input_count / self.concurrency)
+            duration = max(waves * run_latency, input_count / throughput)
+            p95_scale = run_p95 / run_latency if run_latency > 0 else 1.0
+            p95_duration = duration * p95_scale
+
+        # Little's law: in-flight calls = arrival rate x time spent per call
+        effective_rate = input_count / duration if duration > 0 else 0.0
+        peak_concurrency = {
+            backend: min(effective_rate * busy, float(self.concurrency))
+            for backend, busy in backend_busy.items()
+        }
+
+        required_rate = effective_rate
+        if target_seconds and target_seconds > 0:
+            required_rate = input_count / target_seconds
+
+        stages = [
+            StagePlan(
+                agent=agent.role,
+                tools=[tool["name"] for tool in tools],
+                backends=sorted({tool["backend"] for tool in tools}),
+                mean_seconds=mean_total,
+                p95_seconds=p95_total,
+                recommended_workers=max(1, math.ceil(required_rate * mean_total)) if tools else 1,
+                sampled=sampled
+            )
+            for agent, tools, mean_total, p95_total, sampled in stage_rows
+        ]
+
+        meets_target = None
+        if target_seconds:
+            meets_target = duration <= target_seconds
+
+        return CapacityPlan(
+            department=department.name,
+            input_count=input_count,
+            concurrency=self.concurrency,
+            estimated_duration_seconds=duration,
+            p95_duration_seconds=p95_duration,
+            throughput_per_second=0.0 if math.isinf(throughput) else throughput,
+            bottleneck=bottleneck,
+            peak_concurrency=peak_concurrency,
+            expected_cost=cost_per_run * input_count,
+            meets_target=meets_target,
+            stages=stages
+        )
@@ -0,0 +1,223 @@
+"""
+Token-bucket rate limiting shared by every process on a host
+Buckets keyed by API key, host and tool live in a SQLite file, so all workers
+draw on one quota instead of each sleeping a fixed amount between calls
+"""
+
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from .metrics import METRICS
+from .discovery_cache import default_cache_dir
+from .deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+_UNIT_SECONDS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+
+class Rate:
+    """Sustained requests per second plus the burst a full bucket allows"""
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        if per_second <= 0:
+            raise ValueError(f"Rate must be positive, got {per_second}")
+        self.per_second = per_second
+        # One second's worth by default, and never less than one request
+        self.burst = max(1.0, burst if burst is not None else per_second)
+
+    @classmethod
+    def parse(cls, value: Union[None, int, float, str, Dict[str, Any], "Rate"]) -> Optional["Rate"]:
+        """
+        Rate from a number (per second), a string such as "5/s", "300/min" or
+        "1000/hour", or a {"rate": ..., "burst": ...} dict. None, "" and 0 mean unlimited.
+        """
+        if value is None or isinstance(value, Rate):
+            return value
+        if isinstance(value, dict):
+            rate = cls.parse(value.get("rate"))
+            if rate is None:
+                return None
+            return cls(rate.per_second, value.get("burst"))
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                return None
+            amount, _, unit = value.partition("/")
+            unit = unit.strip().lower() or "s"
+            if unit not in _UNIT_SECONDS:
+                raise ValueError(f"Unknown rate unit in {value!r}")
+            value = float(amount) / _UNIT_SECONDS[unit]
+        if not value:
+            return None
+        return cls(float(value))
+
+def default_db_path() -> Path:
+    """MEMRA_RATE_LIMIT_DB, else ratelimit.sqlite in the SDK cache directory"""
+    if os.getenv("MEMRA_RATE_LIMIT_DB"):
+        return Path(os.environ["MEMRA_RATE_LIMIT_DB"])
+    return default_cache_dir() / "ratelimit.sqlite"
+
+class TokenBucketStore:
+    """
+    Token buckets in a SQLite table. Each reservation is one BEGIN IMMEDIATE
+    transaction, which serialises processes on the file lock; buckets may go
+    negative, and the caller sleeps until its reserved token has accrued.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._local = threading.local()
+        # In-process buckets used when the database cannot be opened
+        self._fallback: Dict[str, Tuple[float, float]] = {}
+        self._fallback_lock = threading.Lock()
+        self._failed = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            path = self.path or default_db_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, key: str, rate: Rate, cost: float = 1.0, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take cost tokens from a bucket; returns the seconds to wait before using them.
+        A wait of max_wait or more is not taken: nothing is debited and None is returned.
+        """
+        if not self._failed:
+            try:
+                return self._reserve_shared(key, rate, cost, max_wait)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Rate limit store unavailable ({e}), limiting within this process only")
+                self._failed = True
+        with self._fallback_lock:
+            tokens, updated = self._fallback.get(key, (rate.burst, time.time()))
+            tokens, now = self._take(tokens, updated, rate, cost)
+            wait = self._wait(tokens, rate, max_wait)
+            if wait is not None:
+                self._fallback[key] = (tokens, now)
+        return wait
+
+    def _reserve_shared(self, key: str, rate: Rate, cost: float, max_wait: Optional[float]) -> Optional[float]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row is not None else (rate.burst, time.time())
+            tokens, now = self._take(tokens, updated, rate, cost)
+            wait = self._wait(tokens, rate, max_wait)
+            if wait is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, key: str, rate: Rate, cost: float = 1.0):
+        """Give back tokens taken by a reservation that will not be used"""
+        if not self._failed:
+            try:
+                self._reserve_shared(key, rate, -cost, None)
+                return
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Rate limit store unavailable ({e}), limiting within this process only")
+                self._failed = True
+        with self._fallback_lock:
+            tokens, updated = self._fallback.get(key, (rate.burst, time.time()))
+            self._fallback[key] = self._take(tokens, updated, rate, -cost)
+
+    @staticmethod
+    def _wait(tokens: float, rate: Rate, max_wait: Optional[float]) -> Optional[float]:
+        wait = max(0.0, -tokens / rate.per_second)
+        if wait > 0 and max_wait is not None and wait >= max_wait:
+            return None
+        return wait
+
+    @staticmethod
+    def _take(tokens: float, updated: float, rate: Rate, cost: float) -> Tuple[float, float]:
+        # Wall-clock time, the only clock all processes on the host share
+        now = time.time()
+        tokens = min(rate.burst, tokens + max(0.0, now - updated) * rate.per_second)
+        return min(rate.burst, tokens - cost), now
+
+# Shared by every client in the process; the file shares it with other processes
+STORE = TokenBucketStore()
+
+def bucket_key(api_key: Optional[str], url: str, tool_name: str = "*") -> str:
+    """Bucket for one API key, host and tool ("*" for every tool); the key itself is not stored"""
+    key_digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return f"{key_digest}|{urlsplit(url).netloc or url}|{tool_name}"
+
+def reserve(api_key: Optional[str], url: str, tool_name: str, api_rate: Optional[Rate] = None,
+            config: Optional[Dict[str, Any]] = None, store: TokenBucketStore = STORE,
+            max_wait: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds to wait before calling tool_name: the API-wide bucket for the key
+    (api_rate) and the tool's own bucket from Tool.config["rate_limit"], whichever is later.
+    None, with no token taken from either bucket, when that would be max_wait or more.
+    """
+    buckets = []
+    if api_rate is not None:
+        buckets.append((bucket_key(api_key, url), api_rate))
+    tool_rate = Rate.parse((config or {}).get("rate_limit"))
+    if tool_rate is not None:
+        buckets.append((bucket_key(api_key, url, tool_name), tool_rate))
+
+    wait = 0.0
+    for taken, (key, rate) in enumerate(buckets):
+        bucket_wait = store.reserve(key, rate, max_wait=max_wait)
+        if bucket_wait is None:
+            for key, rate in buckets[:taken]:
+                store.refund(key, rate)
+            return None
+        wait = max(wait, bucket_wait)
+    return wait
+
+def _reserve_within_deadline(api_key: Optional[str], url: str, tool_name: str, api_rate: Optional[Rate],
+                             config: Optional[Dict[str, Any]]) -> float:
+    """reserve(), raising DeadlineExceeded instead of debiting a wait the run cannot afford"""
+    deadline = current_deadline()
+    wait = reserve(api_key, url, tool_name, api_rate, config,
+                   max_wait=deadline.remaining() if deadline is not None else None)
+    if wait is None:
+        raise DeadlineExceeded(f"Rate limit wait for {tool_name} would pass the run deadline")
+    return wait
+
+def throttle(api_key: Optional[str], url: str, tool_name: str, api_rate: Optional[Rate] = None,
+             config: Optional[Dict[str, Any]] = None) -> float:
+    """Block until a request to tool_name is within the rate limits; returns the seconds waited"""
+    wait = _reserve_within_deadline(api_key, url, tool_name, api_rate, config)
+    if wait > 0:
+        logger.debug(f"Rate limit: waiting {wait:.2f}s before calling {tool_name}")
+        METRICS.rate_limit_wait.inc(wait, tool=tool_name)
+        time.sleep(wait)
+    return wait
+
+async def athrottle(api_key: Optional[str], url: str, tool_name: str, api_rate: Optional[Rate] = None,
+                    config: Optional[Dict[str, Any]] = None) -> float:
+    """Async counterpart of throttle()"""
+    import asyncio
+    wait = _reserve_within_deadline(api_key, url, tool_name, api_rate, config)
+    if wait > 0:
+        logger.debug(f"Rate limit: waiting {wait:.2f}s before calling {tool_name}")
+        METRICS.rate_limit_wait.inc(wait, tool=tool_name)
+        await asyncio.sleep(wait)
+    return wait
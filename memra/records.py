@@ -0,0 +1,73 @@
+"""
+Lightweight internal records for the execution hot path
+The engine accumulates into these plain __slots__ objects and only builds the
+public pydantic models once per run, without re-running validation
+"""
+
+from typing import Dict, Any, List, Optional, Type, TypeVar
+from pydantic import BaseModel
+from .models import ExecutionTrace, DepartmentResult, DepartmentAudit
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def construct_model(model_cls: Type[ModelT], **fields) -> ModelT:
+    """Build a pydantic model from trusted values, skipping validation (pydantic v1 and v2)"""
+    construct = getattr(model_cls, "model_construct", None) or model_cls.construct
+    return construct(**fields)
+
+class TraceRecord:
+    """Mutable trace used while a run is executing; see ExecutionTrace for the public form"""
+
+    __slots__ = ("agents_executed", "tools_invoked", "execution_times", "errors", "memory_usage",
+                 "circuit_breakers")
+
+    def __init__(self):
+        self.agents_executed: List[str] = []
+        self.tools_invoked: List[str] = []
+        self.execution_times: Dict[str, float] = {}
+        self.errors: List[str] = []
+        self.memory_usage: List[Dict[str, Any]] = []
+        # "host/tool" -> breaker state as of the last call to that tool
+        self.circuit_breakers: Dict[str, str] = {}
+
+    def to_model(self) -> ExecutionTrace:
+        return construct_model(
+            ExecutionTrace,
+            agents_executed=self.agents_executed,
+            tools_invoked=self.tools_invoked,
+            execution_times=self.execution_times,
+            errors=self.errors,
+            memory_usage=self.memory_usage,
+            circuit_breakers=self.circuit_breakers
+        )
+
+class RunRecord:
+    """Outcome of a single run before it is handed to the caller"""
+
+    __slots__ = ("success", "data", "error", "trace")
+
+    def __init__(self, success: bool, trace: TraceRecord, data: Optional[Dict[str, Any]] = None,
+                 error: Optional[str] = None):
+        self.success = success
+        self.data = data
+        self.error = error
+        self.trace = trace
+
+    def to_model(self) -> DepartmentResult:
+        return construct_model(
+            DepartmentResult,
+            success=self.success,
+            data=self.data,
+            error=self.error,
+            trace=self.trace.to_model()
+        )
+
+def build_audit(trace: TraceRecord, duration_seconds: float) -> DepartmentAudit:
+    """Audit record for a finished run"""
+    return construct_model(
+        DepartmentAudit,
+        agents_run=trace.agents_executed,
+        tools_invoked=trace.tools_invoked,
+        duration_seconds=duration_seconds,
+        total_cost=None
+    )
@@ -0,0 +1,191 @@
+"""
+Retry policy for tool and HTTP requests
+Exponential backoff with full jitter, Retry-After support and a total time
+budget, so concurrent clients spread their retries out instead of retrying in lockstep
+"""
+
+import time
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterable
+import httpx
+from .metrics import METRICS
+from .deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+# Tools with side effects; they are only retried when the server cannot have acted on the request
+NON_IDEMPOTENT_TOOLS = frozenset({"PostgresInsert", "SQLExecutor", "TextToSQL"})
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """When and how long to wait before retrying a request"""
+
+    def __init__(self, max_attempts: int = 3, retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+                 idempotent: bool = True, base_delay: float = 0.5, max_delay: float = 30.0,
+                 total_budget: float = 120.0, respect_retry_after: bool = True):
+        """
+        Args:
+            max_attempts: Attempts in total, including the first
+            retry_statuses: HTTP statuses worth retrying
+            idempotent: Whether repeating the request is safe; if False only failures the
+                server cannot have acted on (connection errors, 429) are retried
+            base_delay: Backoff cap for the first retry, doubled on each one after
+            max_delay: Upper bound for a single wait
+            total_budget: Seconds from the first attempt after which no retry is started
+            respect_retry_after: Wait as long as the server's Retry-After asks
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent = idempotent
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.total_budget = total_budget
+        self.respect_retry_after = respect_retry_after
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], default: Optional["RetryPolicy"] = None) -> "RetryPolicy":
+        """Policy from a Tool.config["retry"] dict, filling unset fields from default"""
+        base = default or cls()
+        fields = {
+            "max_attempts": base.max_attempts,
+            "retry_statuses": base.retry_statuses,
+            "idempotent": base.idempotent,
+            "base_delay": base.base_delay,
+            "max_delay": base.max_delay,
+            "total_budget": base.total_budget,
+            "respect_retry_after": base.respect_retry_after
+        }
+        unknown = set(config or {}) - set(fields)
+        if unknown:
+            logger.warning(f"Ignoring unknown retry settings: {', '.join(sorted(unknown))}")
+        fields.update({key: value for key, value in (config or {}).items() if key in fields})
+        return cls(**fields)
+
+    def backoff(self, retry_number: int) -> float:
+        """Full jitter: uniform between 0 and the exponential cap"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry_number)))
+
+    def retriable_status(self, status_code: int) -> bool:
+        if status_code not in self.retry_statuses:
+            return False
+        # 429 means the request was refused before it was processed
+        return self.idempotent or status_code == 429
+
+    def retriable_exception(self, error: Exception) -> bool:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            # Never reached the server
+            return True
+        return self.idempotent and isinstance(error, httpx.TransportError)
+
+    def _delay(self, retry_number: int, response: Optional[httpx.Response]) -> float:
+        if response is not None and self.respect_retry_after:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after
+        return self.backoff(retry_number)
+
+    def _next_delay(self, attempt: int, started: float, response: Optional[httpx.Response],
+                    error: Optional[Exception]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to stop"""
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None and not self.retriable_exception(error):
+            return None
+        if response is not None and not self.retriable_status(response.status_code):
+            return None
+        delay = self._delay(attempt - 1, response)
+        if time.monotonic() - started + delay > self.total_budget:
+            logger.info(f"Retry budget of {self.total_budget}s exhausted")
+            return None
+        deadline = current_deadline()
+        if deadline is not None and delay >= deadline.remaining():
+            logger.info(f"Not retrying: the run deadline is {deadline.remaining():.1f}s away")
+            return None
+        return delay
+
+    def call(self, send: Callable[[], httpx.Response], label: str = "http") -> httpx.Response:
+        """Run send() until it returns a non-retriable response or the policy gives up"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            try:
+                response = send()
+            except Exception as e:
+                error = e
+            delay = self._next_delay(attempt, started, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            reason = error if error is not None else f"HTTP {response.status_code}"
+            logger.warning(f"{label} attempt {attempt} failed ({reason}), retrying in {delay:.2f}s")
+            METRICS.retries.inc(tool=label)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    async def acall(self, send: Callable[[], Awaitable[httpx.Response]], label: str = "http") -> httpx.Response:
+        """Async counterpart of call()"""
+        import asyncio
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            try:
+                response = await send()
+            except Exception as e:
+                error = e
+            delay = self._next_delay(attempt, started, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            reason = error if error is not None else f"HTTP {response.status_code}"
+            logger.warning(f"{label} attempt {attempt} failed ({reason}), retrying in {delay:.2f}s")
+            METRICS.retries.inc(tool=label)
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+def policy_for_tool(tool_name: str, config: Optional[Dict[str, Any]] = None,
+                    overrides: Optional[Dict[str, RetryPolicy]] = None,
+                    default: Optional[RetryPolicy] = None) -> RetryPolicy:
+    """
+    Retry policy for a tool: Tool.config["retry"] settings on top of the client's
+    per-tool override or default. Tools in NON_IDEMPOTENT_TOOLS default to idempotent=False.
+    """
+    base = (overrides or {}).get(tool_name)
+    if base is None:
+        base = default or DEFAULT_RETRY_POLICY
+        if tool_name in NON_IDEMPOTENT_TOOLS and base.idempotent:
+            base = RetryPolicy.from_config({"idempotent": False}, base)
+    retry_config = (config or {}).get("retry")
+    if isinstance(retry_config, RetryPolicy):
+        return retry_config
+    if retry_config:
+        return RetryPolicy.from_config(retry_config, base)
+    return base
@@ -0,0 +1,154 @@
+"""
+Serialization codecs for tool traffic
+JSON through orjson when installed (stdlib json otherwise) and msgpack as a
+negotiated binary content type; both encode Decimal, date and datetime directly,
+Decimal (SQL NUMERIC) as a decimal string rather than a float so amounts keep every digit
+"""
+
+import json
+import base64
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Dict, Any, Optional
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+def orjson_available() -> bool:
+    """orjson is optional (pip install memra[orjson])"""
+    try:
+        import orjson  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def msgpack_available() -> bool:
+    """msgpack is optional (pip install memra[msgpack])"""
+    try:
+        import msgpack  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _default(value: Any) -> Any:
+    """Fallback for types the encoders do not know; mirrors what SQL rows contain"""
+    if isinstance(value, Decimal):
+        # As a string, so NUMERIC amounts keep every digit; Decimal(value) restores them
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return str(value)
+
+class Codec:
+    """Encodes and decodes message bodies for one content type"""
+
+    content_type = ""
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+class JSONCodec(Codec):
+    """JSON via orjson when available, else the stdlib encoder"""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def __init__(self):
+        try:
+            import orjson
+            self._orjson = orjson
+        except ImportError:
+            self._orjson = None
+
+    def dumps(self, value: Any) -> bytes:
+        if self._orjson is not None:
+            try:
+                return self._orjson.dumps(value, default=_default, option=self._orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # e.g. integers wider than 64 bits, which the stdlib encoder handles
+                pass
+        return json.dumps(value, default=_default).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        if self._orjson is not None:
+            return self._orjson.loads(data)
+        return json.loads(data)
+
+class MsgPackCodec(Codec):
+    """msgpack with the same type mapping as JSON, so results look alike whichever is negotiated"""
+
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError(
+                "msgpack is required for the msgpack codec. "
+                "Install with: pip install memra[msgpack]"
+            )
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, default=_default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+JSON = JSONCodec()
+_codecs: Dict[str, Codec] = {JSON_CONTENT_TYPE: JSON}
+
+def get_codec(content_type: str) -> Optional[Codec]:
+    """Codec registered for a media type, creating optional ones on first use"""
+    if content_type not in _codecs and content_type == MSGPACK_CONTENT_TYPE and msgpack_available():
+        _codecs[content_type] = MsgPackCodec()
+    return _codecs.get(content_type)
+
+def _media_type(content_type: Optional[str]) -> str:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return MSGPACK_CONTENT_TYPE if media_type == "application/x-msgpack" else media_type
+
+def codec_for(content_type: Optional[str]) -> Codec:
+    """Codec for a Content-Type header, JSON when absent or unknown"""
+    return get_codec(_media_type(content_type)) or JSON
+
+def accept_header() -> str:
+    """Accept header preferring msgpack when this process can decode it"""
+    if msgpack_available():
+        return f"{MSGPACK_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.9"
+    return JSON_CONTENT_TYPE
+
+def negotiate(accept: Optional[str]) -> Codec:
+    """Response codec for an Accept header: msgpack if the client ranks it highest, else JSON"""
+    if not accept:
+        return JSON
+    best, best_weight = JSON, 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        codec = get_codec(_media_type(media_type))
+        if codec is not None and weight > best_weight:
+            best, best_weight = codec, weight
+    return best
+
+def decode_response(response) -> Any:
+    """Decode an httpx response body according to its Content-Type"""
+    return codec_for(response.headers.get("Content-Type")).loads(response.content)
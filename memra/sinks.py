@@ -0,0 +1,250 @@
+"""
+Result sinks for batch execution
+The engine hands every completed run to its sinks and then drops it, so
+memory use stays flat no matter how many documents a batch processes
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+def _to_json(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+class ResultSink:
+    """Receives one record per completed run"""
+
+    def write(self, record: Dict[str, Any]):
+        """
+        Store a run record with keys: run_id, department, success, error,
+        data, trace, duration_seconds, finished_at
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Push buffered records to storage"""
+        pass
+
+    def close(self):
+        """Flush and release resources"""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class JSONLinesSink(ResultSink):
+    """Appends one JSON object per run to a file"""
+
+    def __init__(self, path: str, include_data: bool = True, include_trace: bool = True):
+        self.path = path
+        self.include_data = include_data
+        self.include_trace = include_trace
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        if not self.include_data or not self.include_trace:
+            record = dict(record)
+            if not self.include_data:
+                record.pop("data", None)
+            if not self.include_trace:
+                record.pop("trace", None)
+        line = _to_json(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+class SQLiteSink(ResultSink):
+    """Stores runs in a SQLite table, committing every commit_every records"""
+
+    def __init__(self, path: str, table: str = "department_runs", commit_every: int = 100):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.table = table
+        self.commit_every = max(1, commit_every)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                run_id TEXT PRIMARY KEY,
+                department TEXT,
+                success INTEGER,
+                error TEXT,
+                data TEXT,
+                trace TEXT,
+                duration_seconds REAL,
+                finished_at TEXT
+            )
+        """)
+        self._conn.commit()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        row = (
+            record["run_id"],
+            record["department"],
+            int(bool(record["success"])),
+            record.get("error"),
+            _to_json(record.get("data")),
+            _to_json(record.get("trace")),
+            record.get("duration_seconds"),
+            record.get("finished_at")
+        )
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+class ParquetSink(ResultSink):
+    """Writes runs to a Parquet file in row groups of batch_size (requires pyarrow)"""
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "pyarrow is required for ParquetSink. "
+                "Install with: pip install memra[parquet]"
+            )
+        self._pa = pa
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.schema = pa.schema([
+            ("run_id", pa.string()),
+            ("department", pa.string()),
+            ("success", pa.bool_()),
+            ("error", pa.string()),
+            ("data", pa.string()),
+            ("trace", pa.string()),
+            ("duration_seconds", pa.float64()),
+            ("finished_at", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        row = {
+            "run_id": record["run_id"],
+            "department": record["department"],
+            "success": bool(record["success"]),
+            "error": record.get("error"),
+            "data": _to_json(record.get("data")),
+            "trace": _to_json(record.get("trace")),
+            "duration_seconds": record.get("duration_seconds"),
+            "finished_at": record.get("finished_at")
+        }
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._write_rows()
+
+    def _write_rows(self):
+        if self._rows:
+            table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def flush(self):
+        with self._lock:
+            self._write_rows()
+
+    def close(self):
+        with self._lock:
+            self._write_rows()
+            self._writer.close()
+
+class CallbackSink(ResultSink):
+    """Passes each record to a function"""
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None]):
+        self.callback = callback
+
+    def write(self, record: Dict[str, Any]):
+        self.callback(record)
+
+class TraceRingBuffer(ResultSink):
+    """Keeps only the most recent run traces for inspection"""
+
+    def __init__(self, capacity: int = 100):
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        entry = {
+            "run_id": record["run_id"],
+            "department": record["department"],
+            "success": record["success"],
+            "error": record.get("error"),
+            "trace": record.get("trace"),
+            "finished_at": record.get("finished_at")
+        }
+        with self._lock:
+            self._records.append(entry)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent traces, newest last"""
+        with self._lock:
+            records = list(self._records)
+        return records[-limit:] if limit else records
+
+    def failures(self) -> List[Dict[str, Any]]:
+        return [record for record in self.recent() if not record["success"]]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+def build_run_record(run_id: str, department_name: str, result, duration_seconds: float) -> Dict[str, Any]:
+    """Flatten a DepartmentResult into the dict handed to sinks"""
+    trace = result.trace
+    return {
+        "run_id": run_id,
+        "department": department_name,
+        "success": result.success,
+        "error": result.error,
+        "data": result.data,
+        "trace": {
+            "agents_executed": trace.agents_executed,
+            "tools_invoked": trace.tools_invoked,
+            "execution_times": trace.execution_times,
+            "errors": trace.errors,
+            "memory_usage": trace.memory_usage,
+            "circuit_breakers": trace.circuit_breakers
+        },
+        "duration_seconds": duration_seconds,
+        "finished_at": datetime.utcnow().isoformat()
+    }
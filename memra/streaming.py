@@ -0,0 +1,229 @@
+"""
+Incremental decoding of large tool responses
+Parses a JSON response as it downloads and exposes selected list-valued
+fields (e.g. SQLExecutor "results" rows) as iterators, so consumers can start
+working before the body is complete and peak memory stays bounded
+"""
+
+import json
+import codecs
+import logging
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_FIELDS = ("results", "rows")
+
+_WHITESPACE = " \t\n\r"
+# A number is only known to be complete once one of these follows it
+_NUMBER_START = "-0123456789"
+_DELIMITERS = _WHITESPACE + ",]}"
+_COMPACT_THRESHOLD = 64 * 1024
+
+class StreamingJSONParser:
+    """
+    Pull parser over an iterable of byte chunks.
+
+    Objects are walked key by key; arrays stored under a key listed in
+    stream_fields are emitted item by item instead of being built in memory.
+    Every other value is decoded in one piece with the stdlib decoder.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], stream_fields: Sequence[str] = DEFAULT_STREAM_FIELDS):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.stream_fields = set(stream_fields)
+        self._buf = ""
+        self._pos = 0
+        self._exhausted = False
+
+    # Buffer management
+
+    def _fill(self) -> bool:
+        """Append the next chunk; False once the stream is exhausted"""
+        if self._exhausted:
+            return False
+        if self._pos > _COMPACT_THRESHOLD:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._decoder.decode(b"", final=True)
+        self._exhausted = True
+        return False
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self._pos}, got '{self._buf[self._pos]}'")
+        self._pos += 1
+
+    def _decode_piece(self) -> Any:
+        """Decode one complete value, reading more input while it is truncated"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # "12." or "1.5e" at the buffer edge decodes as 12 or 1.5; wait for a delimiter
+                complete = self._buf[self._pos] not in _NUMBER_START or (
+                    end < len(self._buf) and self._buf[end] in _DELIMITERS)
+                if complete or self._exhausted:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._exhausted:
+                    raise
+            # Grow geometrically so big values are re-scanned O(log n) times, not O(n)
+            target = (len(self._buf) - self._pos) * 2
+            while len(self._buf) - self._pos < target and self._fill():
+                pass
+
+    # Grammar
+
+    def events(self) -> Iterator[Tuple[str, Tuple[str, ...], Any, Optional[List[Any]]]]:
+        """
+        Yield ("item", path, value, placeholder) for each streamed array element,
+        then ("end", (), document, None). The placeholder is the list left in the
+        document for that field; append items to it to keep them.
+        """
+        document = yield from self._parse_value(())
+        yield ("end", (), document, None)
+
+    def _parse_value(self, path: Tuple[str, ...]):
+        char = self._peek()
+        if char == "{":
+            return (yield from self._parse_object(path))
+        if char == "[" and path and path[-1] in self.stream_fields:
+            return (yield from self._stream_array(path))
+        return self._decode_piece()
+
+    def _parse_object(self, path: Tuple[str, ...]):
+        self._expect("{")
+        obj: Dict[str, Any] = {}
+        if self._peek() == "}":
+            self._pos += 1
+            return obj
+        while True:
+            key = self._decode_piece()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected object key at offset {self._pos}")
+            self._expect(":")
+            obj[key] = yield from self._parse_value(path + (key,))
+            separator = self._peek()
+            self._pos += 1
+            if separator == "}":
+                return obj
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' at offset {self._pos - 1}")
+
+    def _stream_array(self, path: Tuple[str, ...]):
+        self._expect("[")
+        placeholder: List[Any] = []
+        if self._peek() == "]":
+            self._pos += 1
+            return placeholder
+        while True:
+            item = self._decode_piece()
+            yield ("item", path, item, placeholder)
+            separator = self._peek()
+            self._pos += 1
+            if separator == "]":
+                return placeholder
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' at offset {self._pos - 1}")
+
+class StreamedToolResult:
+    """
+    Tool result whose large list fields are read lazily from the HTTP response.
+
+    Iterate a field with iter_field("results") (or iterate the object itself for
+    the first stream field). Items you consume are not retained. result() returns
+    the rest of the response body: keys that follow a streamed field in the JSON
+    are only available once that field has been read past, and streamed fields
+    hold whatever items were not consumed.
+    """
+
+    def __init__(self, chunks: Optional[Iterable[bytes]] = None,
+                 stream_fields: Sequence[str] = DEFAULT_STREAM_FIELDS,
+                 close=None, document: Optional[Dict[str, Any]] = None):
+        self.stream_fields = tuple(stream_fields)
+        self.streamed_counts: Dict[str, int] = {}
+        self._close = close
+        self._document = document
+        self._events = StreamingJSONParser(chunks, stream_fields).events() if document is None else iter(())
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "StreamedToolResult":
+        """Wrap an already-decoded result, e.g. an error"""
+        return cls(document=result)
+
+    def iter_field(self, name: str) -> Iterator[Any]:
+        """Yield items of the named stream field as they are decoded"""
+        if name not in self.stream_fields:
+            raise ValueError(f"{name} is not a stream field ({', '.join(self.stream_fields)})")
+        for kind, path, value, placeholder in self._events:
+            if kind == "end":
+                self._finish(value)
+                return
+            if path[-1] == name:
+                key = ".".join(path)
+                self.streamed_counts[key] = self.streamed_counts.get(key, 0) + 1
+                yield value
+            else:
+                placeholder.append(value)
+        # Already finished: hand back anything that was kept for this field
+        for value in self._kept_items(self._document, name):
+            yield value
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.iter_field(self.stream_fields[0])
+
+    def result(self) -> Dict[str, Any]:
+        """The response body, reading (and keeping) whatever has not been consumed yet"""
+        for kind, path, value, placeholder in self._events:
+            if kind == "end":
+                self._finish(value)
+            else:
+                placeholder.append(value)
+        return self._document if self._document is not None else {}
+
+    def _finish(self, document: Any):
+        self._document = document if isinstance(document, dict) else {"data": document}
+        self.close()
+
+    def _kept_items(self, node: Any, name: str) -> List[Any]:
+        """Pop items retained for a stream field so they are yielded only once"""
+        if not isinstance(node, dict):
+            return []
+        for key, value in node.items():
+            if key == name and isinstance(value, list):
+                items = list(value)
+                value.clear()
+                return items
+            found = self._kept_items(value, name)
+            if found:
+                return found
+        return []
+
+    def close(self):
+        if self._close is not None:
+            close, self._close = self._close, None
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
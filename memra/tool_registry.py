@@ -2,17 +2,43 @@ import importlib
 import logging
 import sys
 import os
+import threading
 import httpx
 from typing import Dict, Any, List, Optional, Callable
 from pathlib import Path
+from .metrics import METRICS
+from .transport import get_shared_client
+from .compression import send_json
+from .serialization import decode_response
+from .retry import RetryPolicy, DEFAULT_RETRY_POLICY, policy_for_tool
+from .circuit_breaker import BREAKERS, guard, record_wait
+from .rate_limit import throttle
+from .deadline import DeadlineExceeded, check_deadline, request_timeout
+from .concurrency import LIMITERS, ADAPTIVE_CONCURRENCY_ENABLED
+from .tool_registry_client import tool_error
 
 logger = logging.getLogger(__name__)
 
+# Paths an MCP bridge may serve tool calls on, probed in this order when it cannot say
+BRIDGE_EXECUTE_PATHS = ("/execute_tool", "/tool/{tool_name}", "/mcp/execute", "/api/execute")
+
+# Execute path that worked for each bridge URL, shared by every registry in the process
+_bridge_paths: Dict[str, str] = {}
+_bridge_lock = threading.Lock()
+
+def forget_bridge_endpoint(bridge_url: str):
+    """Drop the cached execute path of a bridge, so the next call negotiates again"""
+    with _bridge_lock:
+        _bridge_paths.pop(bridge_url, None)
+
 class ToolRegistry:
     """Registry for managing and executing tools via API calls only"""
     
-    def __init__(self):
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None,
+                 tool_retry_policies: Optional[Dict[str, RetryPolicy]] = None):
         self.tools: Dict[str, Dict[str, Any]] = {}
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.tool_retry_policies = tool_retry_policies or {}
         self._register_known_tools()
     
     def _register_known_tools(self):
@@ -78,6 +104,33 @@ class ToolRegistry:
                 "error": "Direct tool execution not supported. Use API client for tool execution."
             }
     
+    def _bridge_path(self, client: httpx.Client, bridge_url: str, headers: Dict[str, str]) -> Optional[str]:
+        """
+        Execute path of a bridge: cached, else negotiated through its GET /tools, which
+        names it as execute_endpoint (bridges that list tools without it serve the first
+        standard path). None when the bridge cannot say, and the paths must be probed.
+        """
+        with _bridge_lock:
+            path = _bridge_paths.get(bridge_url)
+        if path is not None:
+            return path
+        try:
+            response = client.get(f"{bridge_url}/tools", headers=headers, timeout=request_timeout(10.0))
+        except httpx.TransportError as e:
+            logger.debug(f"Could not negotiate with bridge {bridge_url}: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        try:
+            body = decode_response(response)
+        except ValueError:
+            return None
+        path = (body.get("execute_endpoint") if isinstance(body, dict) else None) or BRIDGE_EXECUTE_PATHS[0]
+        logger.info(f"MCP bridge {bridge_url} executes tools at {path}")
+        with _bridge_lock:
+            _bridge_paths[bridge_url] = path
+        return path
+    
     def _execute_mcp_tool(self, tool_name: str, input_data: Dict[str, Any], 
                          config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Execute an MCP tool via the bridge"""
@@ -103,14 +156,6 @@ class ToolRegistry:
                     "error": "MCP bridge secret required"
                 }
             
-            # Try different endpoint patterns that might exist
-            endpoints_to_try = [
-                f"{bridge_url}/execute_tool",
-                f"{bridge_url}/tool/{tool_name}",
-                f"{bridge_url}/mcp/execute",
-                f"{bridge_url}/api/execute"
-            ]
-            
             # Prepare request
             payload = {
                 "tool_name": tool_name,
@@ -118,47 +163,86 @@ class ToolRegistry:
             }
             
             headers = {
-                "Content-Type": "application/json",
                 "X-Bridge-Secret": bridge_secret
             }
             
-            # Try each endpoint
+            check_deadline()
+            
             logger.info(f"Executing MCP tool {tool_name} via bridge at {bridge_url}")
+            policy = policy_for_tool(tool_name, config, self.tool_retry_policies, self.retry_policy)
             
             last_error = None
-            for endpoint in endpoints_to_try:
-                try:
-                    logger.info(f"Trying endpoint: {endpoint}")
-                    with httpx.Client(timeout=60.0) as client:
-                        response = client.post(endpoint, json=payload, headers=headers)
+            limiter = LIMITERS.get(bridge_url) if ADAPTIVE_CONCURRENCY_ENABLED else None
+            # Pooled keep-alive connections instead of a new client per call
+            client = get_shared_client()
+            
+            def send(endpoint: str) -> httpx.Response:
+                # Every attempt takes a token; the bridge has no API key, so only
+                # Tool.config["rate_limit"] applies
+                record_wait(throttle(bridge_secret, bridge_url, tool_name, config=config))
+                # Compressed once the bridge has advertised Accept-Encoding
+                if limiter is None:
+                    return send_json(client, endpoint, payload, headers=headers, timeout=request_timeout(60.0))
+                with limiter.slot(tool_name) as slot:
+                    response = send_json(client, endpoint, payload, headers=headers, timeout=request_timeout(60.0))
+                    slot.record(response.status_code)
+                    return response
+            
+            # One path once the bridge is known; every candidate only while it is not
+            path = self._bridge_path(client, bridge_url, headers)
+            candidates = [path] if path else list(BRIDGE_EXECUTE_PATHS)
+            renegotiated = False
+            # Fail fast while the bridge is known to be unhealthy
+            breaker = BREAKERS.get(bridge_url, tool_name, config)
+            if breaker is not None and not breaker.allow():
+                logger.warning(f"Circuit open for MCP tool {tool_name} on {bridge_url}, not calling the bridge")
+                return breaker.rejection()
+            # Answered on no path, a connection error or a 5xx counts against the bridge
+            with guard(breaker) as outcome:
+                while candidates:
+                    template = candidates.pop(0)
+                    endpoint = f"{bridge_url}{template.format(tool_name=tool_name)}"
+                    try:
+                        response = policy.call(lambda: send(endpoint), label=tool_name)
+                        METRICS.payload_bytes.inc(len(response.request.content), tool=tool_name, direction="sent")
+                        METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool=tool_name, direction="received")
                         
-                        logger.info(f"Response status for {endpoint}: {response.status_code}")
+                        if response.status_code == 404:
+                            logger.info(f"Endpoint {endpoint} returned 404")
+                            if path is not None and not renegotiated:
+                                # The bridge changed since its path was cached; ask it again, once
+                                forget_bridge_endpoint(bridge_url)
+                                renegotiated = True
+                                path = self._bridge_path(client, bridge_url, headers)
+                                candidates = [other for other in ([path] if path else []) + list(BRIDGE_EXECUTE_PATHS)
+                                              if other != template]
+                                candidates = list(dict.fromkeys(candidates))
+                            continue
                         
+                        with _bridge_lock:
+                            _bridge_paths[bridge_url] = template
+                        outcome.status_code = response.status_code
                         if response.status_code == 200:
-                            result = response.json()
+                            result = decode_response(response)
                             logger.info(f"MCP tool {tool_name} executed successfully via {endpoint}")
                             return result
-                        elif response.status_code == 404:
-                            logger.info(f"Endpoint {endpoint} returned 404, trying next...")
-                            continue  # Try next endpoint
-                        else:
-                            logger.error(f"Endpoint {endpoint} returned {response.status_code}: {response.text}")
-                            response.raise_for_status()
-                            
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 404:
-                        logger.info(f"Endpoint {endpoint} returned 404, trying next...")
-                        continue  # Try next endpoint
-                    logger.error(f"HTTP error for {endpoint}: {e.response.status_code} - {e.response.text}")
-                    last_error = e
-                    continue
-                except Exception as e:
-                    logger.error(f"Exception for {endpoint}: {str(e)}")
-                    last_error = e
-                    continue
+                        logger.error(f"Endpoint {endpoint} returned {response.status_code}: {response.text}")
+                        response.raise_for_status()
+                        
+                    except DeadlineExceeded:
+                        # Out of budget: report it rather than falling back to mock data
+                        raise
+                    except Exception as e:
+                        # Not a missing path: the bridge is down or the tool failed, and other paths would fare no better
+                        logger.error(f"Exception for {endpoint}: {str(e)}")
+                        last_error = e
+                        break
             
-            # If we get here, none of the endpoints worked
-            # For now, return mock data to keep the workflow working
+            # If we get here, the bridge could not run the tool
+            if last_error is not None:
+                # The bridge was reached and failed (or the run ran out of time): never paper over that
+                return tool_error(tool_name, last_error)
+            # No bridge serves any known path; for now, return mock data to keep the workflow working
             logger.warning(f"MCP bridge endpoints not available, returning mock data for {tool_name}")
             
             if tool_name == "DataValidator":
@@ -252,12 +336,12 @@ class ToolRegistry:
                     {
                         "vendor_name": "Air Liquide Canada Inc.",
                         "invoice_number": "INV-12345",
-                        "total_amount": 1234.56
+                        "total_amount": "1234.56"
                     },
                     {
                         "vendor_name": "Air Liquide Canada Inc.", 
                         "invoice_number": "INV-67890",
-                        "total_amount": 2345.67
+                        "total_amount": "2345.67"
                     }
                 ]
                 
@@ -282,11 +366,11 @@ class ToolRegistry:
                         "error": "SQL query is required"
                     }
                 
-                # Mock results based on query type
+                # Mock results based on query type; NUMERIC columns as decimal strings, like the bridge sends them
                 if sql_query.upper().startswith("SELECT"):
                     mock_results = [
-                        {"vendor_name": "Air Liquide Canada Inc.", "invoice_number": "INV-12345", "total_amount": 1234.56},
-                        {"vendor_name": "Air Liquide Canada Inc.", "invoice_number": "INV-67890", "total_amount": 2345.67}
+                        {"vendor_name": "Air Liquide Canada Inc.", "invoice_number": "INV-12345", "total_amount": "1234.56"},
+                        {"vendor_name": "Air Liquide Canada Inc.", "invoice_number": "INV-67890", "total_amount": "2345.67"}
                     ]
                     return {
                         "success": True,
@@ -337,11 +421,14 @@ class ToolRegistry:
                     "error": f"MCP bridge not available and no mock data for {tool_name}"
                 }
                 
-        except httpx.TimeoutException:
-            logger.error(f"MCP tool {tool_name} execution timed out")
+        except httpx.TimeoutException as e:
+            return tool_error(tool_name, e)
+        except DeadlineExceeded as e:
+            logger.error(f"MCP tool {tool_name} ran out of run budget: {e}")
             return {
                 "success": False,
-                "error": f"MCP tool execution timed out after 60 seconds"
+                "error": str(e),
+                "deadline_exceeded": True
             }
         except Exception as e:
             logger.error(f"MCP tool execution failed for {tool_name}: {str(e)}")
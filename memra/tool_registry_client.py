@@ -1,18 +1,197 @@
 import httpx
 import logging
 import os
-from typing import Dict, Any, List, Optional
-import asyncio
+import time
+import base64
+import mimetypes
+from contextlib import ExitStack
+from typing import Dict, Any, List, Optional, Tuple, Sequence, Iterator, TYPE_CHECKING
+from .metrics import METRICS
+from .transport import get_shared_client, get_shared_async_client, DEFAULT_MAX_CONNECTIONS
+from .discovery_cache import DiscoveryCache, DEFAULT_DISCOVERY_TTL
+from .streaming import StreamedToolResult, DEFAULT_STREAM_FIELDS
+from .compression import send_json, asend_json
+from .serialization import JSON, decode_response, accept_header, JSON_CONTENT_TYPE
+from .upload_cache import UploadCache, file_digest
+from .retry import RetryPolicy, DEFAULT_RETRY_POLICY, policy_for_tool
+from .circuit_breaker import BREAKERS, CallOutcome, guard, record_wait
+from .rate_limit import Rate, throttle, athrottle
+from .deadline import DeadlineExceeded, check_deadline, current_deadline, request_timeout
+from .concurrency import AdaptiveLimiter, LIMITERS, ADAPTIVE_CONCURRENCY_ENABLED
+from .hedging import HedgePolicy, hedge_policy_for_tool, hedged_call, ahedged_call
+from .outbox import Outbox, OUTBOX, OUTBOX_ENABLED, is_unavailable
+
+if TYPE_CHECKING:
+    import asyncio
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_READ_SIZE = 64 * 1024
+DEFAULT_UPLOAD_CHUNK_SIZE = int(os.getenv("MEMRA_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+DEFAULT_RESUMABLE_THRESHOLD = int(os.getenv("MEMRA_UPLOAD_RESUMABLE_THRESHOLD", str(16 * 1024 * 1024)))
+UPLOAD_CHUNK_RETRIES = 5
+# Statuses with which the API refuses a request without running it
+UNAVAILABLE_STATUSES = (429, 503)
+# Statuses of a tool call whose uploaded file the API no longer holds
+UPLOAD_GONE_STATUSES = (404, 410)
+
+class _UploadNotSupported(Exception):
+    """The API does not offer this upload method (404/405)"""
+
+def _iter_file(path: str, start: int = 0, end: Optional[int] = None,
+               read_size: int = UPLOAD_READ_SIZE) -> Iterator[bytes]:
+    """Yield bytes [start, end) of a file without holding more than read_size in memory"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            chunk = f.read(read_size if remaining is None else min(read_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def _request_timeout_used(error: httpx.TimeoutException) -> Optional[float]:
+    """Read timeout the failed request was sent with, if httpx recorded it"""
+    try:
+        return (error.request.extensions.get("timeout") or {}).get("read")
+    except RuntimeError:
+        # Raised without a request attached
+        return None
+
+def tool_error(tool_name: str, error: Exception) -> Dict[str, Any]:
+    """Map a failed tool request to the SDK's error result"""
+    deadline = current_deadline()
+    if isinstance(error, DeadlineExceeded) or (
+            isinstance(error, httpx.TimeoutException) and deadline is not None and deadline.expired()):
+        logger.error(f"Tool {tool_name} ran out of run budget: {error}")
+        return {
+            "success": False,
+            "error": f"Run deadline of {deadline.seconds:.0f}s exceeded" if deadline else str(error),
+            "deadline_exceeded": True
+        }
+    # The request never reached the tool, so replaying it later is safe for any tool
+    unavailable = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)) or (
+        isinstance(error, httpx.HTTPStatusError) and error.response.status_code in UNAVAILABLE_STATUSES)
+    if isinstance(error, httpx.TimeoutException):
+        # The timeout actually applied, which the run deadline may have shortened
+        timeout = _request_timeout_used(error)
+        logger.error(f"Tool {tool_name} execution timed out")
+        result = {
+            "success": False,
+            "error": f"Tool execution timed out after {timeout:.1f} seconds" if timeout is not None
+            else "Tool execution timed out"
+        }
+    elif isinstance(error, httpx.HTTPStatusError):
+        logger.error(f"API error for tool {tool_name}: {error.response.status_code}")
+        result = {
+            "success": False,
+            "error": f"API error: {error.response.status_code} - {error.response.text}",
+            "status_code": error.response.status_code
+        }
+    else:
+        logger.error(f"Tool execution failed for {tool_name}: {str(error)}")
+        result = {
+            "success": False,
+            "error": str(error)
+        }
+    if unavailable:
+        result["unavailable"] = True
+    return result
+
+def _invocation_payload(invocation: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise one batch item to the /tools/execute request shape"""
+    return {
+        "tool_name": invocation["tool_name"],
+        "hosted_by": invocation.get("hosted_by", "memra"),
+        "input_data": invocation.get("input_data", {}),
+        "config": invocation.get("config")
+    }
+
+def _batch_results(body: Dict[str, Any], expected: int) -> List[Dict[str, Any]]:
+    """Extract per-item results, padding if the server returned too few"""
+    results = body.get("results", [])
+    if len(results) < expected:
+        logger.error(f"Batch response had {len(results)} results for {expected} invocations")
+        results = results + [
+            {"success": False, "error": "No result returned for batch item"}
+            for _ in range(expected - len(results))
+        ]
+    return results[:expected]
+
+def _admit_batch(api_base: str, invocations: List[Dict[str, Any]], guards: ExitStack,
+                 results: List[Optional[Dict[str, Any]]]) -> Tuple[List[int], List[CallOutcome]]:
+    """
+    Ask each item's breaker whether it may go out. Refused items get their rejection in
+    results; admitted ones are guarded by guards and returned by index with their outcomes.
+    """
+    admitted, outcomes = [], []
+    for index, item in enumerate(invocations):
+        breaker = BREAKERS.get(api_base, item["tool_name"], item.get("config"))
+        if breaker is not None and not breaker.allow():
+            logger.warning(f"Circuit open for tool {item['tool_name']}, leaving it out of the batch")
+            results[index] = breaker.rejection()
+            continue
+        outcomes.append(guards.enter_context(guard(breaker)))
+        admitted.append(index)
+    return admitted, outcomes
+
+def _batch_policy(invocations: List[Dict[str, Any]], overrides: Dict[str, RetryPolicy],
+                  default: RetryPolicy) -> RetryPolicy:
+    """Default policy for a batch, idempotent only if every tool in it is"""
+    idempotent = all(
+        policy_for_tool(item["tool_name"], item.get("config"), overrides, default).idempotent
+        for item in invocations
+    )
+    return RetryPolicy.from_config({"idempotent": idempotent}, default)
+
 class ToolRegistryClient:
     """Client-side registry that calls Memra API for tool execution"""
     
-    def __init__(self):
-        self.api_base = os.getenv("MEMRA_API_URL", "https://api.memra.co")
+    def __init__(self, http_client: Optional[httpx.Client] = None,
+                 max_connections_per_host: Optional[int] = None,
+                 discovery_ttl: float = DEFAULT_DISCOVERY_TTL,
+                 api_base: Optional[str] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 tool_retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 tool_hedge_policies: Optional[Dict[str, HedgePolicy]] = None,
+                 rate_limit: Optional[Any] = None,
+                 adaptive_concurrency: Optional[bool] = None,
+                 outbox: Optional[Outbox] = None):
+        self.api_base = api_base or os.getenv("MEMRA_API_URL", "https://api.memra.co")
         self.api_key = os.getenv("MEMRA_API_KEY")
         self.tools_cache = None
+        self.discovery_cache = DiscoveryCache(self.api_base, ttl=discovery_ttl, api_key=self.api_key)
+        # Calls the API cannot take right now are queued here and replayed later
+        self.outbox = outbox if outbox is not None else (OUTBOX if OUTBOX_ENABLED else None)
+        # Default retry policy, per-tool overrides; Tool.config["retry"] refines either
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.tool_retry_policies = tool_retry_policies or {}
+        # Hedging is opt-in: a default policy, per-tool policies or Tool.config["hedge"]
+        self.hedge_policy = hedge_policy
+        self.tool_hedge_policies = tool_hedge_policies or {}
+        # Requests per second for this API key, shared with every process on the host
+        # ("300/min", a Rate, ...); Tool.config["rate_limit"] adds a per-tool limit
+        self.rate_limit = Rate.parse(rate_limit if rate_limit is not None else os.getenv("MEMRA_RATE_LIMIT"))
+        # AIMD limit on requests in flight to the API, learned from 429/5xx and latency
+        if adaptive_concurrency is None:
+            adaptive_concurrency = ADAPTIVE_CONCURRENCY_ENABLED
+        self.concurrency_limiter: Optional[AdaptiveLimiter] = LIMITERS.get(self.api_base) if adaptive_concurrency else None
+        # Resumable upload ids by (path, size, mtime), so a failed upload continues where it stopped
+        self._upload_sessions: Dict[Tuple[str, int, float], str] = {}
+        self.upload_cache = UploadCache(self.api_base, api_key=self.api_key)
+        # Cleared when the API answers 404/405 to POST /tools/execute_with_file
+        self._execute_with_file_supported = True
+        
+        # Pooled keep-alive client shared by every ToolRegistryClient in the process
+        if http_client is not None:
+            self.http_client = http_client
+        elif max_connections_per_host is not None:
+            self.http_client = get_shared_client(max_connections_per_host=max_connections_per_host)
+        else:
+            self.http_client = get_shared_client()
         
         if not self.api_key:
             raise ValueError(
@@ -20,36 +199,104 @@ class ToolRegistryClient:
                 "Please contact info@memra.co for an API key."
             )
     
-    def discover_tools(self, hosted_by: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Discover available tools from the API"""
+    def _send(self, tool_name: str, url: str, payload: Any, config: Optional[Dict[str, Any]] = None,
+              timeout: float = 60.0, **kwargs) -> httpx.Response:
+        """
+        One attempt: send_json() once the rate limits allow it, within a slot of the API's
+        adaptive concurrency limit. Every retry and hedge takes its own token; timeout is
+        capped by what is left of the run deadline after the wait.
+        """
+        record_wait(throttle(self.api_key, self.api_base, tool_name, self.rate_limit, config))
+        kwargs["timeout"] = request_timeout(timeout)
+        if self.concurrency_limiter is None:
+            return send_json(self.http_client, url, payload, **kwargs)
+        with self.concurrency_limiter.slot(tool_name) as slot:
+            response = send_json(self.http_client, url, payload, **kwargs)
+            slot.record(response.status_code)
+            return response
+    
+    def discover_tools(self, hosted_by: Optional[str] = None,
+                       force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """Discover available tools from the API, served from the discovery cache while fresh"""
+        tools = self.fetch_tools(force_refresh)
+        if tools is None:
+            # Return empty list if API is unavailable
+            return []
+        
+        # Filter by hosted_by if specified
+        if hosted_by:
+            tools = [t for t in tools if t.get("hosted_by") == hosted_by]
+        return tools
+    
+    def fetch_tools(self, force_refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Unfiltered tool list, or None if the API could not be reached"""
+        entry = self.discovery_cache.get()
+        if not force_refresh and self.discovery_cache.is_fresh(entry):
+            METRICS.cache_hits.inc(cache="discovery")
+            self.tools_cache = entry["tools"]
+            return entry["tools"]
+        METRICS.cache_misses.inc(cache="discovery")
+        
+        headers = {"X-API-Key": self.api_key}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        
         try:
-            # Use sync httpx for compatibility with existing sync code
-            with httpx.Client(timeout=30.0) as client:
-                response = client.get(
-                    f"{self.api_base}/tools/discover",
-                    headers={"X-API-Key": self.api_key}
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                tools = data.get("tools", [])
-                
-                # Filter by hosted_by if specified
-                if hosted_by:
-                    tools = [t for t in tools if t.get("hosted_by") == hosted_by]
-                
-                self.tools_cache = tools
-                logger.info(f"Discovered {len(tools)} tools from API")
-                return tools
+            response = self.retry_policy.call(lambda: self.http_client.get(
+                f"{self.api_base}/tools/discover",
+                headers=headers,
+                timeout=request_timeout(30.0)
+            ), label="discovery")
+            entry = self._update_discovery_cache(response, entry)
+            self.tools_cache = entry["tools"]
+            return entry["tools"]
                 
         except Exception as e:
             logger.error(f"Failed to discover tools from API: {e}")
-            # Return empty list if API is unavailable
-            return []
+            return None
+    
+    def _update_discovery_cache(self, response: httpx.Response,
+                                entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Store a discovery response, or extend the cached entry on 304 Not Modified"""
+        if response.status_code == 304 and entry is not None:
+            logger.info("Tool discovery unchanged since last fetch")
+            return self.discovery_cache.revalidated(entry)
+        response.raise_for_status()
+        tools = response.json().get("tools", [])
+        logger.info(f"Discovered {len(tools)} tools from API")
+        return self.discovery_cache.store(tools, response.headers.get("ETag"))
     
     def execute_tool(self, tool_name: str, hosted_by: str, input_data: Dict[str, Any], 
-                    config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Execute a tool via the API"""
+                    config: Optional[Dict[str, Any]] = None, defer: bool = True) -> Dict[str, Any]:
+        """Execute a tool via the API; with an outbox, defer=False disables queueing for this call"""
+        result = self._execute_tool(tool_name, hosted_by, input_data, config)
+        if defer:
+            result = self._defer(result, tool_name, hosted_by, input_data, config)
+        return result
+    
+    def _defer(self, result: Dict[str, Any], tool_name: str, hosted_by: str, input_data: Dict[str, Any],
+               config: Optional[Dict[str, Any]], file_path: Optional[str] = None,
+               file_param: str = "file") -> Dict[str, Any]:
+        """
+        Queue a call the API did not take in the outbox. While a drainer is running
+        the caller waits for the replayed result, up to the run deadline.
+        """
+        if self.outbox is None or not is_unavailable(result):
+            return result
+        entry_id = self.outbox.enqueue(tool_name, hosted_by, input_data, config, file_path, file_param)
+        if self.outbox.draining:
+            delivered = self.outbox.wait(entry_id)
+            if delivered is not None:
+                return delivered
+        return {
+            "success": False,
+            "error": f"{result.get('error')}; queued as outbox entry {entry_id}",
+            "queued": True,
+            "outbox_id": entry_id
+        }
+    
+    def _execute_tool(self, tool_name: str, hosted_by: str, input_data: Dict[str, Any],
+                      config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         try:
             logger.info(f"Executing tool {tool_name} via API")
             
@@ -61,46 +308,687 @@ class ToolRegistryClient:
                 "config": config
             }
             
-            # Make API call
-            with httpx.Client(timeout=60.0) as client:  # Reduced timeout for faster response
-                response = client.post(
+            check_deadline()
+            
+            # Make API call over the pooled connection, compressed if the API accepts it
+            policy = policy_for_tool(tool_name, config, self.tool_retry_policies, self.retry_policy)
+            send = lambda: policy.call(lambda: self._send(
+                tool_name,
+                f"{self.api_base}/tools/execute",
+                payload,
+                config,
+                headers={"X-API-Key": self.api_key}
+            ), label=tool_name)
+            hedge = hedge_policy_for_tool(tool_name, config, self.tool_hedge_policies,
+                                          self.hedge_policy, policy.idempotent)
+            # Fail fast instead of waiting out the timeout while the endpoint is unhealthy
+            breaker = BREAKERS.get(self.api_base, tool_name, config)
+            if breaker is not None and not breaker.allow():
+                logger.warning(f"Circuit open for tool {tool_name}, not calling the API")
+                return breaker.rejection()
+            with guard(breaker) as outcome:
+                response = hedged_call(send, tool_name, hedge) if hedge else send()
+                outcome.status_code = response.status_code
+            METRICS.payload_bytes.inc(len(response.request.content), tool=tool_name, direction="sent")
+            METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool=tool_name, direction="received")
+            response.raise_for_status()
+            
+            result = decode_response(response)
+            logger.info(f"Tool {tool_name} executed successfully via API")
+            return result
+                
+        except Exception as e:
+            return tool_error(tool_name, e)
+    
+    def execute_tool_stream(self, tool_name: str, hosted_by: str, input_data: Dict[str, Any],
+                            config: Optional[Dict[str, Any]] = None,
+                            stream_fields: Sequence[str] = DEFAULT_STREAM_FIELDS,
+                            chunk_size: int = 64 * 1024) -> StreamedToolResult:
+        """
+        Execute a tool via the API and decode the response incrementally.
+        
+        List fields named in stream_fields (e.g. SQLExecutor "results") are exposed as
+        iterators that decode rows while the body is still downloading:
+        
+            with client.execute_tool_stream("SQLExecutor", "mcp", params) as result:
+                for row in result.iter_field("results"):
+                    ...
+                summary = result.result()
+        """
+        response = None
+        try:
+            logger.info(f"Executing tool {tool_name} via API (streaming)")
+            payload = {
+                "tool_name": tool_name,
+                "hosted_by": hosted_by,
+                "input_data": input_data,
+                "config": config
+            }
+            check_deadline()
+            policy = policy_for_tool(tool_name, config, self.tool_retry_policies, self.retry_policy)
+            breaker = BREAKERS.get(self.api_base, tool_name, config)
+            if breaker is not None and not breaker.allow():
+                logger.warning(f"Circuit open for tool {tool_name}, not calling the API")
+                return StreamedToolResult.from_result(breaker.rejection())
+            # Time to response headers; the body is consumed by the caller
+            with guard(breaker) as outcome:
+                response = policy.call(lambda: self._send(
+                    tool_name,
                     f"{self.api_base}/tools/execute",
+                    payload,
+                    config,
+                    # The incremental decoder reads JSON only
+                    headers={"X-API-Key": self.api_key, "Accept": JSON_CONTENT_TYPE},
+                    stream=True
+                ), label=tool_name)
+                outcome.status_code = response.status_code
+            METRICS.payload_bytes.inc(len(response.request.content), tool=tool_name, direction="sent")
+            if response.status_code >= 400:
+                response.read()
+                response.close()
+                response.raise_for_status()
+            
+            def counted_chunks():
+                yield from response.iter_bytes(chunk_size)
+                METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool=tool_name, direction="received")
+            
+            return StreamedToolResult(counted_chunks(), stream_fields, close=response.close)
+            
+        except Exception as e:
+            if response is not None:
+                response.close()
+            return StreamedToolResult.from_result(tool_error(tool_name, e))
+    
+    def execute_tools_batch(self, invocations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Execute several tools in a single POST /tools/execute_batch round trip.
+        
+        Args:
+            invocations: Dicts with tool_name, hosted_by, input_data and optional config
+            
+        Returns:
+            One result per invocation, in the same order; each succeeds or fails on its own
+        """
+        if not invocations:
+            return []
+        results: List[Optional[Dict[str, Any]]] = [None] * len(invocations)
+        try:
+            logger.info(f"Executing batch of {len(invocations)} tool(s) via API")
+            policy = _batch_policy(invocations, self.tool_retry_policies, self.retry_policy)
+            
+            # Items whose circuit is open fail fast; the rest share one round trip
+            with ExitStack() as guards:
+                admitted, outcomes = _admit_batch(self.api_base, invocations, guards, results)
+                if not admitted:
+                    return results
+                payload = {"invocations": [_invocation_payload(invocations[index]) for index in admitted]}
+                response = policy.call(lambda: self._send(
+                    "batch",
+                    f"{self.api_base}/tools/execute_batch",
+                    payload,
+                    headers={"X-API-Key": self.api_key}
+                ), label="batch")
+                for outcome in outcomes:
+                    outcome.status_code = response.status_code
+            METRICS.payload_bytes.inc(len(response.request.content), tool="batch", direction="sent")
+            METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool="batch", direction="received")
+            
+            if response.status_code in (404, 405):
+                # Older API without batch support - fall back to one call per tool
+                logger.info("Batch endpoint not available, executing tools one by one")
+                for index in admitted:
+                    item = invocations[index]
+                    results[index] = self.execute_tool(item["tool_name"], item.get("hosted_by", "memra"),
+                                                       item.get("input_data", {}), item.get("config"))
+                return results
+            response.raise_for_status()
+            for index, result in zip(admitted, _batch_results(decode_response(response), len(admitted))):
+                results[index] = result
+            return results
+            
+        except Exception as e:
+            error = tool_error("batch", e)
+            return [result or dict(error) for result in results]
+    
+    def upload_file(self, path: str, content_type: Optional[str] = None, filename: Optional[str] = None,
+                    mode: str = "auto", chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                    resumable_threshold: int = DEFAULT_RESUMABLE_THRESHOLD,
+                    timeout: float = 60.0, dedup: bool = True) -> Dict[str, Any]:
+        """
+        Upload a file for server-side tools, streaming it instead of base64-encoding it in JSON.
+        
+        Args:
+            path: Local file to upload
+            content_type: MIME type, guessed from the file name when omitted
+            filename: Name reported to the server, defaults to the file's base name
+            mode: "raw" streams the file as the request body, "multipart" as a form field,
+                "resumable" in Content-Range chunks that survive dropped connections;
+                "auto" uses resumable for files of at least resumable_threshold bytes, else raw
+            chunk_size: Bytes per request in resumable mode
+            timeout: Per-request timeout in seconds
+            dedup: Reuse an earlier upload of the same bytes (by sha256) while it has not expired
+            
+        Returns:
+            Result dict whose data has remote_path, file_id and expires_at, plus
+            deduplicated=True when nothing was sent. APIs without the streaming
+            endpoints get the legacy base64 upload.
+        """
+        content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        filename = filename or os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+            if mode == "auto":
+                mode = "resumable" if size >= resumable_threshold else "raw"
+            if mode not in ("raw", "multipart", "resumable"):
+                raise ValueError(f"Unknown upload mode: {mode}")
+            methods = [mode] + (["raw"] if mode == "resumable" else []) + ["base64"]
+            
+            digest = file_digest(path) if dedup else None
+            if digest:
+                existing = self._find_upload(digest, timeout)
+                if existing is not None:
+                    logger.info(f"{filename} already uploaded as {existing['remote_path']}, skipping upload")
+                    return {"success": True, "data": existing}
+            
+            logger.info(f"Uploading {filename} ({size} bytes) via API")
+            for method in methods:
+                try:
+                    if method == "resumable":
+                        result = self._upload_resumable(path, filename, content_type, size, chunk_size, timeout)
+                    elif method == "raw":
+                        result = self._upload_raw(path, filename, content_type, size, timeout)
+                    elif method == "multipart":
+                        result = self._upload_multipart(path, filename, content_type, timeout)
+                    else:
+                        result = self._upload_base64(path, filename, content_type, timeout)
+                    METRICS.payload_bytes.inc(size, tool="upload", direction="sent")
+                    if digest and result.get("success"):
+                        self.upload_cache.store(digest, dict(result.get("data") or {}, sha256=digest))
+                    return result
+                except _UploadNotSupported:
+                    logger.info(f"API does not support {method} uploads, falling back")
+            
+        except Exception as e:
+            return tool_error("upload", e)
+    
+    def _find_upload(self, digest: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Upload data for bytes the API already holds: local cache first, then HEAD by digest"""
+        data = self.upload_cache.get(digest)
+        if data is not None:
+            METRICS.cache_hits.inc(cache="upload")
+            return dict(data, deduplicated=True)
+        METRICS.cache_misses.inc(cache="upload")
+        
+        try:
+            response = self.http_client.head(
+                f"{self.api_base}/upload/digests/{digest}",
+                headers={"X-API-Key": self.api_key},
+                timeout=request_timeout(timeout)
+            )
+        except httpx.TransportError as e:
+            logger.debug(f"Digest lookup failed, uploading: {e}")
+            return None
+        # 404 covers both unknown digests and APIs without the endpoint
+        if response.status_code != 200 or not response.headers.get("X-Remote-Path"):
+            return None
+        
+        data = {
+            "remote_path": response.headers["X-Remote-Path"],
+            "file_id": response.headers.get("X-File-Id"),
+            "expires_at": response.headers.get("X-Expires-At"),
+            "sha256": digest
+        }
+        if not self.upload_cache.store(digest, data):
+            # Expires too soon to rely on; upload a fresh copy
+            return None
+        return dict(data, deduplicated=True)
+    
+    def _upload_response(self, response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code in (404, 405):
+            raise _UploadNotSupported()
+        response.raise_for_status()
+        return decode_response(response)
+    
+    def _upload_raw(self, path: str, filename: str, content_type: str, size: int,
+                    timeout: float) -> Dict[str, Any]:
+        # Each attempt re-reads the file from the start
+        response = self.tool_retry_policies.get("upload", self.retry_policy).call(lambda: self.http_client.post(
+            f"{self.api_base}/upload/raw",
+            params={"filename": filename},
+            headers={
+                "X-API-Key": self.api_key,
+                "Content-Type": content_type,
+                "Content-Length": str(size)
+            },
+            content=_iter_file(path),
+            timeout=request_timeout(timeout)
+        ), label="upload")
+        return self._upload_response(response)
+    
+    def _upload_multipart(self, path: str, filename: str, content_type: str,
+                          timeout: float) -> Dict[str, Any]:
+        # httpx reads file fields in chunks, so the body is never built in memory
+        def send() -> httpx.Response:
+            with open(path, "rb") as f:
+                return self.http_client.post(
+                    f"{self.api_base}/upload/multipart",
+                    headers={"X-API-Key": self.api_key},
+                    files={"file": (filename, f, content_type)},
+                    timeout=request_timeout(timeout)
+                )
+        response = self.tool_retry_policies.get("upload", self.retry_policy).call(send, label="upload")
+        return self._upload_response(response)
+    
+    def _upload_base64(self, path: str, filename: str, content_type: str,
+                       timeout: float) -> Dict[str, Any]:
+        """Legacy JSON upload for APIs without the streaming endpoints (holds the file in memory)"""
+        with open(path, "rb") as f:
+            content = base64.b64encode(f.read()).decode("utf-8")
+        response = self.tool_retry_policies.get("upload", self.retry_policy).call(lambda: self.http_client.post(
+            f"{self.api_base}/upload",
+            headers={"X-API-Key": self.api_key},
+            json={"filename": filename, "content": content, "content_type": content_type},
+            timeout=request_timeout(timeout)
+        ), label="upload")
+        response.raise_for_status()
+        return decode_response(response)
+    
+    def _upload_resumable(self, path: str, filename: str, content_type: str, size: int,
+                          chunk_size: int, timeout: float) -> Dict[str, Any]:
+        key = (os.path.abspath(path), size, os.path.getmtime(path))
+        headers = {"X-API-Key": self.api_key}
+        upload_id = self._upload_sessions.get(key)
+        offset = self._upload_offset(upload_id, timeout) if upload_id else None
+        
+        if offset is None:
+            response = self.tool_retry_policies.get("upload", self.retry_policy).call(lambda: self.http_client.post(
+                f"{self.api_base}/upload/sessions",
+                headers=headers,
+                json={"filename": filename, "content_type": content_type, "size": size},
+                timeout=request_timeout(timeout)
+            ), label="upload")
+            upload_id = self._upload_response(response)["data"]["upload_id"]
+            self._upload_sessions[key] = upload_id
+            offset = 0
+        else:
+            logger.info(f"Resuming upload of {filename} at byte {offset}")
+        
+        # Lost chunks and offset disagreements alike; reset by every chunk the server accepts
+        failures = 0
+        while True:
+            check_deadline()
+            end = min(offset + chunk_size, size)
+            try:
+                response = self.http_client.put(
+                    f"{self.api_base}/upload/sessions/{upload_id}",
                     headers={
-                        "X-API-Key": self.api_key,
-                        "Content-Type": "application/json"
+                        **headers,
+                        "Content-Type": "application/octet-stream",
+                        "Content-Range": f"bytes {offset}-{end - 1}/{size}",
+                        "Content-Length": str(end - offset)
                     },
-                    json=payload
+                    content=_iter_file(path, offset, end),
+                    timeout=request_timeout(timeout)
                 )
+                if response.status_code == 409:
+                    # Server holds a different offset, e.g. after a chunk we thought was lost
+                    failures += 1
+                    if failures > UPLOAD_CHUNK_RETRIES:
+                        logger.error(f"Upload of {filename} still disagrees on the offset after {failures} attempts")
+                        response.raise_for_status()
+                    offset = decode_response(response)["data"]["offset"]
+                    continue
                 response.raise_for_status()
-                
-                result = response.json()
-                logger.info(f"Tool {tool_name} executed successfully via API")
-                return result
-                
-        except httpx.TimeoutException:
-            logger.error(f"Tool {tool_name} execution timed out")
-            return {
-                "success": False,
-                "error": f"Tool execution timed out after 60 seconds"
-            }
-        except httpx.HTTPStatusError as e:
-            logger.error(f"API error for tool {tool_name}: {e.response.status_code}")
-            return {
-                "success": False,
-                "error": f"API error: {e.response.status_code} - {e.response.text}"
-            }
-        except Exception as e:
-            logger.error(f"Tool execution failed for {tool_name}: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+                body = decode_response(response)
+                if body.get("data", {}).get("remote_path"):
+                    self._upload_sessions.pop(key, None)
+                    return body
+                offset = body["data"]["offset"]
+                failures = 0
+            except httpx.TransportError as e:
+                failures += 1
+                if failures > UPLOAD_CHUNK_RETRIES:
+                    raise
+                logger.warning(f"Upload chunk at byte {offset} failed ({e}), resuming")
+                METRICS.retries.inc(tool="upload")
+                time.sleep(self.retry_policy.backoff(failures))
+                offset = self._upload_offset(upload_id, timeout)
+                if offset is None:
+                    raise
     
+    def _upload_offset(self, upload_id: str, timeout: float) -> Optional[int]:
+        """Bytes the server has stored for an upload session, or None if it is gone"""
+        try:
+            response = self.http_client.get(
+                f"{self.api_base}/upload/sessions/{upload_id}",
+                headers={"X-API-Key": self.api_key},
+                timeout=request_timeout(timeout)
+            )
+            if response.status_code != 200:
+                return None
+            return decode_response(response)["data"]["offset"]
+        except httpx.TransportError:
+            return None
+
+    def execute_tool_with_file(self, tool_name: str, hosted_by: str, path: str,
+                               input_data: Optional[Dict[str, Any]] = None,
+                               config: Optional[Dict[str, Any]] = None, file_param: str = "file",
+                               content_type: Optional[str] = None, filename: Optional[str] = None,
+                               timeout: float = 60.0, defer: bool = True) -> Dict[str, Any]:
+        """
+        Upload a file and execute a tool on it in one multipart POST /tools/execute_with_file,
+        instead of POST /upload followed by POST /tools/execute with the remote path.
+
+        The tool request travels as a JSON "request" part ahead of the streamed "file"
+        part; the server passes the file to the tool as input_data[file_param] without
+        staging it for later calls. APIs without the endpoint get upload_file() and
+        execute_tool(), so callers need not check what the server supports.
+        With an outbox the call is queued, file path included, while the API is unavailable.
+        """
+        result = self._execute_tool_with_file(tool_name, hosted_by, path, input_data, config,
+                                              file_param, content_type, filename, timeout)
+        if defer:
+            result = self._defer(result, tool_name, hosted_by, input_data or {}, config, path, file_param)
+        return result
+
+    def _execute_tool_with_file(self, tool_name: str, hosted_by: str, path: str,
+                                input_data: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]],
+                                file_param: str, content_type: Optional[str], filename: Optional[str],
+                                timeout: float) -> Dict[str, Any]:
+        content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        filename = filename or os.path.basename(path)
+        payload = {
+            "tool_name": tool_name,
+            "hosted_by": hosted_by,
+            "input_data": input_data or {},
+            "config": config,
+            "file_param": file_param
+        }
+        if not self._execute_with_file_supported:
+            return self._upload_then_execute(tool_name, hosted_by, path, input_data, config,
+                                             file_param, content_type, filename, timeout)
+        try:
+            logger.info(f"Executing tool {tool_name} on {filename} via API")
+            check_deadline()
+
+            # Each attempt reopens the file; httpx streams it in chunks
+            def post() -> httpx.Response:
+                with open(path, "rb") as f:
+                    return self.http_client.post(
+                        f"{self.api_base}/tools/execute_with_file",
+                        headers={"X-API-Key": self.api_key, "Accept": accept_header()},
+                        files={
+                            "request": (None, JSON.dumps(payload), JSON_CONTENT_TYPE),
+                            "file": (filename, f, content_type)
+                        },
+                        timeout=request_timeout(timeout)
+                    )
+
+            def send() -> httpx.Response:
+                record_wait(throttle(self.api_key, self.api_base, tool_name, self.rate_limit, config))
+                if self.concurrency_limiter is None:
+                    return post()
+                with self.concurrency_limiter.slot(tool_name) as slot:
+                    response = post()
+                    slot.record(response.status_code)
+                    return response
+
+            # Not hedged: a duplicate would send the whole file again
+            policy = policy_for_tool(tool_name, config, self.tool_retry_policies, self.retry_policy)
+            breaker = BREAKERS.get(self.api_base, tool_name, config)
+            if breaker is not None and not breaker.allow():
+                logger.warning(f"Circuit open for tool {tool_name}, not calling the API")
+                return breaker.rejection()
+            with guard(breaker) as outcome:
+                response = policy.call(send, label=tool_name)
+                outcome.status_code = response.status_code
+
+            if response.status_code in (404, 405):
+                logger.info("API does not support combined upload and execute, uploading first")
+                self._execute_with_file_supported = False
+                return self._upload_then_execute(tool_name, hosted_by, path, input_data, config,
+                                                 file_param, content_type, filename, timeout)
+            METRICS.payload_bytes.inc(os.path.getsize(path), tool=tool_name, direction="sent")
+            METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool=tool_name, direction="received")
+            response.raise_for_status()
+
+            result = decode_response(response)
+            logger.info(f"Tool {tool_name} executed successfully via API")
+            return result
+
+        except Exception as e:
+            return tool_error(tool_name, e)
+
+    def _upload_then_execute(self, tool_name: str, hosted_by: str, path: str,
+                             input_data: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]],
+                             file_param: str, content_type: str, filename: str,
+                             timeout: float) -> Dict[str, Any]:
+        """Two-request fallback for execute_tool_with_file()"""
+        uploaded = self.upload_file(path, content_type, filename, timeout=timeout)
+        if not uploaded.get("success"):
+            return uploaded
+        result = self._execute_tool(tool_name, hosted_by,
+                                    {**(input_data or {}), file_param: uploaded["data"]["remote_path"]}, config)
+        if uploaded["data"].get("deduplicated") and result.get("status_code") in UPLOAD_GONE_STATUSES:
+            # The API dropped the earlier upload before its expires_at; send the file again, once
+            logger.info(f"{uploaded['data']['remote_path']} is gone, uploading {filename} again")
+            digest = uploaded["data"]["sha256"]
+            self.upload_cache.invalidate(digest)
+            uploaded = self.upload_file(path, content_type, filename, timeout=timeout, dedup=False)
+            if not uploaded.get("success"):
+                return uploaded
+            self.upload_cache.store(digest, dict(uploaded["data"], sha256=digest))
+            result = self._execute_tool(tool_name, hosted_by,
+                                        {**(input_data or {}), file_param: uploaded["data"]["remote_path"]}, config)
+        return result
+
     def health_check(self) -> bool:
         """Check if the API is available"""
         try:
-            with httpx.Client(timeout=10.0) as client:
-                response = client.get(f"{self.api_base}/health")
-                return response.status_code == 200
+            response = self.http_client.get(f"{self.api_base}/health", timeout=10.0)
+            return response.status_code == 200
         except:
-            return False 
\ No newline at end of file
+            return False
+
+class AsyncToolRegistryClient:
+    """Asyncio counterpart of ToolRegistryClient built on httpx.AsyncClient"""
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None,
+                 max_concurrency_per_host: int = DEFAULT_MAX_CONNECTIONS,
+                 discovery_ttl: float = DEFAULT_DISCOVERY_TTL,
+                 api_base: Optional[str] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 tool_retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 tool_hedge_policies: Optional[Dict[str, HedgePolicy]] = None,
+                 rate_limit: Optional[Any] = None,
+                 adaptive_concurrency: Optional[bool] = None):
+        self.api_base = api_base or os.getenv("MEMRA_API_URL", "https://api.memra.co")
+        self.api_key = os.getenv("MEMRA_API_KEY")
+        self.tools_cache = None
+        self.discovery_cache = DiscoveryCache(self.api_base, ttl=discovery_ttl, api_key=self.api_key)
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.tool_retry_policies = tool_retry_policies or {}
+        self.hedge_policy = hedge_policy
+        self.tool_hedge_policies = tool_hedge_policies or {}
+        self.rate_limit = Rate.parse(rate_limit if rate_limit is not None else os.getenv("MEMRA_RATE_LIMIT"))
+        if adaptive_concurrency is None:
+            adaptive_concurrency = ADAPTIVE_CONCURRENCY_ENABLED
+        self.concurrency_limiter: Optional[AdaptiveLimiter] = LIMITERS.get(self.api_base) if adaptive_concurrency else None
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self._http_client = http_client
+        self._semaphores: Dict[Tuple[int, str], "asyncio.Semaphore"] = {}
+        
+        if not self.api_key:
+            raise ValueError(
+                "MEMRA_API_KEY environment variable is required. "
+                "Please contact info@memra.co for an API key."
+            )
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Injected client, or the pooled client of the running event loop"""
+        return self._http_client or get_shared_async_client()
+    
+    async def _asend(self, tool_name: str, url: str, payload: Any, config: Optional[Dict[str, Any]] = None,
+                     timeout: float = 60.0, **kwargs) -> httpx.Response:
+        """Async counterpart of ToolRegistryClient._send()"""
+        record_wait(await athrottle(self.api_key, self.api_base, tool_name, self.rate_limit, config))
+        kwargs["timeout"] = request_timeout(timeout)
+        if self.concurrency_limiter is None:
+            return await asend_json(self.http_client, url, payload, **kwargs)
+        async with self.concurrency_limiter.aslot(tool_name) as slot:
+            response = await asend_json(self.http_client, url, payload, **kwargs)
+            slot.record(response.status_code)
+            return response
+    
+    def _host_semaphore(self) -> "asyncio.Semaphore":
+        """Per-host limit so thousands of coroutines queue here instead of timing out in the pool"""
+        import asyncio
+        key = (id(asyncio.get_running_loop()), httpx.URL(self.api_base).host)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency_per_host)
+            self._semaphores[key] = semaphore
+        return semaphore
+    
+    async def discover_tools(self, hosted_by: Optional[str] = None,
+                             force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """Discover available tools from the API, served from the discovery cache while fresh"""
+        entry = self.discovery_cache.get()
+        if not force_refresh and self.discovery_cache.is_fresh(entry):
+            METRICS.cache_hits.inc(cache="discovery")
+            tools = entry["tools"]
+        else:
+            METRICS.cache_misses.inc(cache="discovery")
+            headers = {"X-API-Key": self.api_key}
+            if entry and entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            try:
+                async with self._host_semaphore():
+                    response = await self.retry_policy.acall(lambda: self.http_client.get(
+                        f"{self.api_base}/tools/discover",
+                        headers=headers,
+                        timeout=request_timeout(30.0)
+                    ), label="discovery")
+                if response.status_code == 304 and entry is not None:
+                    entry = self.discovery_cache.revalidated(entry)
+                else:
+                    response.raise_for_status()
+                    entry = self.discovery_cache.store(response.json().get("tools", []),
+                                                       response.headers.get("ETag"))
+                tools = entry["tools"]
+                logger.info(f"Discovered {len(tools)} tools from API")
+            except Exception as e:
+                logger.error(f"Failed to discover tools from API: {e}")
+                return []
+        
+        self.tools_cache = tools
+        if hosted_by:
+            tools = [t for t in tools if t.get("hosted_by") == hosted_by]
+        return tools
+    
+    async def execute_tool(self, tool_name: str, hosted_by: str, input_data: Dict[str, Any],
+                           config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute a tool via the API"""
+        try:
+            logger.info(f"Executing tool {tool_name} via API")
+            
+            payload = {
+                "tool_name": tool_name,
+                "hosted_by": hosted_by,
+                "input_data": input_data,
+                "config": config
+            }
+            
+            check_deadline()
+            
+            policy = policy_for_tool(tool_name, config, self.tool_retry_policies, self.retry_policy)
+            send = lambda: policy.acall(lambda: self._asend(
+                tool_name,
+                f"{self.api_base}/tools/execute",
+                payload,
+                config,
+                headers={"X-API-Key": self.api_key}
+            ), label=tool_name)
+            hedge = hedge_policy_for_tool(tool_name, config, self.tool_hedge_policies,
+                                          self.hedge_policy, policy.idempotent)
+            breaker = BREAKERS.get(self.api_base, tool_name, config)
+            async with self._host_semaphore():
+                # Checked once a slot is free, so a probe is not held while queueing
+                if breaker is not None and not breaker.allow():
+                    logger.warning(f"Circuit open for tool {tool_name}, not calling the API")
+                    return breaker.rejection()
+                with guard(breaker) as outcome:
+                    response = await (ahedged_call(send, tool_name, hedge) if hedge else send())
+                    outcome.status_code = response.status_code
+            METRICS.payload_bytes.inc(len(response.request.content), tool=tool_name, direction="sent")
+            METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool=tool_name, direction="received")
+            response.raise_for_status()
+            
+            result = decode_response(response)
+            logger.info(f"Tool {tool_name} executed successfully via API")
+            return result
+            
+        except Exception as e:
+            return tool_error(tool_name, e)
+    
+    async def execute_tools_batch(self, invocations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute several tools in a single POST /tools/execute_batch round trip"""
+        if not invocations:
+            return []
+        results: List[Optional[Dict[str, Any]]] = [None] * len(invocations)
+        try:
+            logger.info(f"Executing batch of {len(invocations)} tool(s) via API")
+            policy = _batch_policy(invocations, self.tool_retry_policies, self.retry_policy)
+            async with self._host_semaphore():
+                with ExitStack() as guards:
+                    admitted, outcomes = _admit_batch(self.api_base, invocations, guards, results)
+                    if not admitted:
+                        return results
+                    payload = {"invocations": [_invocation_payload(invocations[index]) for index in admitted]}
+                    response = await policy.acall(lambda: self._asend(
+                        "batch",
+                        f"{self.api_base}/tools/execute_batch",
+                        payload,
+                        headers={"X-API-Key": self.api_key}
+                    ), label="batch")
+                    for outcome in outcomes:
+                        outcome.status_code = response.status_code
+            METRICS.payload_bytes.inc(len(response.request.content), tool="batch", direction="sent")
+            METRICS.payload_bytes.inc(response.num_bytes_downloaded, tool="batch", direction="received")
+            
+            if response.status_code in (404, 405):
+                logger.info("Batch endpoint not available, executing tools concurrently")
+                import asyncio
+                fallback = await asyncio.gather(*[
+                    self.execute_tool(invocations[index]["tool_name"],
+                                      invocations[index].get("hosted_by", "memra"),
+                                      invocations[index].get("input_data", {}), invocations[index].get("config"))
+                    for index in admitted
+                ])
+                for index, result in zip(admitted, fallback):
+                    results[index] = result
+                return results
+            response.raise_for_status()
+            for index, result in zip(admitted, _batch_results(decode_response(response), len(admitted))):
+                results[index] = result
+            return results
+            
+        except Exception as e:
+            error = tool_error("batch", e)
+            return [result or dict(error) for result in results]
+    
+    async def health_check(self) -> bool:
+        """Check if the API is available"""
+        try:
+            async with self._host_semaphore():
+                response = await self.http_client.get(f"{self.api_base}/health", timeout=10.0)
+            return response.status_code == 200
+        except Exception:
+            return False
+    
+    async def aclose(self):
+        """Close an injected client; the shared pool is closed via aclose_shared_async_clients()"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
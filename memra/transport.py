@@ -0,0 +1,186 @@
+"""
+Shared HTTP transport for the Memra SDK clients
+One pooled keep-alive httpx.Client per configuration, reused across
+ToolRegistryClient and ExecutionEngine instances so tool calls skip TCP/TLS setup
+"""
+
+import os
+import atexit
+import logging
+import threading
+import weakref
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+import httpx
+
+if TYPE_CHECKING:
+    import asyncio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("MEMRA_HTTP_MAX_CONNECTIONS", "100"))
+DEFAULT_MAX_KEEPALIVE = int(os.getenv("MEMRA_HTTP_MAX_KEEPALIVE", "20"))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.getenv("MEMRA_HTTP_KEEPALIVE_EXPIRY", "30"))
+DEFAULT_MAX_CONNECTIONS_PER_HOST = int(os.getenv("MEMRA_HTTP_MAX_CONNECTIONS_PER_HOST", "0")) or None
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install memra[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _host_key(url: httpx.URL) -> str:
+    return f"{url.scheme}://{url.host}:{url.port or ''}"
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body wrapper that frees the host slot once the body is closed"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+class HostLimitedTransport(httpx.BaseTransport):
+    """Caps concurrent requests per host on top of the pool-wide limits"""
+
+    def __init__(self, transport: httpx.BaseTransport, max_connections_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_connections_per_host
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, url: httpx.URL) -> threading.BoundedSemaphore:
+        key = _host_key(url)
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self._max_per_host)
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphore(request.url)
+        semaphore.acquire()
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, semaphore.release),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self._transport.close()
+
+_shared_clients: Dict[Tuple, httpx.Client] = {}
+_shared_lock = threading.Lock()
+
+def get_shared_client(max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                      max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE,
+                      keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                      max_connections_per_host: Optional[int] = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                      http2: Optional[bool] = None,
+                      timeout: float = 60.0) -> httpx.Client:
+    """
+    Return the process-wide pooled client for this configuration, creating it on first use.
+
+    Args:
+        max_connections: Pool-wide connection limit
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection is kept
+        max_connections_per_host: Concurrent requests allowed per host (None for no cap)
+        http2: Negotiate HTTP/2; defaults to on when h2 is installed
+        timeout: Default request timeout, callers may override per request
+    """
+    if http2 is None:
+        http2 = os.getenv("MEMRA_HTTP2", "1").lower() not in ("0", "false", "no") and http2_available()
+    key = (max_connections, max_keepalive_connections, keepalive_expiry, max_connections_per_host, http2, timeout)
+
+    with _shared_lock:
+        client = _shared_clients.get(key)
+        if client is not None and not client.is_closed:
+            return client
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        transport: httpx.BaseTransport = httpx.HTTPTransport(limits=limits, http2=http2)
+        if max_connections_per_host:
+            transport = HostLimitedTransport(transport, max_connections_per_host)
+
+        client = httpx.Client(transport=transport, timeout=timeout)
+        _shared_clients[key] = client
+        logger.info(f"Created shared HTTP client (max_connections={max_connections}, "
+                    f"per_host={max_connections_per_host}, http2={http2})")
+        return client
+
+_shared_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, httpx.AsyncClient]]" = \
+    weakref.WeakKeyDictionary()
+
+def get_shared_async_client(max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                            max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE,
+                            keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                            http2: Optional[bool] = None,
+                            timeout: float = 60.0) -> httpx.AsyncClient:
+    """
+    Return the pooled httpx.AsyncClient for the running event loop.
+
+    Async clients are bound to the loop they were created on, so there is one
+    pool per loop rather than one per process. Must be called from a coroutine.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    if http2 is None:
+        http2 = os.getenv("MEMRA_HTTP2", "1").lower() not in ("0", "false", "no") and http2_available()
+    key = (max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout)
+
+    clients = _shared_async_clients.setdefault(loop, {})
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        client = httpx.AsyncClient(limits=limits, http2=http2, timeout=timeout)
+        clients[key] = client
+        logger.info(f"Created shared async HTTP client (max_connections={max_connections}, http2={http2})")
+    return client
+
+async def aclose_shared_async_clients():
+    """Close the pooled async clients of the running event loop"""
+    import asyncio
+    clients = _shared_async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+def close_shared_clients():
+    """Close every pooled client; they are recreated on next use"""
+    with _shared_lock:
+        for client in _shared_clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug(f"Error closing shared HTTP client: {e}")
+        _shared_clients.clear()
+
+atexit.register(close_shared_clients)
@@ -0,0 +1,139 @@
+"""
+Content-addressed cache of uploaded files
+Maps a file's sha256 to the remote_path the API stored it under, until the
+server's expires_at, so retries and reruns do not upload the same bytes again
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from .discovery_cache import cache_key, default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Entries this close to expiry are not reused; the tool call that follows needs the file too
+EXPIRY_MARGIN_SECONDS = float(os.getenv("MEMRA_UPLOAD_EXPIRY_MARGIN", "300"))
+
+_DIGEST_READ_SIZE = 1024 * 1024
+
+# Digests of files already hashed in this process, keyed by (path, size, mtime_ns)
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path: str) -> str:
+    """sha256 hex digest of a file, read in chunks and memoized until the file changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_DIGEST_READ_SIZE), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with _digest_lock:
+            _digest_memo[key] = digest
+    return digest
+
+def parse_expires_at(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds for an ISO-8601 expires_at; naive timestamps are UTC"""
+    if not value:
+        return None
+    try:
+        expires = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        logger.debug(f"Unparseable expires_at: {value}")
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp()
+
+# Entries shared by every client in the process, keyed by cache_key()
+_memory_cache: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_memory_lock = threading.Lock()
+
+class UploadCache:
+    """digest -> upload data (remote_path, file_id, expires_at) for one API base URL and API key"""
+
+    def __init__(self, api_base: str, cache_dir: Optional[Path] = None, persist: bool = True,
+                 api_key: Optional[str] = None):
+        self.api_base = api_base
+        self.persist = persist
+        # Uploads belong to the key that made them; another key cannot use the remote_path
+        self.key = cache_key(api_base, api_key)
+        self.path = (cache_dir or default_cache_dir()) / f"uploads-{self.key}.json"
+
+    def _entries(self) -> Dict[str, Dict[str, Any]]:
+        with _memory_lock:
+            entries = _memory_cache.get(self.key)
+            if entries is None:
+                entries = self._load() if self.persist else {}
+                _memory_cache[self.key] = entries
+            return entries
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Upload data for a digest if it is still valid"""
+        entry = self._entries().get(digest)
+        if entry is None:
+            return None
+        if not self._usable(entry):
+            self.invalidate(digest)
+            return None
+        return entry["data"]
+
+    def store(self, digest: str, data: Dict[str, Any]) -> bool:
+        """Remember an upload; False if it has no usable expires_at and was not cached"""
+        entry = {"data": data, "expires": parse_expires_at(data.get("expires_at"))}
+        if not data.get("remote_path") or not self._usable(entry):
+            return False
+        entries = self._entries()
+        with _memory_lock:
+            entries[digest] = entry
+        if self.persist:
+            self._save(entries)
+        return True
+
+    def invalidate(self, digest: str):
+        """Drop a digest, e.g. after the server reported its file missing"""
+        entries = self._entries()
+        with _memory_lock:
+            removed = entries.pop(digest, None)
+        if removed is not None and self.persist:
+            self._save(entries)
+
+    def _usable(self, entry: Dict[str, Any]) -> bool:
+        return entry["expires"] is not None and entry["expires"] - time.time() > EXPIRY_MARGIN_SECONDS
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            if stored.get("api_base") != self.api_base:
+                return {}
+            return {digest: entry for digest, entry in stored["entries"].items() if self._usable(entry)}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable upload cache {self.path}: {e}")
+            return {}
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]):
+        with _memory_lock:
+            live = {digest: entry for digest, entry in entries.items() if self._usable(entry)}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=".uploads-")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"api_base": self.api_base, "entries": live}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            # The on-disk copy is an optimisation only
+            logger.debug(f"Could not persist upload cache to {self.path}: {e}")
@@ -56,6 +56,21 @@ setup(
         "mcp": [
             "psycopg2-binary>=2.9.0",
         ],
+        "parquet": [
+            "pyarrow>=8.0.0",
+        ],
+        "http2": [
+            "h2>=3.0,<5.0",
+        ],
+        "zstd": [
+            "zstandard>=0.18.0",
+        ],
+        "orjson": [
+            "orjson>=3.6.0",
+        ],
+        "msgpack": [
+            "msgpack>=1.0.0",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -0,0 +1,57 @@
+"""
+Shared fixtures for the SDK's behavioural tests
+A controllable clock for the time-based state machines, and a rate-limit store in
+a temporary SQLite file instead of the user's cache directory
+"""
+
+import threading
+
+import pytest
+
+from memra import rate_limit
+
+class FakeClock:
+    """
+    Stands in for the time module of the modules under test: time() and monotonic()
+    only move when the test advances them or code under test calls sleep()
+    """
+
+    def __init__(self, monkeypatch, wall: float = 1_700_000_000.0, monotonic: float = 1_000.0):
+        self._monkeypatch = monkeypatch
+        self._wall = wall
+        self._monotonic = monotonic
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self._wall
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        self._wall += seconds
+        self._monotonic += seconds
+
+    def install(self, *modules):
+        """Replace the time module seen by each of modules with this clock"""
+        for module in modules:
+            self._monkeypatch.setattr(module, "time", self)
+        return self
+
+@pytest.fixture
+def clock(monkeypatch):
+    return FakeClock(monkeypatch)
+
+@pytest.fixture
+def rate_store(tmp_path, monkeypatch):
+    """The process-wide token bucket store, moved to a fresh file for one test"""
+    store = rate_limit.STORE
+    monkeypatch.setattr(store, "path", tmp_path / "ratelimit.sqlite")
+    monkeypatch.setattr(store, "_local", threading.local())
+    monkeypatch.setattr(store, "_fallback", {})
+    monkeypatch.setattr(store, "_failed", False)
+    return store
@@ -0,0 +1,87 @@
+"""
+Asyncio tool registry client
+Tool calls, discovery and health checks over an injected httpx.AsyncClient,
+and the per-host cap that queues coroutines before they reach the pool
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from memra import discovery_cache, tool_registry_client
+from memra.circuit_breaker import CircuitBreakerRegistry
+from memra.tool_registry_client import AsyncToolRegistryClient
+
+API = "http://api.test"
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "async-test-key")
+    monkeypatch.setenv("MEMRA_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    monkeypatch.setattr(discovery_cache, "_memory_cache", {})
+    monkeypatch.setattr(tool_registry_client, "BREAKERS", CircuitBreakerRegistry())
+
+def make_client(handler, **kwargs):
+    return AsyncToolRegistryClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                                   api_base=API, adaptive_concurrency=False, **kwargs)
+
+def test_execute_tool_sends_payload_with_api_key():
+    seen = []
+
+    def handler(request):
+        seen.append((request.headers["X-API-Key"], json.loads(request.content)))
+        return httpx.Response(200, json={"success": True, "data": {"is_valid": True}})
+
+    async def main():
+        client = make_client(handler)
+        try:
+            return await client.execute_tool("DataValidator", "memra", {"invoice_data": {}})
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == {"success": True, "data": {"is_valid": True}}
+    assert seen == [("async-test-key", {"tool_name": "DataValidator", "hosted_by": "memra",
+                                        "input_data": {"invoice_data": {}}, "config": None})]
+
+def test_failed_call_is_returned_as_error_result():
+    async def main():
+        client = make_client(lambda request: httpx.Response(400, text="bad input"))
+        return await client.execute_tool("DataValidator", "memra", {}, {"retry": {"max_attempts": 1}})
+
+    result = asyncio.run(main())
+    assert result["success"] is False and "400" in result["error"]
+
+def test_calls_beyond_the_host_cap_wait_for_a_slot():
+    in_flight, peak = [0], [0]
+
+    async def handler(request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return httpx.Response(200, json={"success": True})
+
+    async def main():
+        client = make_client(handler, max_concurrency_per_host=2)
+        return await asyncio.gather(*[client.execute_tool("DataValidator", "memra", {}) for _ in range(6)])
+
+    assert all(result["success"] for result in asyncio.run(main()))
+    assert peak[0] == 2
+
+def test_discovery_and_health_check():
+    def handler(request):
+        if request.url.path == "/health":
+            return httpx.Response(200)
+        return httpx.Response(200, json={"tools": [{"name": "SQLExecutor", "hosted_by": "mcp"},
+                                                   {"name": "PDFProcessor", "hosted_by": "memra"}]})
+
+    async def main():
+        client = make_client(handler)
+        return await client.discover_tools(hosted_by="mcp"), await client.health_check()
+
+    tools, healthy = asyncio.run(main())
+    assert tools == [{"name": "SQLExecutor", "hosted_by": "mcp"}]
+    assert healthy is True
@@ -0,0 +1,82 @@
+"""
+Batched tool execution
+One POST /tools/execute_batch for several tools, results kept in order, and
+the per-tool fallback for APIs without the batch endpoint, sync and async
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from memra import tool_registry_client
+from memra.circuit_breaker import CircuitBreakerRegistry
+from memra.tool_registry_client import AsyncToolRegistryClient, ToolRegistryClient
+
+API = "http://api.test"
+INVOCATIONS = [
+    {"tool_name": "DataValidator", "input_data": {"n": 1}},
+    {"tool_name": "SQLExecutor", "hosted_by": "mcp", "input_data": {"n": 2}},
+]
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "batch-test-key")
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    monkeypatch.setattr(tool_registry_client, "BREAKERS", CircuitBreakerRegistry())
+
+def batch_api(requests, batch_supported=True, results_returned=None):
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(request.url.path)
+        if request.url.path == "/tools/execute_batch":
+            if not batch_supported:
+                return httpx.Response(404)
+            results = [{"success": True, "data": item["input_data"]} for item in body["invocations"]]
+            return httpx.Response(200, json={"results": results[:results_returned]})
+        return httpx.Response(200, json={"success": True, "data": body["input_data"]})
+    return handler
+
+def sync_batch(handler, invocations=INVOCATIONS):
+    client = ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+                                api_base=API, adaptive_concurrency=False)
+    return client.execute_tools_batch(invocations)
+
+def async_batch(handler, invocations=INVOCATIONS):
+    async def main():
+        client = AsyncToolRegistryClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                                         api_base=API, adaptive_concurrency=False)
+        return await client.execute_tools_batch(invocations)
+    return asyncio.run(main())
+
+@pytest.fixture(params=[sync_batch, async_batch], ids=["sync", "async"])
+def run_batch(request):
+    return request.param
+
+def test_batch_is_one_round_trip_with_results_in_order(run_batch):
+    requests = []
+    results = run_batch(batch_api(requests))
+    assert requests == ["/tools/execute_batch"]
+    assert [result["data"] for result in results] == [{"n": 1}, {"n": 2}]
+
+def test_missing_results_are_reported_per_item(run_batch):
+    results = run_batch(batch_api([], results_returned=1))
+    assert results[0] == {"success": True, "data": {"n": 1}}
+    assert results[1] == {"success": False, "error": "No result returned for batch item"}
+
+def test_api_without_batch_endpoint_gets_one_call_per_tool(run_batch):
+    requests = []
+    results = run_batch(batch_api(requests, batch_supported=False))
+    assert requests == ["/tools/execute_batch", "/tools/execute", "/tools/execute"]
+    assert [result["data"] for result in results] == [{"n": 1}, {"n": 2}]
+
+def test_failed_batch_fails_every_item(run_batch):
+    invocations = [dict(item, config={"retry": {"max_attempts": 1}}) for item in INVOCATIONS]
+    results = run_batch(lambda request: httpx.Response(400, text="bad batch"), invocations)
+    assert len(results) == 2 and not any(result["success"] for result in results)
+
+def test_empty_batch_sends_nothing(run_batch):
+    requests = []
+    assert run_batch(batch_api(requests), []) == []
+    assert requests == []
@@ -0,0 +1,81 @@
+"""
+MCP bridge endpoint negotiation
+How the registry finds a bridge's execute path, caches it per bridge URL, and
+negotiates again when a cached path stops answering, against a scripted bridge
+"""
+
+import httpx
+import pytest
+
+from memra import tool_registry
+from memra.tool_registry import ToolRegistry, forget_bridge_endpoint
+
+BRIDGE = "http://bridge.test"
+CONFIG = {"bridge_url": BRIDGE, "bridge_secret": "secret", "circuit_breaker": False,
+          "retry": {"max_attempts": 1}}
+
+class Bridge:
+    """Serves tool calls on one path and reports it from GET /tools when advertise is set"""
+
+    def __init__(self, execute_path, advertise=True):
+        self.execute_path = execute_path
+        self.advertise = advertise
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(f"{request.method} {request.url.path}")
+        if request.method == "GET" and request.url.path == "/tools":
+            if not self.advertise:
+                return httpx.Response(404)
+            return httpx.Response(200, json={"tools": [], "execute_endpoint": self.execute_path})
+        if request.method == "POST" and request.url.path == self.execute_path:
+            return httpx.Response(200, json={"success": True, "data": {"path": self.execute_path}})
+        return httpx.Response(404)
+
+@pytest.fixture
+def bridge(monkeypatch):
+    monkeypatch.setattr(tool_registry, "_bridge_paths", {})
+    served = Bridge("/mcp/execute")
+    client = httpx.Client(transport=httpx.MockTransport(served))
+    monkeypatch.setattr(tool_registry, "get_shared_client", lambda: client)
+    return served
+
+def execute():
+    return ToolRegistry().execute_tool("DataValidator", "mcp", {"invoice_data": {}}, CONFIG)
+
+def test_advertised_path_is_negotiated_once(bridge):
+    assert execute()["data"]["path"] == "/mcp/execute"
+    assert execute()["data"]["path"] == "/mcp/execute"
+    assert bridge.requests == ["GET /tools", "POST /mcp/execute", "POST /mcp/execute"]
+    assert tool_registry._bridge_paths == {BRIDGE: "/mcp/execute"}
+
+def test_paths_are_probed_when_bridge_cannot_say(bridge):
+    bridge.advertise = False
+    bridge.execute_path = "/tool/DataValidator"
+    assert execute()["data"]["path"] == "/tool/DataValidator"
+    assert bridge.requests == ["GET /tools", "POST /execute_tool", "POST /tool/DataValidator"]
+    # The path that answered is remembered for the next call
+    assert tool_registry._bridge_paths == {BRIDGE: "/tool/{tool_name}"}
+
+def test_cached_path_that_returns_404_is_renegotiated(bridge):
+    tool_registry._bridge_paths[BRIDGE] = "/execute_tool"
+    assert execute()["data"]["path"] == "/mcp/execute"
+    assert bridge.requests == ["POST /execute_tool", "GET /tools", "POST /mcp/execute"]
+    assert tool_registry._bridge_paths == {BRIDGE: "/mcp/execute"}
+
+def test_renegotiation_falls_back_to_probing(bridge):
+    tool_registry._bridge_paths[BRIDGE] = "/execute_tool"
+    bridge.advertise = False
+    bridge.execute_path = "/api/execute"
+    assert execute()["data"]["path"] == "/api/execute"
+    # The stale path is not tried a second time
+    assert bridge.requests == ["POST /execute_tool", "GET /tools", "POST /tool/DataValidator",
+                               "POST /mcp/execute", "POST /api/execute"]
+    assert tool_registry._bridge_paths == {BRIDGE: "/api/execute"}
+
+def test_forget_bridge_endpoint(bridge):
+    execute()
+    forget_bridge_endpoint(BRIDGE)
+    assert tool_registry._bridge_paths == {}
+    execute()
+    assert bridge.requests.count("GET /tools") == 2
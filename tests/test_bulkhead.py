@@ -0,0 +1,73 @@
+"""
+Bulkhead admission
+Slots, the bounded queue, and how long a queued call may hold its worker:
+queue_timeout, the run deadline, or the default when neither is set
+"""
+
+import threading
+import time
+
+import pytest
+
+from memra import bulkhead
+from memra.bulkhead import Bulkhead, BulkheadRegistry
+from memra.deadline import deadline_scope
+
+def test_calls_beyond_the_queue_are_rejected_at_once():
+    pool = Bulkhead("vision", max_concurrent=1, max_queue=0)
+    assert pool.acquire() is None
+    assert pool.acquire() == "full"
+    rejection = pool.rejection("PDFProcessor", "full")
+    assert rejection["bulkhead_full"] is True
+    assert "0 calls already queued" in rejection["error"]
+
+def test_release_admits_the_queued_call():
+    pool = Bulkhead("vision", max_concurrent=1)
+    assert pool.acquire() is None
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(pool.acquire()))
+    waiter.start()
+    while pool.queued < 1:
+        time.sleep(0.001)
+    pool.release()
+    waiter.join(5.0)
+    assert admitted == [None]
+    assert pool.in_flight == 1
+
+def test_queue_timeout_rejection():
+    pool = Bulkhead("vision", max_concurrent=1, queue_timeout=0.02)
+    pool.acquire()
+    assert pool.acquire() == "timeout"
+    assert "no slot free within 0.02s" in pool.rejection("PDFProcessor", "timeout")["error"]
+    assert pool.queued == 0
+
+def test_wait_is_bounded_by_run_deadline():
+    pool = Bulkhead("vision", max_concurrent=1, queue_timeout=60.0)
+    pool.acquire()
+    with deadline_scope(0.02):
+        assert pool.acquire() == "deadline"
+        assert pool.rejection("PDFProcessor", "deadline")["deadline_exceeded"] is True
+
+def test_wait_without_timeout_or_deadline_is_bounded_by_default(monkeypatch):
+    monkeypatch.setattr(bulkhead, "DEFAULT_QUEUE_TIMEOUT", 0.02)
+    pool = Bulkhead("vision", max_concurrent=1)
+    pool.acquire()
+    assert pool.acquire() == "timeout"
+    # Formatting the default does not trip over queue_timeout=None
+    assert "no slot free within 0.02s" in pool.rejection("PDFProcessor", "timeout")["error"]
+
+def test_registry_assigns_tools_by_name_backend_and_config():
+    registry = BulkheadRegistry({
+        "vision": {"max_concurrent": 2, "tools": ["PDFProcessor"]},
+        "bridge": {"max_concurrent": 4, "hosted_by": "mcp"},
+    })
+    assert registry.get("PDFProcessor").name == "vision"
+    assert registry.get("SQLExecutor", "mcp").name == "bridge"
+    assert registry.get("FileReader") is None
+    assert registry.get("PDFProcessor", config={"bulkhead": False}) is None
+    assert registry.get("FileReader", config={"bulkhead": "vision"}) is registry.get("PDFProcessor")
+    assert registry.usage()["vision"] == {"in_flight": 0, "queued": 0, "max_concurrent": 2}
+
+def test_max_concurrent_must_be_positive():
+    with pytest.raises(ValueError):
+        Bulkhead("vision", max_concurrent=0)
@@ -0,0 +1,220 @@
+"""
+Circuit breaker state machine
+Closed -> open on failure or slow-call rate, open -> half-open after open_seconds,
+half-open -> closed or back to open on probe outcomes, under a fake clock; and how
+the client's call paths hand their outcomes (or their probes) back to the breaker
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from memra import circuit_breaker, tool_registry_client
+from memra.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, guard, CLOSED, OPEN, HALF_OPEN
+from memra.deadline import DeadlineExceeded, deadline_scope
+from memra.tool_registry_client import ToolRegistryClient
+
+@pytest.fixture(autouse=True)
+def fake_clock(clock):
+    return clock.install(circuit_breaker)
+
+def breaker(**settings):
+    settings = {"window": 10, "min_calls": 4, "open_seconds": 30.0, "half_open_probes": 2, **settings}
+    return CircuitBreaker("api.test", "DataValidator", **settings)
+
+def trip(cb):
+    for _ in range(cb.min_calls):
+        assert cb.allow()
+        cb.record(True, 0.1)
+    assert cb.state == OPEN
+
+def test_stays_closed_until_min_calls():
+    cb = breaker()
+    for _ in range(3):
+        cb.record(True, 0.1)
+    assert cb.state == CLOSED
+
+def test_opens_on_failure_rate():
+    cb = breaker(failure_rate=0.5)
+    for failed in (False, False, False, True, True):
+        cb.record(failed, 0.1)
+    assert cb.state == CLOSED
+    cb.record(True, 0.1)
+    assert cb.state == OPEN
+
+def test_opens_on_slow_call_rate():
+    cb = breaker(slow_call_seconds=2.0, slow_call_rate=0.5)
+    for seconds in (0.1, 3.0, 0.1, 3.0):
+        cb.record(False, seconds)
+    assert cb.state == OPEN
+
+def test_open_breaker_fails_fast_until_open_seconds_pass(fake_clock):
+    cb = breaker()
+    trip(cb)
+    assert not cb.allow()
+    rejection = cb.rejection()
+    assert rejection["circuit_open"] is True and rejection["retry_after"] == pytest.approx(30.0)
+
+    fake_clock.advance(29.0)
+    assert not cb.allow()
+    assert cb.retry_after() == pytest.approx(1.0)
+
+    fake_clock.advance(1.0)
+    assert cb.state == HALF_OPEN
+
+def test_half_open_lets_one_probe_through_at_a_time(fake_clock):
+    cb = breaker()
+    trip(cb)
+    fake_clock.advance(30.0)
+    assert cb.allow()
+    assert not cb.allow()
+    cb.record(False, 0.1)
+    assert cb.allow()
+
+def test_half_open_closes_after_enough_successful_probes(fake_clock):
+    cb = breaker(half_open_probes=2)
+    trip(cb)
+    fake_clock.advance(30.0)
+    for _ in range(2):
+        assert cb.allow()
+        cb.record(False, 0.1)
+    assert cb.state == CLOSED
+    # The window starts empty, so one failure does not reopen it
+    cb.record(True, 0.1)
+    assert cb.state == CLOSED
+
+def test_failed_probe_reopens_for_another_open_period(fake_clock):
+    cb = breaker()
+    trip(cb)
+    fake_clock.advance(30.0)
+    assert cb.allow()
+    cb.record(True, 0.1)
+    assert cb.state == OPEN
+    fake_clock.advance(29.0)
+    assert cb.state == OPEN
+    fake_clock.advance(1.0)
+    assert cb.state == HALF_OPEN
+
+def test_slow_probe_counts_as_failure(fake_clock):
+    cb = breaker(slow_call_seconds=2.0)
+    trip(cb)
+    fake_clock.advance(30.0)
+    assert cb.allow()
+    cb.record(False, 5.0)
+    assert cb.state == OPEN
+
+def test_outcomes_of_calls_started_before_opening_are_ignored():
+    cb = breaker()
+    trip(cb)
+    cb.record(False, 0.1)
+    assert cb.state == OPEN
+
+def test_registry_shares_breakers_per_host_and_tool():
+    registry = CircuitBreakerRegistry()
+    first = registry.get("http://api.test/tools/execute", "DataValidator", {"circuit_breaker": {"min_calls": 2}})
+    assert first is registry.get("http://api.test/other", "DataValidator")
+    assert first.min_calls == 2
+    assert registry.get("http://api.test", "PDFProcessor") is not first
+    assert registry.get("http://api.test", "DataValidator", {"circuit_breaker": False}) is None
+
+def half_open(cb, fake_clock):
+    trip(cb)
+    fake_clock.advance(cb.open_seconds)
+    assert cb.allow()
+
+def test_guard_records_response_status(fake_clock):
+    cb = breaker(half_open_probes=1)
+    half_open(cb, fake_clock)
+    with guard(cb) as outcome:
+        outcome.status_code = 200
+    assert cb.state == CLOSED
+
+def test_guard_counts_error_or_missing_response_as_failure(fake_clock):
+    cb = breaker()
+    half_open(cb, fake_clock)
+    with pytest.raises(httpx.ConnectError):
+        with guard(cb):
+            raise httpx.ConnectError("refused")
+    assert cb.state == OPEN
+
+    fake_clock.advance(cb.open_seconds)
+    assert cb.allow()
+    with guard(cb):
+        pass
+    assert cb.state == OPEN
+
+@pytest.mark.parametrize("error", [DeadlineExceeded("spent"), asyncio.CancelledError()])
+def test_guard_releases_probe_on_deadline_or_cancellation(fake_clock, error):
+    cb = breaker()
+    half_open(cb, fake_clock)
+    with pytest.raises(type(error)):
+        with guard(cb):
+            raise error
+    assert cb.state == HALF_OPEN
+    assert cb.allow()
+
+def test_guard_releases_probe_when_call_fails_after_deadline(fake_clock):
+    cb = breaker()
+    half_open(cb, fake_clock)
+    with deadline_scope(0.0):
+        with pytest.raises(httpx.ReadTimeout):
+            with guard(cb):
+                raise httpx.ReadTimeout("capped by the deadline")
+    assert cb.allow()
+
+@pytest.fixture
+def breakers(monkeypatch):
+    registry = CircuitBreakerRegistry()
+    monkeypatch.setattr(tool_registry_client, "BREAKERS", registry)
+    return registry
+
+def make_client(monkeypatch, handler):
+    monkeypatch.setenv("MEMRA_API_KEY", "breaker-test-key")
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    return ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+                              api_base="http://api.test", adaptive_concurrency=False)
+
+CONFIG = {"retry": {"max_attempts": 1}, "circuit_breaker": {"min_calls": 2, "open_seconds": 30.0}}
+
+def test_client_probe_that_times_out_at_the_deadline_is_released(fake_clock, breakers, monkeypatch):
+    def handler(request):
+        time.sleep(0.05)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    client = make_client(monkeypatch, handler)
+    cb = breakers.get("http://api.test", "DataValidator", CONFIG)
+    trip(cb)
+    fake_clock.advance(30.0)
+
+    with deadline_scope(0.02):
+        assert client.execute_tool("DataValidator", "memra", {}, CONFIG)["success"] is False
+    assert cb.state == HALF_OPEN
+    assert cb.allow()
+
+def test_batch_leaves_out_tools_whose_circuit_is_open(breakers, monkeypatch):
+    sent = []
+
+    def handler(request):
+        names = [item["tool_name"] for item in json.loads(request.content)["invocations"]]
+        sent.append(names)
+        return httpx.Response(200, json={"results": [{"success": True, "data": name} for name in names]})
+
+    client = make_client(monkeypatch, handler)
+    trip(breakers.get("http://api.test", "PDFProcessor", CONFIG))
+    invocations = [{"tool_name": name, "config": CONFIG} for name in ("DataValidator", "PDFProcessor", "SQLExecutor")]
+
+    results = client.execute_tools_batch(invocations)
+    assert sent == [["DataValidator", "SQLExecutor"]]
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[1]["circuit_open"] is True
+    assert results[2]["data"] == "SQLExecutor"
+
+def test_batch_failure_counts_against_each_tool_sent(breakers, monkeypatch):
+    client = make_client(monkeypatch, lambda request: httpx.Response(503))
+    invocations = [{"tool_name": name, "config": CONFIG} for name in ("DataValidator", "SQLExecutor")]
+    for _ in range(2):
+        client.execute_tools_batch(invocations)
+    assert breakers.states() == {"api.test/DataValidator": OPEN, "api.test/SQLExecutor": OPEN}
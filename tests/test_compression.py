@@ -0,0 +1,69 @@
+"""
+Request compression fallback
+A server that rejects a compressed body with 415 gets the request again
+uncompressed, and the rejected response is closed before the resend
+"""
+
+import asyncio
+
+import httpx
+
+from memra.compression import asend_json, remember_server_encodings, request_encoding, send_json
+
+URL = "http://compression.test/tools/execute"
+PAYLOAD = {"rows": [{"vendor": "Air Liquide", "amount": 100}] * 200}
+
+class TrackedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Response body that records whether it was closed"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        yield b"unsupported"
+
+    async def __aiter__(self):
+        yield b"unsupported"
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+def scripted_server():
+    rejected = TrackedStream()
+    bodies = []
+
+    def handler(request):
+        bodies.append(request.headers.get("Content-Encoding"))
+        if "Content-Encoding" in request.headers:
+            return httpx.Response(415, stream=rejected)
+        return httpx.Response(200, json={"success": True})
+
+    return handler, rejected, bodies
+
+def advertise_gzip():
+    remember_server_encodings(httpx.URL(URL), httpx.Headers({"Accept-Encoding": "gzip"}))
+
+def test_415_resends_uncompressed_and_closes_rejected_response():
+    advertise_gzip()
+    handler, rejected, bodies = scripted_server()
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        response = send_json(client, URL, PAYLOAD)
+    assert response.status_code == 200
+    assert bodies == ["gzip", None]
+    assert rejected.closed
+    assert request_encoding(httpx.URL(URL)) is None
+
+def test_async_415_resends_uncompressed_and_closes_rejected_response():
+    advertise_gzip()
+    handler, rejected, bodies = scripted_server()
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await asend_json(client, URL, PAYLOAD)
+
+    assert asyncio.run(main()).status_code == 200
+    assert bodies == ["gzip", None]
+    assert rejected.closed
@@ -0,0 +1,133 @@
+"""
+Adaptive concurrency limiter behaviour
+AIMD growth while the limit is in use, halving on overload or latency spikes,
+and admission of queued callers, with call latencies set by a fake clock
+"""
+
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from memra import concurrency
+from memra.concurrency import AdaptiveLimiter
+from memra.deadline import DeadlineExceeded, deadline_scope
+
+@pytest.fixture
+def fake_clock(clock):
+    return clock.install(concurrency)
+
+def run_concurrently(limiter, clock, calls, status_code=200):
+    """Hold calls slots at once, then release them all with status_code"""
+    with ExitStack() as stack:
+        slots = [stack.enter_context(limiter.slot("DataValidator")) for _ in range(calls)]
+        clock.advance(0.01)
+        for slot in slots:
+            slot.record(status_code)
+
+def test_limit_grows_gradually_while_in_use(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=4, max_limit=10)
+    run_concurrently(limiter, fake_clock, 4)
+    assert limiter.limit == 4
+    # 1/limit per success while at least half the limit is in flight
+    run_concurrently(limiter, fake_clock, 4)
+    run_concurrently(limiter, fake_clock, 4)
+    assert limiter.limit == 5
+
+def test_limit_does_not_grow_while_unused(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8, max_limit=10)
+    for _ in range(50):
+        run_concurrently(limiter, fake_clock, 1)
+    assert limiter.limit == 8
+
+def test_limit_never_exceeds_max(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=4, max_limit=5)
+    for _ in range(20):
+        run_concurrently(limiter, fake_clock, limiter.limit)
+    assert limiter.limit == 5
+
+def test_overload_halves_the_limit(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8)
+    with limiter.slot("DataValidator") as slot:
+        slot.record(503)
+    assert limiter.limit == 4
+
+def test_overloads_from_calls_in_flight_at_a_decrease_count_once(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8)
+    run_concurrently(limiter, fake_clock, 3, status_code=429)
+    assert limiter.limit == 4
+
+    fake_clock.advance(0.1)
+    with limiter.slot("DataValidator") as slot:
+        slot.record(429)
+    assert limiter.limit == 2
+
+def test_limit_never_drops_below_min(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=4, min_limit=2)
+    for _ in range(5):
+        fake_clock.advance(0.1)
+        with limiter.slot("DataValidator") as slot:
+            slot.record(500)
+    assert limiter.limit == 2
+
+def test_exception_in_slot_counts_as_overload(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8)
+    with pytest.raises(ConnectionError):
+        with limiter.slot("DataValidator"):
+            raise ConnectionError("reset")
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+def test_latency_spike_halves_the_limit(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8, min_latency_samples=5)
+    for _ in range(6):
+        with limiter.slot("DataValidator") as slot:
+            fake_clock.advance(0.1)
+            slot.record(200)
+    assert limiter.limit == 8
+
+    with limiter.slot("DataValidator") as slot:
+        fake_clock.advance(1.0)
+        slot.record(200)
+    assert limiter.limit == 4
+
+def test_latency_baselines_are_per_tool(fake_clock):
+    limiter = AdaptiveLimiter("api.test", initial_limit=8, min_latency_samples=5)
+    for tool_name, seconds in (("DataValidator", 0.1), ("PDFProcessor", 5.0)):
+        for _ in range(6):
+            with limiter.slot(tool_name) as slot:
+                fake_clock.advance(seconds)
+                slot.record(200)
+    assert limiter.limit == 8
+
+def test_acquire_times_out_when_limit_is_reached():
+    limiter = AdaptiveLimiter("api.test", initial_limit=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.05)
+    limiter.release(None)
+    assert limiter.acquire(timeout=0.05)
+
+def test_release_admits_queued_callers_in_order():
+    limiter = AdaptiveLimiter("api.test", initial_limit=1)
+    assert limiter.acquire()
+    admitted = []
+    threads = [threading.Thread(target=lambda n=n: limiter.acquire(5.0) and admitted.append(n)) for n in range(2)]
+    for queued, thread in enumerate(threads, start=1):
+        thread.start()
+        while len(limiter._waiters) < queued:
+            time.sleep(0.001)
+    limiter.release(None)
+    threads[0].join(5.0)
+    limiter.release(None)
+    threads[1].join(5.0)
+    assert admitted == [0, 1]
+
+def test_slot_raises_when_no_slot_frees_before_deadline():
+    limiter = AdaptiveLimiter("api.test", initial_limit=1)
+    with limiter.slot("DataValidator"):
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                with limiter.slot("DataValidator"):
+                    pass
+    assert limiter.in_flight == 0
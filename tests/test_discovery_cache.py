@@ -0,0 +1,67 @@
+"""
+Tool discovery cache
+TTL freshness, disk persistence, ETag revalidation through the client, and
+separate entries per API key, in a temporary cache directory
+"""
+
+import httpx
+import pytest
+
+from memra import discovery_cache
+from memra.discovery_cache import DiscoveryCache
+from memra.tool_registry_client import ToolRegistryClient
+
+API = "http://api.test"
+TOOLS = [{"name": "DataValidator", "hosted_by": "memra"}, {"name": "SQLExecutor", "hosted_by": "mcp"}]
+
+@pytest.fixture(autouse=True)
+def fresh_cache(tmp_path, monkeypatch, clock):
+    monkeypatch.setenv("MEMRA_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(discovery_cache, "_memory_cache", {})
+    return clock.install(discovery_cache)
+
+def test_entry_is_fresh_until_ttl(fresh_cache):
+    cache = DiscoveryCache(API, ttl=60.0, api_key="key")
+    entry = cache.store(TOOLS, '"v1"')
+    assert cache.is_fresh(entry)
+    fresh_cache.advance(60.0)
+    assert not cache.is_fresh(cache.get())
+
+def test_entry_survives_a_new_process(monkeypatch):
+    DiscoveryCache(API, api_key="key").store(TOOLS, '"v1"')
+    monkeypatch.setattr(discovery_cache, "_memory_cache", {})
+    entry = DiscoveryCache(API, api_key="key").get()
+    assert entry["tools"] == TOOLS and entry["etag"] == '"v1"'
+
+def test_api_keys_do_not_share_entries(tmp_path):
+    DiscoveryCache(API, api_key="tenant-a").store(TOOLS, '"v1"')
+    assert DiscoveryCache(API, api_key="tenant-b").get() is None
+    assert DiscoveryCache("http://other.test", api_key="tenant-a").get() is None
+    # Neither the key nor its file name give the key away
+    assert all("tenant-a" not in path.read_text() + path.name for path in tmp_path.iterdir())
+
+def test_clear_removes_memory_and_disk_copies():
+    cache = DiscoveryCache(API, api_key="key")
+    cache.store(TOOLS, None)
+    cache.clear()
+    assert cache.get() is None
+    assert not cache.path.exists()
+
+def test_client_revalidates_stale_entry_with_etag(fresh_cache, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "key")
+    requests = []
+
+    def handler(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"tools": TOOLS}, headers={"ETag": '"v1"'})
+
+    client = ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+                                api_base=API, discovery_ttl=60.0, adaptive_concurrency=False)
+    assert client.discover_tools(hosted_by="mcp") == [TOOLS[1]]
+    assert client.discover_tools() == TOOLS
+    fresh_cache.advance(61.0)
+    assert client.discover_tools() == TOOLS
+    assert requests == [None, '"v1"']
+    assert client.discovery_cache.is_fresh(client.discovery_cache.get())
@@ -0,0 +1,34 @@
+"""
+Batch execution in the engine
+Run ids paired with inputs, serially and on worker threads, with the workflow
+replaced by a stub so no agent or API is involved
+"""
+
+import pytest
+
+from memra.execution import ExecutionEngine
+from memra.models import Department
+from memra.records import RunRecord, TraceRecord
+from memra.sinks import CallbackSink
+
+DEPARTMENT = Department(name="Invoices", mission="Process invoices", agents=[])
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "execution-test-key")
+    written = []
+    engine = ExecutionEngine(sinks=[CallbackSink(written.append)])
+    engine.written = written
+    monkeypatch.setattr(engine, "_execute_workflow",
+                        lambda department, input_data: RunRecord(success=True, data=input_data, trace=TraceRecord()))
+    return engine
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_inputs_past_the_end_of_run_ids_get_generated_ids(engine, concurrency):
+    inputs = [{"invoice": n} for n in range(4)]
+    summary = engine.execute_batch(DEPARTMENT, inputs, run_ids=["first", "second"], concurrency=concurrency)
+    assert summary["total"] == 4 and summary["succeeded"] == 4
+
+    run_ids = {record["data"]["invoice"]: record["run_id"] for record in engine.written}
+    assert run_ids[0] == "first" and run_ids[1] == "second"
+    assert run_ids[2] and run_ids[3] and len(set(run_ids.values())) == 4
@@ -0,0 +1,176 @@
+"""
+Hedged request behaviour
+Latency percentiles, the hedge budget, and which request wins a hedged call,
+using scripted sends with private latency windows and budgets
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from memra import hedging
+from memra.deadline import current_deadline, deadline_scope
+from memra.hedging import HedgeBudget, HedgePolicy, LatencyWindow, hedge_policy_for_tool, hedged_call, ahedged_call
+
+POLICY = HedgePolicy(percentile=95.0, min_samples=5, min_delay=0.02)
+
+def warm(seconds=0.01, samples=5):
+    latencies = LatencyWindow()
+    for _ in range(samples):
+        latencies.record("DataValidator", seconds)
+    return latencies
+
+def test_percentile_interpolates_between_samples():
+    latencies = LatencyWindow()
+    for seconds in (1.0, 2.0, 3.0, 4.0, 5.0):
+        latencies.record("DataValidator", seconds)
+    assert latencies.percentile("DataValidator", 50) == 3.0
+    assert latencies.percentile("DataValidator", 95) == pytest.approx(4.8)
+    assert latencies.percentile("PDFProcessor", 95) is None
+
+def test_window_keeps_only_recent_samples():
+    latencies = LatencyWindow(window=3)
+    for seconds in (9.0, 1.0, 1.0, 1.0):
+        latencies.record("DataValidator", seconds)
+    assert latencies.count("DataValidator") == 3
+    assert latencies.percentile("DataValidator", 100) == 1.0
+
+def test_delay_waits_for_samples_and_is_clamped():
+    assert POLICY.delay(warm(samples=4), "DataValidator") is None
+    assert POLICY.delay(warm(0.001), "DataValidator") == 0.02
+    assert HedgePolicy(min_samples=5, max_delay=0.5).delay(warm(2.0), "DataValidator") == 0.5
+
+def test_budget_allows_burst_then_ratio_of_requests():
+    budget = HedgeBudget(ratio=0.25, burst=2.0)
+    assert budget.try_acquire() and budget.try_acquire()
+    assert not budget.try_acquire()
+    for _ in range(3):
+        budget.record_request()
+    assert not budget.try_acquire()
+    budget.record_request()
+    assert budget.try_acquire()
+
+def test_budget_refill_is_capped_at_burst():
+    budget = HedgeBudget(ratio=1.0, burst=2.0)
+    for _ in range(10):
+        budget.record_request()
+    assert [budget.try_acquire() for _ in range(3)] == [True, True, False]
+
+def test_non_idempotent_tools_are_never_hedged():
+    assert hedge_policy_for_tool("PostgresInsert", {"hedge": True}, idempotent=False) is None
+    assert hedge_policy_for_tool("DataValidator", {"hedge": False}, default=POLICY) is None
+    assert hedge_policy_for_tool("DataValidator", {"hedge": True}) is not None
+    assert hedge_policy_for_tool("DataValidator", {"hedge": {"percentile": 99}}).percentile == 99
+
+def slow_then_fast(release: threading.Event):
+    """First call blocks until release is set; later calls return at once"""
+    calls = []
+
+    def send():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait(5.0)
+            return "primary"
+        return "hedge"
+
+    return send, calls
+
+def test_call_without_enough_samples_is_only_timed():
+    latencies = LatencyWindow()
+    calls = []
+    assert hedged_call(lambda: calls.append(1) or "done", "DataValidator", POLICY, latencies, HedgeBudget()) == "done"
+    assert calls == [1]
+    assert latencies.count("DataValidator") == 1
+
+def test_fast_primary_is_not_hedged():
+    budget = HedgeBudget(burst=1.0)
+    calls = []
+    assert hedged_call(lambda: calls.append(1) or "primary", "DataValidator", POLICY, warm(), budget) == "primary"
+    assert calls == [1]
+    assert budget.try_acquire()
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    release = threading.Event()
+    send, calls = slow_then_fast(release)
+    budget = HedgeBudget(burst=1.0)
+    try:
+        assert hedged_call(send, "DataValidator", POLICY, warm(), budget) == "hedge"
+    finally:
+        release.set()
+    assert len(calls) == 2
+    assert not budget.try_acquire()
+
+def test_no_hedge_once_budget_is_spent():
+    release = threading.Event()
+    send, calls = slow_then_fast(release)
+    threading.Timer(0.1, release.set).start()
+    assert hedged_call(send, "DataValidator", POLICY, warm(), HedgeBudget(burst=0.0)) == "primary"
+    assert len(calls) == 1
+
+def test_failed_primary_falls_back_to_hedge():
+    release = threading.Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5.0)
+            raise ConnectionError("reset")
+        release.set()
+        return "hedge"
+
+    assert hedged_call(send, "DataValidator", POLICY, warm(), HedgeBudget(burst=1.0)) == "hedge"
+
+def test_error_is_raised_when_every_request_fails():
+    def send():
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        hedged_call(send, "DataValidator", POLICY, warm(), HedgeBudget(burst=1.0))
+
+def test_async_slow_primary_is_cancelled_when_hedge_wins():
+    cancelled = []
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5.0)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "primary"
+        return "hedge"
+
+    async def main():
+        result = await ahedged_call(send, "DataValidator", POLICY, warm(), HedgeBudget(burst=1.0))
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "hedge"
+    assert cancelled == [1]
+
+def test_hedged_calls_reuse_pool_threads():
+    threads = []
+    for _ in range(50):
+        hedged_call(lambda: threads.append(threading.current_thread()) or "primary", "DataValidator",
+                    POLICY, warm(), HedgeBudget(burst=0.0))
+    assert len(set(threads)) <= hedging.HEDGE_WORKERS
+    assert all(thread.name.startswith("memra-hedge") for thread in threads)
+
+def test_saturated_pool_runs_call_unhedged_on_caller_thread(monkeypatch):
+    monkeypatch.setattr(hedging, "_busy", hedging.HEDGE_WORKERS)
+    calls = []
+    result = hedged_call(lambda: calls.append(threading.current_thread()) or "inline", "DataValidator",
+                         POLICY, warm(), HedgeBudget(burst=1.0))
+    assert result == "inline"
+    assert calls == [threading.current_thread()]
+
+def test_pool_runs_send_in_callers_context():
+    seen = []
+    with deadline_scope(30.0) as deadline:
+        hedged_call(lambda: seen.append(current_deadline()) or "done", "DataValidator", POLICY, warm(),
+                    HedgeBudget(burst=0.0))
+    assert seen == [deadline]
@@ -0,0 +1,53 @@
+"""
+Import-time budget for the memra package
+Fails when `import memra` gets slower than MEMRA_IMPORT_BUDGET_MS or starts
+pulling in heavy dependencies eagerly again
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_BUDGET_MS = float(os.getenv("MEMRA_IMPORT_BUDGET_MS", "50"))
+
+# Only loaded once a public attribute such as memra.Agent is touched
+DEFERRED_MODULES = ["pydantic", "httpx", "asyncio", "memra.models", "memra.execution"]
+
+def _run(code: str, *options: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        capture_output=True, text=True, env=env, cwd=str(REPO_ROOT), check=True
+    )
+
+def _cumulative_us(importtime_output: str, module: str) -> int:
+    """Cumulative microseconds for a top-level module from -X importtime output"""
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        if name == module:
+            return int(cumulative_us)
+    raise AssertionError(f"{module} not found in -X importtime output")
+
+def test_import_memra_within_budget():
+    # Best of three, so a cold disk cache or a busy CI box does not fail the build
+    timings = [
+        _cumulative_us(_run("import memra", "-X", "importtime").stderr, "memra") / 1000
+        for _ in range(3)
+    ]
+    assert min(timings) <= IMPORT_BUDGET_MS, (
+        f"import memra took {min(timings):.1f}ms, budget is {IMPORT_BUDGET_MS:.0f}ms"
+    )
+
+def test_import_memra_defers_heavy_modules():
+    code = "import sys, memra; print(' '.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    loaded = _run(code).stdout.split()
+    assert not loaded, f"import memra eagerly imported: {', '.join(loaded)}"
+
+def test_lazy_attributes_resolve():
+    code = "import memra; print(memra.Agent.__module__, memra.ExecutionEngine.__module__, memra.check_api_health.__module__)"
+    assert _run(code).stdout.split() == ["memra.models", "memra.execution", "memra.discovery_client"]
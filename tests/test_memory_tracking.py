@@ -0,0 +1,107 @@
+"""
+Memory tracking of nested steps
+A tool tracked inside an agent must not wipe the agent's peak, bytes retained
+by the tool are reported once per nesting level rather than twice, and runs on
+other threads keep their own nesting
+"""
+
+import threading
+import tracemalloc
+
+import pytest
+
+from memra.execution import ExecutionEngine
+from memra.memory_tracking import MemoryTracker
+from memra.models import Department
+from memra.records import RunRecord, TraceRecord
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def tracker():
+    tracker = MemoryTracker()
+    yield tracker
+    tracker.stop()
+
+@pytest.mark.skipif(not hasattr(tracemalloc, "reset_peak"), reason="needs tracemalloc.reset_peak (Python 3.9+)")
+def test_nested_step_keeps_outer_peak(tracker):
+    with tracker.track("agent") as outer:
+        scratch = bytearray(4 * MB)
+        del scratch
+        with tracker.track("tool") as inner:
+            small = bytearray(MB // 4)
+        del small
+
+    assert outer["peak_bytes"] >= 4 * MB
+    assert inner["peak_bytes"] < 2 * MB
+
+def test_nested_bytes_are_counted_once_per_level(tracker):
+    kept = []
+    with tracker.track("agent") as outer:
+        with tracker.track("tool") as inner:
+            kept.append(bytearray(MB))
+
+    assert outer["depth"] == 0 and inner["depth"] == 1
+    assert inner["net_bytes"] >= MB
+    assert outer["net_bytes"] >= MB
+    # The agent itself retained almost nothing; the megabyte belongs to the tool
+    assert outer["self_net_bytes"] < MB // 4
+    assert inner["self_net_bytes"] == inner["net_bytes"]
+
+    levels = {level["depth"]: level for level in tracker.summary()["levels"]}
+    assert levels[0]["calls"] == 1 and levels[1]["calls"] == 1
+    assert levels[1]["net_bytes"] == inner["net_bytes"]
+
+def test_sibling_steps_add_up_at_their_level(tracker):
+    kept = []
+    with tracker.track("agent"):
+        for _ in range(2):
+            with tracker.track("tool"):
+                kept.append(bytearray(MB))
+
+    summary = tracker.summary()
+    level = next(level for level in summary["levels"] if level["depth"] == 1)
+    assert level["calls"] == 2
+    assert level["net_bytes"] >= 2 * MB
+    tool = next(step for step in summary["steps"] if step["step"] == "tool")
+    assert tool["calls"] == 2
+
+def test_concurrent_runs_keep_their_own_nesting(tracker):
+    barrier = threading.Barrier(2, timeout=5.0)
+    records = []
+
+    def run():
+        with tracker.track("agent") as outer:
+            barrier.wait()
+            with tracker.track("tool") as inner:
+                barrier.wait()
+        records.extend([outer, inner])
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5.0)
+
+    assert sorted((record["step"], record["depth"]) for record in records) == [
+        ("agent", 0), ("agent", 0), ("tool", 1), ("tool", 1)]
+    assert tracker._frames == {}
+    levels = {level["depth"]: level["calls"] for level in tracker.summary()["levels"]}
+    assert levels == {0: 2, 1: 2}
+
+@pytest.mark.skipif(tracemalloc.is_tracing(), reason="tracemalloc was started outside the test")
+def test_batch_stops_tracemalloc_when_it_ends(monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "memory-test-key")
+    engine = ExecutionEngine(memory_tracking=True)
+
+    def workflow(department, input_data):
+        trace = TraceRecord()
+        with engine._track_memory(trace, "agent:Validator"):
+            kept = bytearray(1024)
+        return RunRecord(success=True, data={"size": len(kept)}, trace=trace)
+
+    monkeypatch.setattr(engine, "_execute_workflow", workflow)
+    department = Department(name="Invoices", mission="Process invoices", agents=[])
+    summary = engine.execute_batch(department, [{}] * 4, concurrency=2)
+    assert summary["memory"]["steps"][0]["calls"] == 4
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,83 @@
+"""
+Prometheus metrics
+Text exposition of counters, gauges and histograms, label checks, and the
+textfile and HTTP exporters, on private registries
+"""
+
+import math
+
+import httpx
+import pytest
+
+from memra.metrics import CONTENT_TYPE_LATEST, MetricsRegistry
+
+def test_counter_and_gauge_render_in_text_format():
+    registry = MetricsRegistry()
+    calls = registry.counter("memra_tool_calls_total", "Tool invocations", ["tool", "status"])
+    calls.inc(tool="PDFProcessor", status="success")
+    calls.inc(2, tool="PDFProcessor", status="success")
+    registry.gauge("memra_runs_in_flight", "Runs executing").set(1.5)
+
+    assert registry.render() == (
+        "# HELP memra_tool_calls_total Tool invocations\n"
+        "# TYPE memra_tool_calls_total counter\n"
+        'memra_tool_calls_total{tool="PDFProcessor",status="success"} 3\n'
+        "# HELP memra_runs_in_flight Runs executing\n"
+        "# TYPE memra_runs_in_flight gauge\n"
+        "memra_runs_in_flight 1.5\n"
+    )
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("memra_tool_duration_seconds", "Tool latency", ["tool"], buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        latency.observe(seconds, tool="DataValidator")
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'memra_tool_duration_seconds_bucket{tool="DataValidator",le="0.1"} 1',
+        'memra_tool_duration_seconds_bucket{tool="DataValidator",le="1"} 2',
+        'memra_tool_duration_seconds_bucket{tool="DataValidator",le="+Inf"} 3',
+        'memra_tool_duration_seconds_sum{tool="DataValidator"} 5.55',
+        'memra_tool_duration_seconds_count{tool="DataValidator"} 3',
+    ]
+    assert latency.buckets[-1] == math.inf
+    assert latency.get_count(tool="DataValidator") == 3
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("memra_runs_total", "Runs", ["department"]).inc(department='Acme "AP"\\EU')
+    assert 'memra_runs_total{department="Acme \\"AP\\"\\\\EU"} 1' in registry.render()
+
+def test_labels_must_match_and_counters_only_increase():
+    registry = MetricsRegistry()
+    counter = registry.counter("memra_retries_total", "Retries", ["tool"])
+    with pytest.raises(ValueError):
+        counter.inc(host="api")
+    with pytest.raises(ValueError):
+        counter.inc(-1, tool="PDFProcessor")
+    assert registry.counter("memra_retries_total", "Retries", ["tool"]) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("memra_retries_total", "Retries", ["tool"])
+
+def test_write_textfile(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("memra_runs_total", "Runs").inc()
+    path = tmp_path / "memra.prom"
+    registry.write_textfile(str(path))
+    assert path.read_text() == registry.render()
+    assert [p.name for p in tmp_path.iterdir()] == ["memra.prom"]
+
+def test_http_endpoint_serves_metrics():
+    registry = MetricsRegistry()
+    registry.counter("memra_runs_total", "Runs").inc()
+    server = registry.start_http_server(0, addr="127.0.0.1")
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        response = httpx.get(f"{base}/metrics")
+        assert response.headers["Content-Type"] == CONTENT_TYPE_LATEST
+        assert response.text == registry.render()
+        assert httpx.get(f"{base}/other").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,197 @@
+"""
+Outbox store-and-forward behaviour
+Entries live in a temporary SQLite file and are replayed against fake clients, with
+the outbox's and rate limiter's clocks under the test's control where timing matters
+"""
+
+import threading
+import time
+
+import httpx
+import pytest
+
+from memra import outbox as outbox_module
+from memra import rate_limit
+from memra.deadline import deadline_scope
+from memra.outbox import Outbox, DELIVERED, FAILED, PENDING
+from memra.tool_registry_client import ToolRegistryClient
+
+UNAVAILABLE = {"success": False, "error": "API error: 503 - down", "status_code": 503, "unavailable": True}
+
+class FakeClient:
+    """The parts of ToolRegistryClient the outbox uses, answering from a script"""
+
+    api_key = "outbox-test-key"
+    api_base = "http://api.test"
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def execute_tool(self, tool_name, hosted_by, input_data, config=None, defer=True):
+        self.calls.append((tool_name, input_data, defer))
+        if self.results:
+            return self.results.pop(0)
+        return {"success": True, "data": {"echo": input_data}}
+
+    def execute_tool_with_file(self, tool_name, hosted_by, path, input_data=None, config=None,
+                               file_param="file", defer=True):
+        self.calls.append((tool_name, path, defer))
+        return {"success": True, "data": {"path": path}}
+
+    def health_check(self):
+        return True
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(tmp_path / "outbox.sqlite")
+
+def test_enqueue_persists_pending_entries(outbox, tmp_path):
+    first = outbox.enqueue("DataValidator", "memra", {"invoice": 1}, {"retry": {"max_attempts": 1}})
+    second = outbox.enqueue("PDFProcessor", "memra", {}, file_path="invoice.pdf")
+
+    assert second > first
+    assert outbox.pending_count() == 2
+    assert outbox.result(first) is None
+    # Another process opening the same file sees the same queue
+    other = Outbox(tmp_path / "outbox.sqlite")
+    assert [entry["tool_name"] for entry in other.entries(PENDING)] == ["DataValidator", "PDFProcessor"]
+
+def test_claim_leases_entry_and_redelivers_after_expiry(outbox, tmp_path, clock):
+    clock.install(outbox_module)
+    first = outbox.enqueue("DataValidator", "memra", {"invoice": 1})
+    second = outbox.enqueue("DataValidator", "memra", {"invoice": 2})
+    other = Outbox(tmp_path / "outbox.sqlite")
+
+    assert outbox._claim(lease=60.0)[0] == first
+    # A concurrent drainer skips the leased entry
+    assert other._claim(lease=60.0)[0] == second
+    assert other._claim(lease=60.0) is None
+
+    # The first drainer died without finishing; the entry comes back once its lease runs out
+    clock.advance(61.0)
+    assert other._claim(lease=60.0)[0] == first
+
+def test_drain_skips_leased_entry_until_lease_expires(outbox, clock, rate_store):
+    clock.install(outbox_module)
+    entry_id = outbox.enqueue("DataValidator", "memra", {"invoice": 1})
+    outbox._claim(lease=300.0)
+    client = FakeClient()
+
+    assert outbox.drain(client)[DELIVERED] == 0
+    assert client.calls == []
+
+    clock.advance(301.0)
+    counts = outbox.drain(client)
+    assert counts[DELIVERED] == 1 and counts[PENDING] == 0
+    assert client.calls == [("DataValidator", {"invoice": 1}, False)]
+    assert outbox.result(entry_id) == {"success": True, "data": {"echo": {"invoice": 1}}}
+
+def test_drain_pauses_while_api_is_unavailable(outbox, rate_store):
+    entry_id = outbox.enqueue("DataValidator", "memra", {"invoice": 1})
+    outbox.enqueue("DataValidator", "memra", {"invoice": 2})
+    client = FakeClient(UNAVAILABLE)
+
+    counts = outbox.drain(client)
+    assert counts == {DELIVERED: 0, FAILED: 0, PENDING: 2}
+    assert len(client.calls) == 1
+    assert outbox.entries()[0]["attempts"] == 1
+
+    counts = outbox.drain(client)
+    assert counts == {DELIVERED: 2, FAILED: 0, PENDING: 0}
+    assert outbox.result(entry_id)["success"] is True
+
+def test_drain_gives_up_after_max_attempts(tmp_path, rate_store):
+    outbox = Outbox(tmp_path / "outbox.sqlite", max_attempts=2)
+    entry_id = outbox.enqueue("DataValidator", "memra", {})
+    client = FakeClient(UNAVAILABLE, UNAVAILABLE)
+
+    assert outbox.drain(client)[PENDING] == 1
+    assert outbox.drain(client) == {DELIVERED: 0, FAILED: 1, PENDING: 0}
+    assert outbox.result(entry_id) == UNAVAILABLE
+
+def test_drain_replays_file_calls_with_their_file(outbox, rate_store, tmp_path):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(b"%PDF")
+    outbox.enqueue("PDFProcessor", "memra", {}, file_path=str(path))
+    client = FakeClient()
+
+    outbox.drain(client)
+    assert client.calls == [("PDFProcessor", str(path), False)]
+
+def test_drain_rate_spaces_out_replays(outbox, clock, rate_store):
+    clock.install(outbox_module, rate_limit)
+    for number in range(5):
+        outbox.enqueue("DataValidator", "memra", {"invoice": number})
+
+    counts = outbox.drain(FakeClient(), drain_rate="2/s")
+
+    assert counts[DELIVERED] == 5
+    # A burst of two, then one call every half second
+    assert clock.sleeps == pytest.approx([0.5, 0.5, 0.5])
+
+def test_drain_respects_limit(outbox, rate_store):
+    for number in range(3):
+        outbox.enqueue("DataValidator", "memra", {"invoice": number})
+
+    assert outbox.drain(FakeClient(), limit=2) == {DELIVERED: 2, FAILED: 0, PENDING: 1}
+
+def test_wait_returns_result_delivered_by_another_thread(outbox, rate_store):
+    entry_id = outbox.enqueue("DataValidator", "memra", {"invoice": 1})
+    client = FakeClient()
+    drainer = threading.Timer(0.1, outbox.drain, args=(client,))
+    drainer.start()
+
+    started = time.monotonic()
+    result = outbox.wait(entry_id, timeout=5.0)
+    drainer.join()
+
+    assert result == {"success": True, "data": {"echo": {"invoice": 1}}}
+    assert time.monotonic() - started < 2.0
+
+def test_wait_defaults_to_remaining_run_deadline(outbox):
+    entry_id = outbox.enqueue("DataValidator", "memra", {})
+
+    started = time.monotonic()
+    with deadline_scope(0.2):
+        assert outbox.wait(entry_id) is None
+    assert time.monotonic() - started < 1.0
+
+def test_wait_timeout_caps_wait_outside_a_run(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.sqlite", wait_timeout=0.1)
+    entry_id = outbox.enqueue("DataValidator", "memra", {})
+
+    started = time.monotonic()
+    assert outbox.wait(entry_id) is None
+    assert time.monotonic() - started < 1.0
+
+def test_client_queues_unavailable_call_and_drain_delivers_it(outbox, rate_store, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "outbox-test-key")
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    statuses = [503]
+
+    def handler(request):
+        status = statuses.pop(0) if statuses else 200
+        return httpx.Response(status, json={"success": True, "data": {"ok": True}} if status == 200 else None)
+
+    client = ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+                                api_base="http://api.test", adaptive_concurrency=False, outbox=outbox)
+    config = {"retry": {"max_attempts": 1}, "circuit_breaker": False}
+
+    result = client.execute_tool("DataValidator", "memra", {"invoice": 1}, config)
+    assert result["queued"] is True
+    assert outbox.pending_count() == 1
+
+    assert outbox.drain(client)[DELIVERED] == 1
+    assert outbox.result(result["outbox_id"]) == {"success": True, "data": {"ok": True}}
+
+def test_client_does_not_queue_calls_the_tool_rejected(outbox, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "outbox-test-key")
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    transport = httpx.MockTransport(lambda request: httpx.Response(400, text="bad input"))
+    client = ToolRegistryClient(http_client=httpx.Client(transport=transport), api_base="http://api.test",
+                                adaptive_concurrency=False, outbox=outbox)
+
+    result = client.execute_tool("DataValidator", "memra", {}, {"retry": {"max_attempts": 1}})
+    assert result["status_code"] == 400 and "queued" not in result
+    assert outbox.pending_count() == 0
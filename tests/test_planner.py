@@ -0,0 +1,81 @@
+"""
+Capacity planning
+Latency percentiles, reservoir state across save and load, and batch estimates
+for a small department with recorded and default latencies
+"""
+
+import random
+
+import pytest
+
+from memra.models import Agent, Department
+from memra.planner import CapacityPlanner, LatencyHistory
+
+def history_with(samples):
+    history = LatencyHistory()
+    for tool_name, seconds in samples.items():
+        for value in seconds:
+            history.record(tool_name, value)
+    return history
+
+DEPARTMENT = Department(
+    name="Invoices",
+    mission="Process invoices",
+    agents=[
+        Agent(role="Extractor", job="Extract", output_key="invoice",
+              tools=[{"name": "PDFProcessor", "hosted_by": "memra"}]),
+        Agent(role="Writer", job="Write", output_key="row",
+              tools=[{"name": "PostgresInsert", "hosted_by": "mcp"}]),
+    ],
+    workflow_order=["Extractor", "Writer"],
+)
+
+def test_percentile_interpolates_between_samples():
+    history = history_with({"PDFProcessor": [1.0, 2.0, 3.0, 4.0, 5.0]})
+    assert history.percentile("PDFProcessor", 50) == 3.0
+    assert history.percentile("PDFProcessor", 95) == pytest.approx(4.8)
+    assert history.mean("PDFProcessor") == 3.0
+    assert history.percentile("PostgresInsert", 95) is None
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "latency.json")
+    history_with({"PDFProcessor": [1.0, 2.0]}).save(path)
+    loaded = LatencyHistory.load(path)
+    assert loaded.samples == {"PDFProcessor": [1.0, 2.0]}
+    assert LatencyHistory.load(str(tmp_path / "missing.json")).samples == {}
+
+def test_load_restores_reservoir_seen_counts(tmp_path, monkeypatch):
+    path = str(tmp_path / "latency.json")
+    history = LatencyHistory(max_samples=2)
+    for value in (1.0, 2.0, 3.0, 4.0):
+        history.record("PDFProcessor", value)
+    history.save(path)
+
+    loaded = LatencyHistory.load(path)
+    assert loaded.max_samples == 2
+    assert loaded._seen == {"PDFProcessor": 4}
+    # The next sample is the fifth seen, so it is drawn against five slots, not three
+    slots = []
+    monkeypatch.setattr(random, "randrange", lambda n: slots.append(n) or n - 1)
+    loaded.record("PDFProcessor", 5.0)
+    assert slots == [5]
+
+def test_plan_uses_samples_and_defaults():
+    history = history_with({"PDFProcessor": [2.0] * 5})
+    plan = CapacityPlanner(history, concurrency=2, default_latency=1.0).plan(DEPARTMENT, 4)
+    extractor, writer = plan.stages
+    assert extractor.sampled and extractor.mean_seconds == 2.0
+    assert not writer.sampled and writer.mean_seconds == 1.0
+    assert extractor.backends == ["memra-api"] and writer.backends == ["mcp-bridge"]
+    # Two waves of 3s runs on two workers
+    assert plan.estimated_duration_seconds == pytest.approx(6.0)
+    assert plan.bottleneck == "concurrency"
+
+def test_rate_limit_becomes_the_bottleneck():
+    history = history_with({"PDFProcessor": [1.0] * 5, "PostgresInsert": [1.0] * 5})
+    plan = CapacityPlanner(history, concurrency=10, rate_limits={"mcp-bridge": 0.5},
+                           cost_per_call={"PDFProcessor": 0.01}).plan(DEPARTMENT, 10, target_seconds=5.0)
+    assert plan.bottleneck == "rate_limit:mcp-bridge"
+    assert plan.estimated_duration_seconds == pytest.approx(20.0)
+    assert plan.meets_target is False
+    assert plan.expected_cost == pytest.approx(0.1)
@@ -0,0 +1,151 @@
+"""
+Shared token-bucket rate limiting
+Rate parsing, debits from several stores on one SQLite file standing in for
+several processes, and the client's per-attempt debits, with the bucket clock
+and sleeps under the test's control
+"""
+
+import httpx
+import pytest
+
+from memra import rate_limit, retry, tool_registry_client
+from memra.circuit_breaker import CircuitBreakerRegistry
+from memra.deadline import DeadlineExceeded, deadline_scope
+from memra.rate_limit import Rate, TokenBucketStore, bucket_key, reserve, throttle
+from memra.tool_registry_client import ToolRegistryClient
+
+API = "http://api.test"
+
+@pytest.fixture
+def fake_clock(clock):
+    return clock.install(rate_limit, retry)
+
+@pytest.mark.parametrize("value, per_second", [
+    (5, 5.0), ("5/s", 5.0), ("300/min", 5.0), ("3600/hour", 1.0), ("2/ second", 2.0), ("0.5", 0.5),
+])
+def test_rate_parse(value, per_second):
+    assert Rate.parse(value).per_second == pytest.approx(per_second)
+
+@pytest.mark.parametrize("value", [None, "", 0, "0/s", {"rate": None}])
+def test_rate_parse_unlimited(value):
+    assert Rate.parse(value) is None
+
+def test_rate_parse_burst():
+    assert Rate.parse({"rate": "10/s", "burst": 25}).burst == 25
+    # One second's worth by default, never below one request
+    assert Rate.parse("10/s").burst == 10
+    assert Rate.parse("6/min").burst == 1
+
+def test_rate_parse_rejects_unknown_unit():
+    with pytest.raises(ValueError):
+        Rate.parse("5/fortnight")
+
+def test_bucket_key_does_not_store_the_api_key():
+    key = bucket_key("secret-key", "https://api.memra.co/tools/execute", "PDFProcessor")
+    assert "secret-key" not in key
+    assert key.endswith("|api.memra.co|PDFProcessor")
+
+def test_processes_sharing_a_file_draw_on_one_bucket(tmp_path, fake_clock):
+    path = tmp_path / "ratelimit.sqlite"
+    first, second = TokenBucketStore(path), TokenBucketStore(path)
+    rate = Rate(2.0, burst=2)
+
+    # Burst of two between them, then each debit waits for the tokens before it
+    assert first.reserve("bucket", rate) == 0.0
+    assert second.reserve("bucket", rate) == 0.0
+    assert first.reserve("bucket", rate) == pytest.approx(0.5)
+    assert second.reserve("bucket", rate) == pytest.approx(1.0)
+
+    fake_clock.advance(1.0)
+    assert first.reserve("bucket", rate) == pytest.approx(0.5)
+
+def test_bucket_refills_only_up_to_burst(tmp_path, fake_clock):
+    store = TokenBucketStore(tmp_path / "ratelimit.sqlite")
+    rate = Rate(1.0, burst=3)
+    store.reserve("bucket", rate)
+    fake_clock.advance(3600.0)
+    waits = [store.reserve("bucket", rate) for _ in range(4)]
+    assert waits == [0.0, 0.0, 0.0, pytest.approx(1.0)]
+
+def test_buckets_are_independent(tmp_path, fake_clock):
+    store = TokenBucketStore(tmp_path / "ratelimit.sqlite")
+    rate = Rate(1.0)
+    assert store.reserve("a", rate) == 0.0
+    assert store.reserve("b", rate) == 0.0
+
+def test_store_falls_back_to_process_buckets_when_file_is_unusable(tmp_path, fake_clock):
+    # A directory cannot be opened as a database
+    store = TokenBucketStore(tmp_path)
+    rate = Rate(1.0)
+    assert store.reserve("bucket", rate) == 0.0
+    assert store.reserve("bucket", rate) == pytest.approx(1.0)
+    assert store._failed
+
+def test_reserve_waits_for_the_later_of_api_and_tool_buckets(rate_store, fake_clock):
+    config = {"rate_limit": "1/s"}
+    assert reserve("key", API, "PDFProcessor", Rate(10.0), config) == 0.0
+    assert reserve("key", API, "PDFProcessor", Rate(10.0), config) == pytest.approx(1.0)
+    # Another tool only shares the API-wide bucket
+    assert reserve("key", API, "DataValidator", Rate(10.0)) == 0.0
+
+def test_throttle_sleeps_until_token_accrues(rate_store, fake_clock):
+    for _ in range(3):
+        throttle("key", API, "DataValidator", Rate(2.0))
+    assert fake_clock.sleeps == [pytest.approx(0.5)]
+
+def test_throttle_raises_when_wait_passes_run_deadline(rate_store, fake_clock):
+    throttle("key", API, "DataValidator", Rate(0.1))
+    with deadline_scope(1.0):
+        with pytest.raises(DeadlineExceeded):
+            throttle("key", API, "DataValidator", Rate(0.1))
+    assert fake_clock.sleeps == []
+
+    # The refused call took no token, so the next caller's wait is unchanged
+    throttle("key", API, "DataValidator", Rate(0.1))
+    assert fake_clock.sleeps == [pytest.approx(10.0)]
+
+def test_refused_reservation_leaves_every_bucket_untouched(rate_store, fake_clock):
+    config = {"rate_limit": "0.1/s"}
+    assert reserve("key", API, "PDFProcessor", Rate(1.0, burst=3), config) == 0.0
+    # The API bucket could serve this one, the tool bucket not before max_wait
+    assert reserve("key", API, "PDFProcessor", Rate(1.0, burst=3), config, max_wait=5.0) is None
+
+    waits = [reserve("key", API, "DataValidator", Rate(1.0, burst=3)) for _ in range(3)]
+    assert waits == [0.0, 0.0, pytest.approx(1.0)]
+
+def test_refund_is_capped_at_burst(tmp_path, fake_clock):
+    store = TokenBucketStore(tmp_path / "ratelimit.sqlite")
+    rate = Rate(1.0, burst=2)
+    store.refund("bucket", rate)
+    waits = [store.reserve("bucket", rate) for _ in range(3)]
+    assert waits == [0.0, 0.0, pytest.approx(1.0)]
+
+def make_client(monkeypatch, *statuses):
+    monkeypatch.setenv("MEMRA_API_KEY", "rate-test-key")
+    statuses = list(statuses)
+
+    def handler(request):
+        status = statuses.pop(0)
+        return httpx.Response(status, headers={"Retry-After": "0"}, json={"success": status == 200})
+
+    return ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)), api_base=API,
+                              rate_limit=Rate(1.0, burst=1), adaptive_concurrency=False)
+
+def test_every_retry_takes_a_token(rate_store, fake_clock, monkeypatch):
+    client = make_client(monkeypatch, 503, 200)
+    config = {"retry": {"max_attempts": 2}, "circuit_breaker": False}
+    assert client.execute_tool("DataValidator", "memra", {}, config, defer=False)["success"] is True
+    # The retry waited for a token of its own rather than riding on the first one
+    assert sum(fake_clock.sleeps) == pytest.approx(1.0)
+    assert reserve("rate-test-key", API, "DataValidator", Rate(1.0, burst=1)) == pytest.approx(1.0)
+
+def test_call_refused_by_open_circuit_takes_no_token(rate_store, fake_clock, monkeypatch):
+    registry = CircuitBreakerRegistry()
+    monkeypatch.setattr(tool_registry_client, "BREAKERS", registry)
+    breaker = registry.get(API, "DataValidator")
+    for _ in range(breaker.min_calls):
+        breaker.record(True, 0.1)
+
+    result = make_client(monkeypatch).execute_tool("DataValidator", "memra", {}, defer=False)
+    assert result["circuit_open"] is True
+    assert reserve("rate-test-key", API, "DataValidator", Rate(1.0, burst=1)) == 0.0
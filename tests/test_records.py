@@ -0,0 +1,42 @@
+"""
+Internal execution records
+Conversion of the slotted hot-path records into the public pydantic models
+without re-running validation
+"""
+
+import pytest
+
+from memra.models import DepartmentAudit, DepartmentResult, ExecutionTrace
+from memra.records import RunRecord, TraceRecord, build_audit
+
+def filled_trace():
+    trace = TraceRecord()
+    trace.agents_executed.append("Extractor")
+    trace.tools_invoked.append("PDFProcessor")
+    trace.execution_times["Extractor"] = 1.25
+    trace.errors.append("retry")
+    trace.circuit_breakers["memra/PDFProcessor"] = "closed"
+    return trace
+
+def test_records_have_no_instance_dict():
+    trace = TraceRecord()
+    with pytest.raises(AttributeError):
+        trace.extra = 1
+    with pytest.raises(AttributeError):
+        RunRecord(success=True, trace=trace).extra = 1
+
+def test_run_record_builds_department_result():
+    result = RunRecord(success=False, trace=filled_trace(), data={"invoice": 1}, error="boom").to_model()
+    assert isinstance(result, DepartmentResult)
+    assert isinstance(result.trace, ExecutionTrace)
+    assert (result.success, result.data, result.error) == (False, {"invoice": 1}, "boom")
+    assert result.trace.agents_executed == ["Extractor"]
+    assert result.trace.execution_times == {"Extractor": 1.25}
+    assert result.trace.circuit_breakers == {"memra/PDFProcessor": "closed"}
+
+def test_build_audit():
+    audit = build_audit(filled_trace(), 2.5)
+    assert isinstance(audit, DepartmentAudit)
+    assert audit.agents_run == ["Extractor"]
+    assert audit.tools_invoked == ["PDFProcessor"]
+    assert audit.duration_seconds == 2.5 and audit.total_cost is None
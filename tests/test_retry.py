@@ -0,0 +1,140 @@
+"""
+Retry policy behaviour
+Retry-After parsing, full-jitter backoff bounds and which failures are retried,
+driven by scripted responses and a fake clock instead of real waits
+"""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from memra import retry
+from memra.deadline import deadline_scope
+from memra.retry import RetryPolicy, parse_retry_after, policy_for_tool
+
+def scripted(*outcomes):
+    """send() returning (or raising) each outcome in turn; .calls counts attempts"""
+    outcomes = list(outcomes)
+
+    def send():
+        send.calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    send.calls = 0
+    return send
+
+@pytest.fixture(autouse=True)
+def fake_clock(clock):
+    return clock.install(retry)
+
+def test_parse_retry_after_delta_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 3 ") == 3.0
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(when, usegmt=True)) == pytest.approx(30, abs=2)
+
+def test_parse_retry_after_past_date_is_zero():
+    when = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(when, usegmt=True)) == 0.0
+
+@pytest.mark.parametrize("value", [None, "", "soon", "-5", "1.5"])
+def test_parse_retry_after_rejects_other_values(value):
+    assert parse_retry_after(value) is None
+
+def test_backoff_is_full_jitter_under_exponential_cap(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+    policy = RetryPolicy(base_delay=0.5, max_delay=5.0)
+
+    for retry_number in range(6):
+        policy.backoff(retry_number)
+
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 4.0), (0, 5.0), (0, 5.0)]
+
+def test_backoff_samples_stay_within_bounds():
+    policy = RetryPolicy(base_delay=0.5, max_delay=5.0)
+    samples = [policy.backoff(3) for _ in range(500)]
+    assert all(0 <= sample <= 4.0 for sample in samples)
+    # Spread over the whole range rather than clustered at the cap
+    assert min(samples) < 1.0 and max(samples) > 3.0
+
+def test_call_waits_as_long_as_retry_after_asks(fake_clock):
+    send = scripted(httpx.Response(503, headers={"Retry-After": "7"}), httpx.Response(200))
+    response = RetryPolicy().call(send)
+    assert response.status_code == 200
+    assert send.calls == 2
+    assert fake_clock.sleeps == [7.0]
+
+def test_call_ignores_retry_after_when_told_to(fake_clock, monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    send = scripted(httpx.Response(503, headers={"Retry-After": "7"}), httpx.Response(200))
+    RetryPolicy(base_delay=0.25, respect_retry_after=False).call(send)
+    assert fake_clock.sleeps == [0.25]
+
+def test_call_stops_after_max_attempts(fake_clock):
+    send = scripted(*[httpx.Response(502) for _ in range(3)])
+    assert RetryPolicy(max_attempts=3).call(send).status_code == 502
+    assert send.calls == 3
+
+def test_call_does_not_retry_client_errors():
+    send = scripted(httpx.Response(400))
+    assert RetryPolicy().call(send).status_code == 400
+    assert send.calls == 1
+
+def test_call_stops_when_retry_after_passes_total_budget(fake_clock):
+    send = scripted(httpx.Response(503, headers={"Retry-After": "60"}))
+    assert RetryPolicy(total_budget=30.0).call(send).status_code == 503
+    assert send.calls == 1
+    assert fake_clock.sleeps == []
+
+def test_call_does_not_retry_past_run_deadline():
+    send = scripted(httpx.Response(503, headers={"Retry-After": "5"}))
+    with deadline_scope(1.0):
+        assert RetryPolicy().call(send).status_code == 503
+    assert send.calls == 1
+
+def test_call_raises_last_error_when_giving_up():
+    send = scripted(*[httpx.ConnectError("refused") for _ in range(2)])
+    with pytest.raises(httpx.ConnectError):
+        RetryPolicy(max_attempts=2).call(send)
+    assert send.calls == 2
+
+def test_non_idempotent_tools_default_to_no_retries_of_processed_requests():
+    policy = policy_for_tool("PostgresInsert")
+    assert policy.idempotent is False
+
+    send = scripted(httpx.Response(503), httpx.Response(200))
+    assert policy.call(send).status_code == 503
+    assert send.calls == 1
+
+    send = scripted(httpx.ReadTimeout("slow"), httpx.Response(200))
+    with pytest.raises(httpx.ReadTimeout):
+        policy.call(send)
+    assert send.calls == 1
+
+def test_non_idempotent_tools_still_retry_requests_never_processed(fake_clock):
+    policy = policy_for_tool("PostgresInsert")
+
+    send = scripted(httpx.Response(429, headers={"Retry-After": "1"}), httpx.Response(200))
+    assert policy.call(send).status_code == 200
+
+    send = scripted(httpx.ConnectError("refused"), httpx.Response(200))
+    assert policy.call(send).status_code == 200
+
+def test_idempotent_tools_retry_read_timeouts(fake_clock):
+    send = scripted(httpx.ReadTimeout("slow"), httpx.Response(200))
+    assert policy_for_tool("DataValidator").call(send).status_code == 200
+    assert send.calls == 2
+
+def test_tool_config_refines_policy():
+    policy = policy_for_tool("PostgresInsert", {"retry": {"max_attempts": 5, "idempotent": True}})
+    assert policy.max_attempts == 5 and policy.idempotent is True
+    # Unset fields keep the tool's default
+    assert policy_for_tool("PostgresInsert", {"retry": {"max_attempts": 5}}).idempotent is False
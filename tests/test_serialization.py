@@ -0,0 +1,66 @@
+"""
+Encoding of SQL row values
+Decimal amounts must survive a round trip digit for digit, whichever codec the
+server and client negotiate, and reach callers as the same type the mock data uses
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import httpx
+import pytest
+
+from memra import tool_registry
+from memra.serialization import JSON, JSONCodec, decode_response, msgpack_available
+from memra.tool_registry import ToolRegistry
+
+ROW = {
+    "total_amount": Decimal("12345678901234567.89"),
+    "tax_rate": Decimal("0.0825"),
+    "invoice_date": date(2024, 5, 28),
+    "created_at": datetime(2024, 5, 28, 9, 30),
+    "id": UUID("12345678-1234-5678-1234-567812345678"),
+    "tags": ("urgent", "air"),
+}
+
+def codecs():
+    yield JSON
+    if msgpack_available():
+        from memra.serialization import MsgPackCodec
+        yield MsgPackCodec()
+
+@pytest.mark.parametrize("codec", list(codecs()), ids=lambda codec: codec.content_type)
+def test_decimal_round_trips_exactly(codec):
+    decoded = codec.loads(codec.dumps(ROW))
+    assert decoded["total_amount"] == "12345678901234567.89"
+    assert Decimal(decoded["total_amount"]) == ROW["total_amount"]
+    assert Decimal(decoded["tax_rate"]) == ROW["tax_rate"]
+
+@pytest.mark.parametrize("codec", list(codecs()), ids=lambda codec: codec.content_type)
+def test_other_row_values(codec):
+    decoded = codec.loads(codec.dumps(ROW))
+    assert decoded["invoice_date"] == "2024-05-28"
+    assert decoded["created_at"] == "2024-05-28T09:30:00"
+    assert decoded["id"] == "12345678-1234-5678-1234-567812345678"
+    assert decoded["tags"] == ["urgent", "air"]
+
+def test_stdlib_fallback_encodes_decimal_as_string(monkeypatch):
+    codec = JSONCodec()
+    monkeypatch.setattr(codec, "_orjson", None)
+    assert codec.dumps({"amount": Decimal("0.10")}) == b'{"amount": "0.10"}'
+
+def test_callers_get_numeric_columns_as_decimal_strings_from_bridge_and_mock_data(monkeypatch):
+    served = decode_response(httpx.Response(200, content=JSON.dumps(
+        {"success": True, "data": {"results": [{"total_amount": Decimal("1234.56")}]}})))
+    assert served["data"]["results"][0]["total_amount"] == "1234.56"
+
+    # With no bridge path answering, the registry falls back to its mock rows
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    monkeypatch.setattr(tool_registry, "get_shared_client", lambda: client)
+    config = {"bridge_url": "http://bridge.test", "bridge_secret": "secret", "circuit_breaker": False}
+    mocked = ToolRegistry().execute_tool("SQLExecutor", "mcp", {"sql_query": "SELECT total_amount FROM invoices"},
+                                         config)
+    assert mocked["data"]["_mock"] is True
+    assert all(isinstance(row["total_amount"], str) for row in mocked["data"]["results"])
+    assert Decimal(mocked["data"]["results"][0]["total_amount"]) == Decimal("1234.56")
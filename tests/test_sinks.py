@@ -0,0 +1,71 @@
+"""
+Result sinks
+Round trips through the JSON lines and SQLite sinks and the trace ring buffer,
+using records built from a finished run
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+from memra.records import RunRecord, TraceRecord
+from memra.sinks import JSONLinesSink, SQLiteSink, TraceRingBuffer, build_run_record
+
+def run_record(run_id, success=True):
+    trace = TraceRecord()
+    trace.agents_executed.append("Extractor")
+    trace.execution_times["Extractor"] = 0.5
+    result = RunRecord(success=success, trace=trace, data={"total_amount": "1234.56"},
+                       error=None if success else "boom").to_model()
+    return build_run_record(run_id, "Invoices", result, 0.5)
+
+def test_build_run_record_flattens_result():
+    record = run_record("run-1")
+    assert record["run_id"] == "run-1" and record["department"] == "Invoices"
+    assert record["trace"]["agents_executed"] == ["Extractor"]
+    assert record["duration_seconds"] == 0.5 and record["finished_at"]
+
+def test_json_lines_round_trip(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    with JSONLinesSink(str(path)) as sink:
+        sink.write(run_record("run-1"))
+        sink.write(run_record("run-2", success=False))
+    with JSONLinesSink(str(path), include_data=False, include_trace=False) as sink:
+        sink.write(run_record("run-3"))
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [row["run_id"] for row in rows] == ["run-1", "run-2", "run-3"]
+    expected = run_record("run-1")
+    expected["finished_at"] = rows[0]["finished_at"]
+    assert rows[0] == expected
+    assert rows[1]["success"] is False and rows[1]["error"] == "boom"
+    assert "data" not in rows[2] and "trace" not in rows[2]
+
+def test_sqlite_round_trip(tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    with SQLiteSink(path, commit_every=10) as sink:
+        sink.write(run_record("run-1"))
+        sink.write(run_record("run-2", success=False))
+        # A rerun of the same id replaces the earlier row
+        sink.write(run_record("run-2"))
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT run_id, success, error, data, trace FROM department_runs ORDER BY run_id").fetchall()
+    assert [(row[0], row[1], row[2]) for row in rows] == [("run-1", 1, None), ("run-2", 1, None)]
+    assert json.loads(rows[0][3]) == {"total_amount": "1234.56"}
+    assert json.loads(rows[0][4])["execution_times"] == {"Extractor": 0.5}
+
+def test_sqlite_sink_rejects_unsafe_table_name(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteSink(str(tmp_path / "runs.sqlite"), table="runs; DROP TABLE x")
+
+def test_ring_buffer_keeps_most_recent_traces():
+    buffer = TraceRingBuffer(capacity=2)
+    for run_id, success in (("run-1", True), ("run-2", False), ("run-3", True)):
+        buffer.write(run_record(run_id, success))
+    assert len(buffer) == 2
+    assert [record["run_id"] for record in buffer.recent()] == ["run-2", "run-3"]
+    assert [record["run_id"] for record in buffer.recent(1)] == ["run-3"]
+    assert [record["run_id"] for record in buffer.failures()] == ["run-2"]
+    assert "data" not in buffer.recent()[0]
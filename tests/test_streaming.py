@@ -0,0 +1,70 @@
+"""
+Incremental decoding of tool responses
+The same documents split at every possible chunk size must decode exactly as
+json.loads decodes them whole, whether streamed fields are iterated or not
+"""
+
+import json
+
+import pytest
+
+from memra.streaming import StreamedToolResult
+
+INVOICE = json.dumps({
+    "success": True,
+    "data": {
+        "vendor_name": "Air Liquide Canada Inc.",
+        "invoice_number": "10352259310",
+        "total": 1234.56,
+        "tax_rate": 0.13,
+        "exponent": 1.5e-3,
+        "negative": -42,
+        "flags": [True, False, None],
+        "note": "Prix unitaire élevé – €",
+        "results": [
+            {"line": 1, "description": "Oxygen cylinder", "qty": 12, "amount": 99.95},
+            {"line": 2, "description": "Delivery", "qty": 1, "amount": 2.5e2},
+            {"line": 3, "description": "Rental", "qty": 0, "amount": -0.0},
+        ],
+        "row_count": 3
+    },
+    "timing": 0.125
+}, ensure_ascii=False).encode("utf-8")
+
+def chunked(doc: bytes, size: int):
+    return [doc[i:i + size] for i in range(0, len(doc), size)]
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b'{"total": 99.', b'95}'], {"total": 99.95}),
+    ([b'{"results": [12.', b'5, 1]}'], {"results": [12.5, 1]}),
+    ([b'{"results": [1.5e', b'3]}'], {"results": [1500.0]}),
+    ([b'{"n": 1', b'23}'], {"n": 123}),
+    ([b'{"n": -', b'7}'], {"n": -7}),
+])
+def test_numbers_split_at_chunk_boundary(chunks, expected):
+    assert StreamedToolResult(chunks).result() == expected
+
+def test_number_at_end_of_stream():
+    assert StreamedToolResult([b'{"data": ', b'[1, 2]}']).result() == {"data": [1, 2]}
+
+def test_result_at_every_chunk_size():
+    expected = json.loads(INVOICE)
+    for size in range(1, len(INVOICE) + 1):
+        assert StreamedToolResult(chunked(INVOICE, size)).result() == expected, f"chunk size {size}"
+
+def test_iter_field_at_every_chunk_size():
+    expected = json.loads(INVOICE)
+    for size in range(1, len(INVOICE) + 1):
+        result = StreamedToolResult(chunked(INVOICE, size))
+        assert list(result.iter_field("results")) == expected["data"]["results"], f"chunk size {size}"
+        document = result.result()
+        assert document["data"]["results"] == []
+        assert document["data"]["row_count"] == 3 and document["timing"] == 0.125
+
+def test_unconsumed_items_are_kept_in_result():
+    result = StreamedToolResult(chunked(INVOICE, 5))
+    assert result.result() == json.loads(INVOICE)
+
+def test_truncated_document_raises():
+    with pytest.raises(ValueError):
+        StreamedToolResult([INVOICE[:-5]]).result()
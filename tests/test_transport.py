@@ -0,0 +1,73 @@
+"""
+Shared HTTP transport
+Reuse of the pooled clients per configuration and per event loop, and the
+per-host cap layered over the pool, with a scripted inner transport
+"""
+
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from memra import transport
+from memra.transport import (HostLimitedTransport, aclose_shared_async_clients, close_shared_clients,
+                             get_shared_async_client, get_shared_client)
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(transport, "_shared_clients", {})
+    yield
+    close_shared_clients()
+
+def test_shared_client_is_reused_per_configuration():
+    client = get_shared_client(http2=False)
+    assert get_shared_client(http2=False) is client
+    assert get_shared_client(max_connections=5, http2=False) is not client
+
+def test_closed_clients_are_recreated():
+    client = get_shared_client(http2=False)
+    close_shared_clients()
+    assert client.is_closed
+    replacement = get_shared_client(http2=False)
+    assert replacement is not client and not replacement.is_closed
+
+def test_per_host_cap_is_applied_when_configured():
+    assert isinstance(get_shared_client(max_connections_per_host=2, http2=False)._transport, HostLimitedTransport)
+    assert not isinstance(get_shared_client(max_connections_per_host=None, http2=False)._transport,
+                          HostLimitedTransport)
+
+def test_host_slot_is_held_until_the_body_is_closed():
+    limited = HostLimitedTransport(httpx.MockTransport(lambda request: httpx.Response(200, text="ok")), 1)
+    client = httpx.Client(transport=limited)
+    with client.stream("GET", "http://a.test/") as response:
+        # Another host has its own slots; the same host waits for this body
+        assert client.get("http://b.test/").status_code == 200
+        blocked = threading.Thread(target=lambda: client.get("http://a.test/"), daemon=True)
+        blocked.start()
+        blocked.join(0.1)
+        assert blocked.is_alive()
+        response.read()
+    blocked.join(5.0)
+    assert not blocked.is_alive()
+
+def test_host_slot_is_released_when_the_request_fails():
+    def fail(request):
+        raise httpx.ConnectError("refused")
+
+    client = httpx.Client(transport=HostLimitedTransport(httpx.MockTransport(fail), 1))
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://a.test/")
+
+def test_async_clients_are_shared_within_a_loop_only():
+    async def clients():
+        first = get_shared_async_client(http2=False)
+        second = get_shared_async_client(http2=False)
+        await aclose_shared_async_clients()
+        return first, second
+
+    first, second = asyncio.run(clients())
+    assert first is second and first.is_closed
+    other, _ = asyncio.run(clients())
+    assert other is not first
@@ -0,0 +1,83 @@
+"""
+Content-addressed upload cache
+Reuse of uploads until they near expiry, separate entries per API key, and a
+fresh upload when the API reports a cached file gone, in a temporary cache directory
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from memra import upload_cache
+from memra.upload_cache import UploadCache, file_digest
+from memra.tool_registry_client import ToolRegistryClient
+
+API = "http://api.test"
+
+def expires_in(seconds):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+@pytest.fixture(autouse=True)
+def fresh_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMRA_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(upload_cache, "_memory_cache", {})
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(b"%PDF-1.4 invoice")
+    return str(path)
+
+def test_entry_is_reused_until_it_nears_expiry():
+    cache = UploadCache(API, api_key="key")
+    assert cache.store("abc", {"remote_path": "uploads/a.pdf", "expires_at": expires_in(3600)})
+    assert cache.get("abc")["remote_path"] == "uploads/a.pdf"
+    # Inside the expiry margin the tool call might find the file gone
+    assert not cache.store("def", {"remote_path": "uploads/d.pdf", "expires_at": expires_in(60)})
+    assert cache.get("def") is None
+
+def test_entries_survive_a_new_process(monkeypatch):
+    UploadCache(API, api_key="key").store("abc", {"remote_path": "uploads/a.pdf", "expires_at": expires_in(3600)})
+    monkeypatch.setattr(upload_cache, "_memory_cache", {})
+    assert UploadCache(API, api_key="key").get("abc")["remote_path"] == "uploads/a.pdf"
+
+def test_api_keys_do_not_share_uploads(tmp_path):
+    UploadCache(API, api_key="tenant-a").store("abc", {"remote_path": "uploads/a.pdf",
+                                                       "expires_at": expires_in(3600)})
+    assert UploadCache(API, api_key="tenant-b").get("abc") is None
+    assert all("tenant-a" not in path.read_text() + path.name for path in (tmp_path / "cache").iterdir())
+
+def test_gone_upload_is_invalidated_and_sent_again(pdf, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "upload-test-key")
+    monkeypatch.delenv("MEMRA_RATE_LIMIT", raising=False)
+    executed, uploads = [], []
+
+    def handler(request):
+        if request.url.path == "/tools/execute_with_file":
+            return httpx.Response(404)
+        if request.url.path == "/upload/raw":
+            uploads.append(request.read())
+            return httpx.Response(200, json={"success": True, "data": {
+                "remote_path": "uploads/new.pdf", "expires_at": expires_in(3600)}})
+        if request.url.path == "/tools/execute":
+            remote_path = json.loads(request.content)["input_data"]["file"]
+            executed.append(remote_path)
+            if remote_path == "uploads/old.pdf":
+                return httpx.Response(410, text="upload expired")
+            return httpx.Response(200, json={"success": True, "data": {"pages": 1}})
+        return httpx.Response(404)
+
+    client = ToolRegistryClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+                                api_base=API, adaptive_concurrency=False)
+    digest = file_digest(pdf)
+    client.upload_cache.store(digest, {"remote_path": "uploads/old.pdf", "expires_at": expires_in(3600),
+                                       "sha256": digest})
+
+    config = {"retry": {"max_attempts": 1}, "circuit_breaker": False}
+    result = client.execute_tool_with_file("PDFProcessor", "memra", pdf, config=config, defer=False)
+    assert result == {"success": True, "data": {"pages": 1}}
+    assert executed == ["uploads/old.pdf", "uploads/new.pdf"]
+    assert len(uploads) == 1
+    assert client.upload_cache.get(digest)["remote_path"] == "uploads/new.pdf"
@@ -0,0 +1,80 @@
+"""
+Resumable upload loop
+Chunked uploads against a scripted upload-session API: offset disagreements are
+bounded, the run deadline is honoured, and session creation is retried
+"""
+
+import httpx
+import pytest
+
+from memra import retry
+from memra.deadline import deadline_scope
+from memra.tool_registry_client import ToolRegistryClient, UPLOAD_CHUNK_RETRIES
+
+SIZE = 10
+
+class UploadServer:
+    """Upload session endpoints; conflict=True answers every chunk with 409 at offset 0"""
+
+    def __init__(self, session_failures=0, conflict=False):
+        self.session_failures = session_failures
+        self.conflict = conflict
+        self.session_posts = 0
+        self.puts = 0
+
+    def __call__(self, request):
+        if request.method == "POST" and request.url.path == "/upload/sessions":
+            self.session_posts += 1
+            if self.session_posts <= self.session_failures:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"success": True, "data": {"upload_id": "u1"}})
+        if request.method == "PUT":
+            self.puts += 1
+            if self.conflict:
+                return httpx.Response(409, json={"success": False, "data": {"offset": 0}})
+            end = int(request.headers["Content-Range"].split("-")[1].split("/")[0]) + 1
+            data = {"remote_path": "uploads/u1.pdf"} if end == SIZE else {"offset": end}
+            return httpx.Response(200, json={"success": True, "data": data})
+        return httpx.Response(404)
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(b"x" * SIZE)
+    return str(path)
+
+def client_for(server, monkeypatch):
+    monkeypatch.setenv("MEMRA_API_KEY", "upload-test-key")
+    transport = httpx.MockTransport(server)
+    return ToolRegistryClient(http_client=httpx.Client(transport=transport), api_base="http://api.test",
+                              adaptive_concurrency=False)
+
+def upload(client, pdf):
+    return client.upload_file(pdf, mode="resumable", chunk_size=4, dedup=False)
+
+def test_uploads_in_chunks(pdf, monkeypatch):
+    server = UploadServer()
+    result = upload(client_for(server, monkeypatch), pdf)
+    assert result["data"]["remote_path"] == "uploads/u1.pdf"
+    assert server.puts == 3
+
+def test_offset_conflicts_are_bounded(pdf, monkeypatch):
+    server = UploadServer(conflict=True)
+    result = upload(client_for(server, monkeypatch), pdf)
+    assert result["success"] is False and result["status_code"] == 409
+    assert server.puts == UPLOAD_CHUNK_RETRIES + 1
+
+def test_offset_conflicts_stop_at_run_deadline(pdf, monkeypatch):
+    server = UploadServer(conflict=True)
+    client = client_for(server, monkeypatch)
+    with deadline_scope(0.0):
+        result = upload(client, pdf)
+    assert result["deadline_exceeded"] is True
+    assert server.puts == 0
+
+def test_session_creation_is_retried(pdf, monkeypatch, clock):
+    clock.install(retry)
+    server = UploadServer(session_failures=1)
+    result = upload(client_for(server, monkeypatch), pdf)
+    assert result["success"] is True
+    assert server.session_posts == 2